@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import contextlib
+import gc
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+import mock_redfish
+from device_collect import GET_ALL_INFO, GET_ALL_INFO_ASYNC, form_data
+from redfish_client import DEFAULT_POOL_SIZE, DEFAULT_RETRIES
+from request_scheduler import RequestScheduler, DEFAULT_MAX_IN_FLIGHT, \
+    DEFAULT_BMC_LIMIT, DEFAULT_SUBNET_LIMIT
+from topology import TopologyTemplates
+
+
+def serve_fleet(connection, models, count, options):
+    # Runs in its own process so that the BMCs do not share the GIL with
+    # the collection. Sends the addresses and serves until told to stop.
+    context = mock_redfish.get_ssl_context()
+    fleet = mock_redfish.start_fleet(models, count, options, context)
+    connection.send([(mock_redfish.get_address(server), server.bmc.vendor,
+                      server.bmc.model) for server in fleet])
+    connection.recv()
+
+
+def get_options(args, templates, model):
+    return {
+        'template': templates.get_template((model,)) if templates else None,
+        'pool_size': args['pool_size'],
+        'budget': args['budget'] or None,
+        'retries': args['retries'],
+        'auth': args['auth'],
+        'scheduler': args['scheduler'],
+        'nodes': args['nodes'] > 1
+    }
+
+
+def is_complete(sv_info):
+    # sv_info is the list of the nodes of a chassis with --nodes
+    if not sv_info:
+        return False
+    if isinstance(sv_info, list):
+        return all(is_complete(node) for node in sv_info)
+    data = form_data(sv_info)
+    return not any(str(value).startswith('NOK. timeout')
+                   for value in data.values())
+
+
+def collect(bmc, args, templates):
+    address, vendor, model = bmc
+    started = time.monotonic()
+    try:
+        sv_info = GET_ALL_INFO[vendor](
+            address, mock_redfish.DEFAULT_USERNAME,
+            mock_redfish.DEFAULT_PASSWORD,
+            **get_options(args, templates, model))
+    except Exception as e:
+        print("Can not collect {} cause {}".format(address, e))
+        sv_info = None
+    return time.monotonic() - started, is_complete(sv_info), \
+        sv_info if args['keep_results'] else None
+
+
+async def collect_async(bmc, args, templates, semaphore):
+    address, vendor, model = bmc
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            sv_info = await GET_ALL_INFO_ASYNC[vendor](
+                address, mock_redfish.DEFAULT_USERNAME,
+                mock_redfish.DEFAULT_PASSWORD,
+                **get_options(args, templates, model))
+        except Exception as e:
+            print("Can not collect {} cause {}".format(address, e))
+            sv_info = None
+        return time.monotonic() - started, is_complete(sv_info), \
+            sv_info if args['keep_results'] else None
+
+
+async def collect_fleet_async(fleet, args, templates):
+    semaphore = asyncio.Semaphore(args['workers'])
+    return await asyncio.gather(*[
+        collect_async(bmc, args, templates, semaphore) for bmc in fleet])
+
+
+def get_percentile(values, percent):
+    # Nearest-rank percentile
+    values = sorted(values)
+    rank = max(int(math.ceil(percent / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+def get_peak_rss():
+    # MiB, ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def get_rss():
+    # MiB resident now, None where /proc is not there
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (IOError, OSError):
+        return None
+    return pages * resource.getpagesize() / 1024.0 / 1024.0
+
+
+def get_size(value, seen):
+    # Bytes of value and of what it holds, objects met before (interned
+    # strings, shared records) are counted once
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(get_size(k, seen) + get_size(v, seen)
+                    for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(get_size(item, seen) for item in value)
+    for name in getattr(type(value), '__slots__', ()):
+        size += get_size(getattr(value, name, None), seen)
+    return size
+
+
+def print_rss(before, peak, held, count):
+    print("Peak RSS: {:.1f} MiB, {:.1f} MiB per 1,000 servers over the {:.1f} "
+          "MiB before collecting".format(peak, (peak - before) / count * 1000,
+                                         before))
+    if held is not None:
+        print("RSS after collecting: {:.1f} MiB, {:.1f} MiB per 1,000 "
+              "servers".format(held, (held - before) / count * 1000))
+
+
+if __name__ == "__main__":
+    urllib3.disable_warnings()
+    parser = argparse.ArgumentParser(
+        description='Collect a simulated fleet of BMCs and report the '
+                    'throughput and latency per server')
+    parser.add_argument(
+        "-n", "--count", help='Number of servers. Default: 20',
+        required=False, type=int, default=20)
+    parser.add_argument(
+        "-m", "--models", help='Comma separated models of the servers, taken '
+                               'in turn, among %s. Default: all'
+                               % ', '.join(sorted(mock_redfish.MODELS)),
+        required=False, default=','.join(sorted(mock_redfish.MODELS)))
+    parser.add_argument(
+        "-w", "--workers", help='Number of servers collected concurrently. '
+                                'Default: 1',
+        required=False, type=int, default=1)
+    parser.add_argument(
+        "--async", help='Collect with one asyncio event loop instead of one '
+                        'thread per server', dest='use_async',
+        required=False, action='store_true')
+    parser.add_argument(
+        "-p", "--pool-size", help='Number of keep-alive connections kept '
+                                  'open to each BMC. Default: %d'
+                                  % DEFAULT_POOL_SIZE,
+        required=False, type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument(
+        "-b", "--budget", help='Time budget in seconds to collect one server. '
+                               '0 for no limit. Default: 0',
+        required=False, type=float, default=0)
+    parser.add_argument(
+        "-r", "--retries", help='Number of times a request is sent again. '
+                                'Default: %d' % DEFAULT_RETRIES,
+        required=False, type=int, default=DEFAULT_RETRIES)
+    parser.add_argument(
+        "--auth", help='session or basic. Default: session',
+        required=False, choices=('session', 'basic'), default='session')
+    parser.add_argument(
+        "--max-in-flight", help='Most requests in flight to all the BMCs at '
+                                'once, 0 for no limit. Default: %d'
+                                % DEFAULT_MAX_IN_FLIGHT,
+        required=False, type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument(
+        "--per-bmc", help='Most requests in flight to one BMC at once, 0 for '
+                          'no limit. Default: %d' % DEFAULT_BMC_LIMIT,
+        required=False, type=int, default=DEFAULT_BMC_LIMIT)
+    parser.add_argument(
+        "--per-subnet", help='Most requests in flight to the BMCs of one /24 '
+                             'at once, the simulated BMCs all share '
+                             '127.0.0.0/24. 0 for no limit. Default: %d'
+                             % DEFAULT_SUBNET_LIMIT,
+        required=False, type=int, default=DEFAULT_SUBNET_LIMIT)
+    parser.add_argument(
+        "--no-templates", help='Do not reuse the topology of the first server '
+                               'of a model',
+        dest='use_templates', required=False, action='store_false')
+    parser.add_argument(
+        "--latency", help='Seconds before each answer of the BMCs. '
+                          'Default: 0.05',
+        required=False, type=float, default=0.05)
+    parser.add_argument(
+        "--jitter", help='Random seconds added to or removed from the '
+                         'latency. Default: 0.02',
+        required=False, type=float, default=0.02)
+    parser.add_argument(
+        "--error-rate", help='Rate of requests answered 503. Default: 0',
+        required=False, type=float, default=0.0)
+    parser.add_argument(
+        "--endpoints", help='JSON file of latency, jitter and error_rate per '
+                            'endpoint template. Default: none',
+        required=False, default=None)
+    parser.add_argument(
+        "--elcm-job-seconds", help='Seconds an eLCM profile job runs. '
+                                   'Default: 2',
+        required=False, type=float, default=2)
+    parser.add_argument(
+        "--controllers", help='RAID controllers of each server. Default: 1',
+        required=False, type=int, default=1)
+    parser.add_argument(
+        "--nodes", help='Nodes of each server, collected through the one '
+                        'session of their chassis manager. Default: 1',
+        required=False, type=int, default=1)
+    parser.add_argument(
+        "--keep-results", help='Keep the collected info of every server in '
+                               'memory until the end, like a run before it '
+                               'writes the workbook',
+        required=False, action='store_true')
+    parser.add_argument(
+        "-v", "--verbose", help='Show the output of the collection',
+        required=False, action='store_true')
+    args = vars(parser.parse_args())
+    models = args['models'].split(',')
+    args['scheduler'] = RequestScheduler(
+        args['max_in_flight'], args['per_bmc'], args['per_subnet'])
+    options = mock_redfish.MockOptions(
+        args['latency'], args['jitter'], args['error_rate'],
+        mock_redfish.load_endpoints(args['endpoints']),
+        elcm_job_seconds=args['elcm_job_seconds'],
+        controllers=args['controllers'], nodes=args['nodes'])
+    connection, child_connection = multiprocessing.Pipe()
+    server = multiprocessing.Process(
+        target=serve_fleet,
+        args=(child_connection, models, args['count'], options), daemon=True)
+    server.start()
+    fleet = connection.recv()
+    templates = TopologyTemplates() if args['use_templates'] else None
+    output = None if args['verbose'] else open(os.devnull, 'w')
+    gc.collect()
+    rss_before = get_rss() or get_peak_rss()
+    started = time.monotonic()
+    with contextlib.redirect_stdout(output or sys.stdout):
+        if args['use_async']:
+            results = asyncio.run(collect_fleet_async(fleet, args, templates))
+        else:
+            with ThreadPoolExecutor(max_workers=args['workers']) as executor:
+                results = list(executor.map(
+                    lambda bmc: collect(bmc, args, templates), fleet))
+    elapsed = time.monotonic() - started
+    rss_peak = get_peak_rss()
+    gc.collect()
+    rss_held = get_rss()
+    connection.send('stop')
+    server.join(5)
+    latencies = [seconds for seconds, _, _ in results]
+    complete = sum(1 for _, ok, _ in results if ok)
+    print("Servers: {} ({} complete) in {:.1f}s, {} workers{}{}".format(
+        len(results), complete, elapsed, args['workers'],
+        ', async' if args['use_async'] else '',
+        ', {} nodes each'.format(args['nodes']) if args['nodes'] > 1
+        else ''))
+    print("Throughput: {:.1f} servers/min".format(
+        len(results) / elapsed * 60))
+    print("Latency per server: p50 {:.2f}s p99 {:.2f}s max {:.2f}s".format(
+        get_percentile(latencies, 50), get_percentile(latencies, 99),
+        max(latencies)))
+    print_rss(rss_before, rss_peak, rss_held, len(results))
+    if args['keep_results']:
+        seen = set()
+        size = sum(get_size(sv_info, seen) for _, _, sv_info in results)
+        print("Collected info kept: {:.1f} MiB per 1,000 servers".format(
+            size / len(results) * 1000 / 1024.0 / 1024.0))
+    args['scheduler'].print_stats()
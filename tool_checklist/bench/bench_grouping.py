@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+from device_collect import add_drive, get_logical_disk_info, \
+    get_physical_disk_info, read_drive
+from vendor_profiles import DELL
+
+DISK = DELL['sections']['disk']
+DRIVE_URL = '/redfish/v1/Systems/System.Embedded.1/Storage/' \
+            'RAID.Integrated.1-1/Drives/Disk.Bay.%d'
+# Size, media and speed of the drives of a mixed array
+MEDIA = [(1200000000000, 'HDD', 10000), (2400000000000, 'HDD', 10000),
+         (8000000000000, 'HDD', 7200), (960000000000, 'SSD', None),
+         (3840000000000, 'SSD', None)]
+
+
+def make_drives(number, media):
+    # media drive types, 0 for a different size on every drive
+    drives = []
+    for i in range(number):
+        if media:
+            capacity, media_type, speed = MEDIA[i % media]
+        else:
+            capacity, media_type, speed = (i + 1) * 1000000000, 'HDD', 10000
+        drives.append({
+            '@odata.id': DRIVE_URL % i, 'CapacityBytes': capacity,
+            'MediaType': media_type, 'RotationSpeedRPM': speed,
+            'Name': 'Physical Disk 0:1:%d' % i,
+            'Status': {'Health': 'OK', 'State': 'Enabled'}
+        })
+    return drives
+
+
+def make_volume(drives):
+    return {'@odata.id': '/redfish/v1/Systems/System.Embedded.1/Storage/'
+                         'RAID.Integrated.1-1/Volumes/Disk.Virtual.0',
+            'VolumeType': 'NonRedundant',
+            'CapacityBytes': sum(d['CapacityBytes'] for d in drives),
+            'Links': {'Drives': [{'@odata.id': d['@odata.id']}
+                                 for d in drives]}}
+
+
+def answer(collector, responses):
+    # Sends responses to the requests of collector, in order, and answers
+    # its result
+    try:
+        next(collector)
+        for response in responses:
+            collector.send(response)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('collector asked more requests')
+
+
+def group_physical(drives):
+    links = [{'@odata.id': d['@odata.id']} for d in drives]
+    return answer(get_physical_disk_info('', DISK, drives=links), [drives])
+
+
+def group_logical(drives):
+    volume = make_volume(drives)
+    return answer(get_logical_disk_info('', DISK, '/Volumes'),
+                  [({'Members': [volume]}, [volume]), drives])
+
+
+def group_keyed(disks):
+    info, groups = [], {}
+    for disk_data in disks:
+        add_drive(groups, info, disk_data)
+    return info
+
+
+def group_by_scan(disks):
+    # The grouping of the physical disks before it was keyed: every drive
+    # scans the entries already made
+    info = []
+    for disk_data in disks:
+        disk_data = disk_data.as_dict()
+        for d in info:
+            if d['capacity_gb'] == disk_data['capacity_gb'] \
+                    and d['type'] == disk_data['type'] \
+                    and d['speed'] == disk_data['speed']:
+                d['count'] += 1
+                break
+        else:
+            disk_data.update({'count': 1, 'index': len(info)})
+            info.append(disk_data)
+    return info
+
+
+def summarize_by_append(drives):
+    # Length of the drive list of a volume before it was bounded: the list
+    # was extended while it was scanned
+    disk = []
+    for drive in drives:
+        disk_data = (drive['CapacityBytes'], drive['MediaType'])
+        if not disk:
+            disk.append(disk_data)
+        for r in disk:
+            if disk_data != r:
+                disk.append(disk_data)
+    return len(disk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Time the grouping of the drives of large arrays')
+    parser.add_argument(
+        "-d", "--drives", help='Drives per array. Default: 500',
+        required=False, type=int, default=500)
+    parser.add_argument(
+        "-n", "--number", help='Groupings per array. Default: 200',
+        required=False, type=int, default=200)
+    args = vars(parser.parse_args())
+    for media in (1, len(MEDIA), 0):
+        drives = make_drives(args['drives'], media)
+        disks = [read_drive(drive, DISK) for drive in drives]
+        print("{} drives, {} sizes".format(
+            len(drives), media or len(drives)))
+        for name, group, data in (('grouping', group_keyed, disks),
+                                  ('grouping (scan)', group_by_scan, disks),
+                                  ('physical disks', group_physical, drives),
+                                  ('logical disk', group_logical, drives)):
+            seconds = min(timeit.repeat(lambda: group(data), repeat=3,
+                                        number=args['number']))
+            print("  {:16} {:10.1f} us/array".format(
+                name, seconds / args['number'] * 1e6))
+        volume = group_logical(drives)['info'][0]
+        print("  drive entries of the volume: {}".format(len(volume['disks'])))
+    # The former summary grows with every drive that differs, only a few
+    # drives of a mixed array can be run
+    print("Former drive entries of a volume of 16 mixed drives: {}".format(
+        summarize_by_append(make_drives(16, len(MEDIA)))))
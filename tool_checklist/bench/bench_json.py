@@ -0,0 +1,104 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import timeit
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+from redfish_client import JSON_DECODERS
+
+
+def make_ilo_bios():
+    attributes = {'ThermalConfig': 'OptimalCooling',
+                  'PowerRegulator': 'StaticHighPerf'}
+    for i in range(400):
+        attributes['Attribute%03d' % i] = 'Value of attribute %d' % i
+    return {'@odata.id': '/redfish/v1/Systems/1/Bios/',
+            '@odata.type': '#Bios.v1_0_0.Bios', 'Attributes': attributes}
+
+
+def make_ilo_memory():
+    members = []
+    for i in range(24):
+        members.append({
+            '@odata.id': '/redfish/v1/Systems/1/Memory/proc1dimm%d/' % i,
+            'CapacityMiB': 32768, 'DeviceLocator': 'PROC 1 DIMM %d' % i,
+            'MemoryDeviceType': 'DDR4', 'OperatingSpeedMhz': 2933,
+            'PartNumber': '840758-091', 'RankCount': 2,
+            'Status': {'Health': 'OK', 'State': 'Enabled'},
+            'Oem': {'Hpe': {'DIMMStatus': 'GoodInUse', 'MinimumVoltage': 1.2,
+                            'VendorName': 'HPE', 'BaseModuleType': 'RDIMM'}}
+        })
+    return {'@odata.id': '/redfish/v1/Systems/1/Memory/',
+            'Members': members, 'Members@odata.count': len(members)}
+
+
+def make_idrac_drives():
+    members = []
+    for i in range(24):
+        members.append({
+            '@odata.id': '/redfish/v1/Systems/System.Embedded.1/Storage/'
+                         'RAID.Integrated.1-1/Drives/Disk.Bay.%d' % i,
+            'BlockSizeBytes': 512, 'CapacityBytes': 599550590976,
+            'Manufacturer': 'SEAGATE', 'MediaType': 'HDD',
+            'Model': 'ST600MM0009', 'Name': 'Physical Disk 0:1:%d' % i,
+            'RotationSpeedRPM': 10000, 'SerialNumber': 'W0M0%04d' % i,
+            'Location': [{'Info': '0:1:%d' % i, 'InfoFormat': 'Port:Bay'}],
+            'Status': {'Health': 'OK', 'HealthRollup': 'OK',
+                       'State': 'Enabled'}
+        })
+    return {'Members': members, 'Members@odata.count': len(members)}
+
+
+def load_payloads(payload_dir):
+    if payload_dir:
+        payloads = {}
+        for path in sorted(glob.glob(os.path.join(payload_dir, '*.json'))):
+            with open(path, 'rb') as f:
+                payloads[os.path.basename(path)] = f.read()
+        return payloads
+    return {
+        'ilo_bios': json.dumps(make_ilo_bios()).encode(),
+        'ilo_memory_expanded': json.dumps(make_ilo_memory()).encode(),
+        'idrac_drives_expanded': json.dumps(make_idrac_drives()).encode()
+    }
+
+
+def requests_json(content):
+    # What call_api_get did before: response.json() of requests
+    response = requests.Response()
+    response._content = content
+    return response.json()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare the JSON decoders on Redfish payloads')
+    parser.add_argument(
+        "-d", "--payload-dir", help='Directory of recorded responses '
+                                    '(*.json). Default: generated iLO/iDRAC '
+                                    'payloads',
+        required=False, default=None)
+    parser.add_argument(
+        "-n", "--number", help='Decodings per payload. Default: 2000',
+        required=False, type=int, default=2000)
+    args = vars(parser.parse_args())
+    decoders = dict(JSON_DECODERS)
+    decoders['requests'] = requests_json
+    for name, content in load_payloads(args['payload_dir']).items():
+        print("{} ({} bytes)".format(name, len(content)))
+        baseline = None
+        for decoder in ['requests'] + sorted(JSON_DECODERS):
+            loads = decoders[decoder]
+            seconds = min(timeit.repeat(lambda: loads(content), repeat=3,
+                                        number=args['number']))
+            per_doc = seconds / args['number'] * 1e6
+            if baseline is None:
+                baseline = per_doc
+            print("  {:10} {:10.1f} us/doc {:8.1f} MB/s  x{:.1f}".format(
+                decoder, per_doc, len(content) / per_doc,
+                baseline / per_doc))
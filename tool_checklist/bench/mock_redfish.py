@@ -0,0 +1,784 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+from request_metrics import get_endpoint
+
+DEFAULT_USERNAME = 'admin'
+DEFAULT_PASSWORD = 'password'
+DEFAULT_ELCM_JOB_SECONDS = 5
+EXPAND_FEATURES = {'ExpandAll': True, 'Levels': True, 'MaxLevels': 1,
+                   'Links': True, 'NoLinks': True}
+
+
+def add_collection(tree, url, members):
+    # Members are stored at url/<index>, answers their uris
+    uris = []
+    for index, member in enumerate(members):
+        uri = url + str(index) + '/' if url.endswith('/') \
+            else url + '/' + str(index)
+        tree[uri] = dict(member, **{'@odata.id': uri})
+        uris.append(uri)
+    tree[url] = {'@odata.id': url,
+                 'Members': [{'@odata.id': uri} for uri in uris],
+                 'Members@odata.count': len(uris)}
+    return uris
+
+
+def add_members(tree, url, members):
+    # Same as add_collection with the ids of the members given
+    uris = []
+    for member_id, member in members:
+        uri = url + '/' + member_id
+        tree[uri] = dict(member, **{'@odata.id': uri, 'Id': member_id})
+        uris.append(uri)
+    tree[url] = {'@odata.id': url,
+                 'Members': [{'@odata.id': uri} for uri in uris],
+                 'Members@odata.count': len(uris)}
+    return uris
+
+
+def get_status(health='OK', state='Enabled'):
+    return {'Health': health, 'State': state}
+
+
+def hpe_tree(generation, index, controllers=1):
+    ilo4 = generation == 'ilo4'
+    oem = 'Hp' if ilo4 else 'Hpe'
+    tree = {}
+    root = {'@odata.id': '/redfish/v1/', 'RedfishVersion': '1.0.0'}
+    if not ilo4:
+        root['RedfishVersion'] = '1.6.0'
+        root['ProtocolFeaturesSupported'] = {'ExpandQuery': EXPAND_FEATURES,
+                                             'SelectQuery': False}
+    tree['/redfish/v1/'] = root
+    tree['/redfish/v1/Systems/1/'] = {
+        'BiosVersion': 'P89 v2.80 (10/16/2020)' if ilo4
+        else 'U30 v2.42 (01/23/2021)',
+        'Model': 'ProLiant DL380 Gen9' if ilo4 else 'ProLiant DL380 Gen10',
+        'SerialNumber': 'CZJ%07d' % index,
+        'MemorySummary': {
+            'Status': {'HealthRollUp' if ilo4 else 'HealthRollup': 'OK'},
+            'TotalSystemMemoryGiB': 384},
+        'ProcessorSummary': {
+            'Count': 2,
+            'Model': 'Intel(R) Xeon(R) CPU E5-2680 v4 @ 2.40GHz' if ilo4
+            else 'Intel(R) Xeon(R) Gold 6252 CPU @ 2.10GHz'},
+        'Status': get_status()
+    }
+    version = 'iLO 4 v2.78' if ilo4 else 'iLO 5 v2.44'
+    tree['/redfish/v1/Managers/1/'] = {
+        'FirmwareVersion': version,
+        'Oem': {oem: {'Firmware': {'Current': {
+            'VersionString': version, 'Date': 'Apr 30 2021'}}}}
+    }
+    tree['/redfish/v1/Managers/1/SnmpService/'] = {
+        'Status': {'State': 'Enabled'}, 'ReadCommunities': ['public', '', '']
+    }
+    settings = {'ThermalConfig': 'OptimalCooling',
+                'PowerRegulator': 'StaticHighPerf',
+                'PowerProfile': 'MaxPerf'}
+    for i in range(400):
+        settings['Attribute%03d' % i] = 'Value of attribute %d' % i
+    if ilo4:
+        tree['/redfish/v1/Systems/1/Bios/'] = settings
+    else:
+        tree['/redfish/v1/Systems/1/Bios/'] = {'Attributes': settings}
+    tree['/redfish/v1/Chassis/1/Thermal/'] = {'Fans': [
+        {'Name': 'Fan %d' % i, 'Status': get_status()} for i in range(6)]}
+    tree['/redfish/v1/Chassis/1/Power/'] = {
+        'PowerSupplies': [{'MemberId': str(i), 'PowerCapacityWatts': 800,
+                           'Status': get_status()} for i in range(2)],
+        'Redundancy': [{'Mode': 'Failover'}]
+    }
+    add_collection(tree, '/redfish/v1/Systems/1/Processors/', [
+        {'Socket': 'Proc %d' % (i + 1), 'TotalCores': 14 if ilo4 else 24,
+         'TotalThreads': 28 if ilo4 else 48,
+         'Model': tree['/redfish/v1/Systems/1/']['ProcessorSummary']['Model'],
+         'Status': get_status()} for i in range(2)])
+    dimms = []
+    for i in range(24):
+        present = i % 2 == 0
+        if ilo4:
+            dimms.append({'SocketLocator': 'PROC %d DIMM %d' % (i // 12 + 1,
+                                                                 i % 12 + 1),
+                          'SizeMB': 32768 if present else 0,
+                          'DIMMType': 'DDR4',
+                          'DIMMStatus': 'GoodInUse' if present
+                          else 'NotPresent'})
+        else:
+            dimms.append({'DeviceLocator': 'PROC %d DIMM %d' % (i // 12 + 1,
+                                                                 i % 12 + 1),
+                          'CapacityMiB': 32768 if present else 0,
+                          'MemoryDeviceType': 'DDR4',
+                          'Status': get_status('OK' if present else None,
+                                               'Enabled' if present
+                                               else 'Absent')})
+    add_collection(tree, '/redfish/v1/Systems/1/Memory/', dimms)
+    adapters = [{'Name': 'HP Ethernet 10Gb 2-port 560FLR-SFP+ Adapter',
+                 'Status': get_status()},
+                {'Name': 'HP Ethernet 1Gb 4-port 331i Adapter',
+                 'Status': get_status()}]
+    add_collection(tree, '/redfish/v1/Systems/1/NetworkAdapters/' if ilo4
+                   else '/redfish/v1/Systems/1/BaseNetworkAdapters/',
+                   adapters)
+    uris = add_collection(
+        tree, '/redfish/v1/Systems/1/SmartStorage/ArrayControllers/',
+        [{'Model': 'Smart Array P440ar' if ilo4
+          else 'HPE Smart Array P408i-a'}] * controllers)
+    for number, controller in enumerate(uris):
+        drives = add_collection(tree, controller + 'DiskDrives/', [
+            {'CapacityGB': 600, 'MediaType': 'HDD',
+             'RotationalSpeedRpm': 10000,
+             'Location': '%dI:1:%d' % (number + 1, i + 1),
+             'LocationFormat': 'ControllerPort:Box:Bay',
+             'Status': get_status()} for i in range(8)])
+        volumes = add_collection(tree, controller + 'LogicalDrives/', [
+            {'Raid': '1', 'CapacityMiB': 572293},
+            {'Raid': '5', 'CapacityMiB': 1716880}])
+        for volume, members in zip(volumes, (drives[:2], drives[2:])):
+            tree[volume + 'DataDrives/'] = {
+                'Members': [{'@odata.id': uri} for uri in members],
+                'Members@odata.count': len(members)}
+    return tree
+
+
+def dell_tree(generation, index, controllers=1):
+    idrac8 = generation == 'idrac8'
+    system = '/redfish/v1/Systems/System.Embedded.1'
+    chassis = '/redfish/v1/Chassis/System.Embedded.1'
+    manager = '/redfish/v1/Managers/iDRAC.Embedded.1'
+    tree = {}
+    root = {'@odata.id': '/redfish/v1', 'RedfishVersion': '1.0.2'}
+    if not idrac8:
+        root['RedfishVersion'] = '1.6.0'
+        root['ProtocolFeaturesSupported'] = {'ExpandQuery': EXPAND_FEATURES,
+                                             'SelectQuery': True}
+    tree['/redfish/v1'] = root
+    for name, uri in (('Systems', system), ('Chassis', chassis),
+                      ('Managers', manager)):
+        tree['/redfish/v1/' + name] = {'Members': [{'@odata.id': uri}],
+                                       'Members@odata.count': 1}
+    tree[system] = {
+        'BiosVersion': '2.12.2' if idrac8 else '2.10.2',
+        'Model': 'PowerEdge R730' if idrac8 else 'PowerEdge R740',
+        'SerialNumber': 'CN7%011d' % index, 'SKU': 'D%06d' % index,
+        # iDRAC 8 reports GB, collect_device converts them
+        'MemorySummary': {'Status': get_status(),
+                          'TotalSystemMemoryGiB': 238.4 if idrac8 else 256},
+        'ProcessorSummary': {'Count': 2,
+                             'Model': 'Intel(R) Xeon(R) CPU E5-2650 v4 @ '
+                                      '2.20GHz' if idrac8
+                             else 'Intel(R) Xeon(R) Gold 6252 CPU @ 2.10GHz'},
+        'Status': get_status()
+    }
+    tree[manager] = {'Model': '13G Monolithic' if idrac8
+                     else '14G Monolithic',
+                     'FirmwareVersion': '2.75.75.75' if idrac8
+                     else '4.40.00.00'}
+    tree[manager + '/NetworkProtocol'] = {'SNMP': {'ProtocolEnabled': True,
+                                                   'Port': 161}}
+    tree[chassis + '/Thermal'] = {'Fans': [
+        {'Name': 'System Board Fan%d' % (i + 1), 'Status': get_status()}
+        for i in range(6)]}
+    supplies = []
+    for i in range(2):
+        if idrac8:
+            supplies.append({'Name': 'PS%d Status' % (i + 1),
+                             'Model': 'PWR SPLY,750W,RDNT,DELTA',
+                             'Status': get_status()})
+        else:
+            supplies.append({'Name': 'PS%d Status' % (i + 1),
+                             'PowerCapacityWatts': 750,
+                             'Status': get_status()})
+    tree[chassis + '/Power'] = {'PowerSupplies': supplies,
+                                'Redundancy': [{'Mode': 'N+m'}],
+                                'PowerControl': [{'PowerConsumedWatts': 312}]}
+    add_members(tree, system + '/Processors', [
+        ('CPU.Socket.%d' % (i + 1),
+         {'Socket': 'CPU.Socket.%d' % (i + 1), 'TotalCores': 12 if idrac8
+          else 24, 'TotalThreads': 24 if idrac8 else 48,
+          'Model': tree[system]['ProcessorSummary']['Model'],
+          'Status': get_status()}) for i in range(2)])
+    add_members(tree, system + '/Memory', [
+        ('DIMM.Socket.%s%d' % ('AB'[i // 8], i % 8 + 1),
+         {'DeviceLocator': 'DIMM.Socket.%s%d' % ('AB'[i // 8], i % 8 + 1),
+          # iDRAC 8 reports MB
+          'CapacityMiB': 30517 if idrac8 else 32768,
+          'MemoryDeviceType': 'DDR4', 'Status': get_status()})
+        for i in range(16)])
+    add_members(tree, system + '/NetworkAdapters', [
+        ('NIC.Integrated.1', {'Model': 'Intel(R) Ethernet 10G X710 rNDC',
+                              'Name': 'Network Adapter View',
+                              'Status': get_status()}),
+        ('NIC.Slot.3', {'Model': 'Mellanox ConnectX-4 Lx',
+                        'Name': 'Network Adapter View',
+                        'Status': get_status()})])
+    # The integrated PERC, then PERCs in slots
+    names = ['RAID.Integrated.1-1'] + ['RAID.Slot.%d-1' % (i + 2)
+                                       for i in range(controllers - 1)]
+    add_members(tree, system + '/Storage', [
+        ('AHCI.Embedded.1-1', {'Name': 'AHCI controller'})] + [
+        (name, {'Name': 'PERC H730P Mini'}) for name in names])
+    for number, name in enumerate(names):
+        controller = system + '/Storage/' + name
+        drives = []
+        for i in range(8):
+            uri = '%s/Drives/Disk.Bay.%d:Enclosure.Internal.0-1:%s' \
+                  % (controller, i, name)
+            tree[uri] = {'@odata.id': uri,
+                         'Name': 'Physical Disk %d:1:%d' % (number, i),
+                         'CapacityBytes': 599550590976, 'MediaType': 'HDD',
+                         'RotationSpeedRPM': 10000, 'Status': get_status()}
+            drives.append(uri)
+        add_members(tree, controller + '/Volumes', [
+            ('Disk.Virtual.0:' + name,
+             {'VolumeType': 'Mirrored', 'CapacityBytes': 599550590976,
+              'Links': {'Drives': [{'@odata.id': uri}
+                                   for uri in drives[:2]]}}),
+            ('Disk.Virtual.1:' + name,
+             {'VolumeType': 'StripedWithParity',
+              'CapacityBytes': 1798651772928,
+              'Links': {'Drives': [{'@odata.id': uri}
+                                   for uri in drives[2:]]}})])
+        tree[controller] = dict(tree[controller], **{
+            'Volumes': {'@odata.id': controller + '/Volumes'},
+            'Drives': [{'@odata.id': uri} for uri in drives]})
+    return tree
+
+
+def fjs_tree(generation, index, controllers=1):
+    system = '/redfish/v1/Systems/0'
+    chassis = '/redfish/v1/Chassis/0'
+    manager = '/redfish/v1/Managers/iRMC'
+    tree = {'/redfish/v1': {'@odata.id': '/redfish/v1',
+                            'RedfishVersion': '1.0.0'}}
+    for name, uri in (('Systems', system), ('Chassis', chassis),
+                      ('Managers', manager)):
+        tree['/redfish/v1/' + name] = {'Members': [{'@odata.id': uri}],
+                                       'Members@odata.count': 1}
+    tree[system] = {
+        'BiosVersion': 'V5.0.0.14 R1.38.0 for D3384-B1x',
+        'Model': 'PRIMERGY RX2540 M5', 'SerialNumber': 'YM5A%06d' % index,
+        'SKU': 'S26361-K1652-V402',
+        'MemorySummary': {'Status': get_status(),
+                          'TotalSystemMemoryGiB': 384},
+        'ProcessorSummary': {'Count': 2,
+                             'Model': 'Intel(R) Xeon(R) Gold 6240 CPU @ '
+                                      '2.60GHz'},
+        'Status': get_status()
+    }
+    tree[manager] = {'Model': 'iRMC S5', 'FirmwareVersion': '2.63P'}
+    tree[manager + '/ManagerNetwork'] = {'SNMP': {'ProtocolEnabled': True}}
+    tree[chassis + '/Thermal'] = {'Fans': [
+        {'Name': 'FAN%d SYS' % (i + 1),
+         'Status': get_status(state='Enabled' if i < 6 else 'Absent')}
+        for i in range(8)]}
+    tree[chassis + '/Power'] = {
+        'PowerSupplies': [{'Name': 'PSU%d' % (i + 1),
+                           'PowerCapacityWatts': 800, 'Status': get_status()}
+                          for i in range(2)],
+        'PowerControl': [{'PowerConsumedWatts': 280}], 'Redundancy': []}
+    add_collection(tree, system + '/Processors', [
+        {'Socket': 'CPU%d' % (i + 1), 'TotalCores': 18, 'TotalThreads': 36,
+         'Model': tree[system]['ProcessorSummary']['Model'],
+         'Status': get_status()} for i in range(2)])
+    add_collection(tree, system + '/Memory', [
+        {'DeviceLocator': 'DIMM-%d%s' % (i // 6 + 1, 'ABCDEF'[i % 6]),
+         'CapacityMiB': 32768, 'MemoryDeviceType': 'DDR4',
+         'Status': get_status()} for i in range(12)])
+    add_collection(tree, chassis + '/NetworkAdapters', [
+        {'Model': 'PLAN EP X710-DA2 2x10Gb SFP+', 'Name': 'PCIe Slot 1',
+         'Status': get_status()},
+        {'Model': 'PLAN CP I350-T4 4x1Gbit Cu', 'Name': 'OCP',
+         'Status': get_status()}])
+    uris = add_collection(tree, system + '/Storage',
+                          [{'Name': 'PRAID EP420i'}] * controllers)
+    for number, controller in enumerate(uris):
+        drives = add_collection(tree, controller + '/Drives', [
+            {'Name': 'HDD%d' % i, 'CapacityBytes': 1200243695616,
+             'MediaType': 'HDD', 'RotationSpeedRPM': 10000,
+             'Location': {'Info': '[%d:%d]' % (number, i),
+                          'InfoFormat': '[Port:Bay]'},
+             'Status': get_status()} for i in range(6)])
+        add_collection(tree, controller + '/Volumes', [
+            {'RAIDType': 'RAID1', 'VolumeType': 'Mirrored',
+             'CapacityBytes': 1200243695616,
+             'Links': {'Drives': [{'@odata.id': uri}
+                                  for uri in drives[:2]]}},
+            {'RAIDType': 'RAID5', 'VolumeType': 'StripedWithParity',
+             'CapacityBytes': 3600731086848,
+             'Links': {'Drives': [{'@odata.id': uri}
+                                  for uri in drives[2:]]}}])
+        tree[controller] = dict(tree[controller], **{
+            'Volumes': {'@odata.id': controller + '/Volumes'},
+            'Drives': [{'@odata.id': uri} for uri in drives]})
+    tree['/rest/v1/Oem/eLCM/ProfileManagement/Server'] = fjs_server_profile()
+    return tree
+
+
+def fjs_server_profile():
+    # The Server profile holds every setting of the server, only CpuConfig
+    # is read by the tool
+    bios = {'CpuConfig': {'EnergyPerformanceMode': 'OptimizedPerformance',
+                          'OsEnergyPerformanceOverrideEnabled': 'True'}}
+    for i in range(200):
+        bios['Config%03d' % i] = {'Setting%d' % j: 'Value of setting %d' % j
+                                  for j in range(20)}
+    return {'Server': {'SystemConfig': {'BiosConfig': bios}}}
+
+
+def get_sub_profile(profile, names):
+    # The part of the profile under Server/SystemConfig/BiosConfig, with the
+    # keys above it
+    if not names:
+        return profile
+    return {names[0]: get_sub_profile(profile[names[0]], names[1:])}
+
+
+def get_node_uri(uri, node):
+    # The uri of the same resource on another node: the last number is the
+    # node
+    return re.sub(r'\d+$', lambda m: str(int(m.group()) + node), uri)
+
+
+def add_nodes(tree, count):
+    # Makes the server a chassis of count nodes: its system and chassis are
+    # copied under the next ids, every system links its chassis and the one
+    # manager
+    system = [url for url, body in tree.items()
+              if 'ProcessorSummary' in body][0]
+    chassis = [url[:-len('/Thermal')] for url in tree
+               if url.endswith('/Thermal')][0]
+    manager = [url for url, body in tree.items()
+               if '/Managers/' in url and 'FirmwareVersion' in body][0]
+    for prefix in (system, chassis):
+        pattern = re.compile(re.escape(prefix) + '(?=[/"])')
+        copied = {url: body for url, body in tree.items()
+                  if url == prefix or url.startswith(prefix + '/')}
+        for node in range(1, count):
+            uri = get_node_uri(prefix, node)
+            for url, body in copied.items():
+                tree[uri + url[len(prefix):]] = json.loads(
+                    pattern.sub(uri, json.dumps(body)))
+    for node in range(count):
+        uri = get_node_uri(system, node)
+        body = tree[uri]
+        body.update({'@odata.id': uri, 'Links': {
+            'Chassis': [{'@odata.id': get_node_uri(chassis, node)}],
+            'ManagedBy': [{'@odata.id': manager}]}})
+        for name in ('SerialNumber', 'SKU'):
+            if node and name in body:
+                body[name] += 'N%d' % node
+    for prefix in (system, chassis):
+        collection = prefix.rsplit('/', 1)[0]
+        members = [{'@odata.id': get_node_uri(prefix, node)}
+                   for node in range(count)]
+        tree[collection] = {'@odata.id': collection, 'Members': members,
+                            'Members@odata.count': count}
+
+
+# model: (vendor as found by ansible, builder of the tree)
+MODELS = {
+    'ilo4': ('HPE', hpe_tree),
+    'ilo5': ('HPE', hpe_tree),
+    'idrac8': ('Dell Inc.', dell_tree),
+    'idrac9': ('Dell Inc.', dell_tree),
+    'irmc': ('FUJITSU', fjs_tree)
+}
+
+
+def normalize(path):
+    return path.rstrip('/') or '/'
+
+
+def select_properties(body, select):
+    # $select=Attributes/ThermalConfig,Status keeps those properties only
+    result = {k: v for k, v in body.items() if k.startswith('@odata')}
+    for prop in select:
+        names = prop.split('/')
+        source, target = body, result
+        for name in names[:-1]:
+            if not isinstance(source.get(name), dict):
+                source = None
+                break
+            source = source[name]
+            target = target.setdefault(name, {})
+        if source is not None and names[-1] in source:
+            target[names[-1]] = source[names[-1]]
+    return result
+
+
+class MockOptions(object):
+    # Latency in seconds, uniform jitter around it and rate of 503 answers,
+    # for every endpoint or per endpoint template (as in --metrics:
+    # Systems/{id}/Memory/{id}), RAID controllers and nodes of the servers
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 endpoints=None, username=DEFAULT_USERNAME,
+                 password=DEFAULT_PASSWORD,
+                 elcm_job_seconds=DEFAULT_ELCM_JOB_SECONDS, controllers=1,
+                 nodes=1):
+        self.default = {'latency': latency, 'jitter': jitter,
+                        'error_rate': error_rate}
+        self.endpoints = endpoints or {}
+        self.username = username
+        self.password = password
+        self.elcm_job_seconds = elcm_job_seconds
+        self.controllers = controllers
+        self.nodes = nodes
+
+    def get(self, endpoint):
+        options = dict(self.default)
+        options.update(self.endpoints.get(endpoint, {}))
+        return options
+
+
+class MockBMC(object):
+    # State of one simulated BMC: its resources, sessions and eLCM jobs
+
+    def __init__(self, model, index, options):
+        self.model = model
+        self.vendor, build = MODELS[model]
+        self.tree = {normalize(url): body
+                     for url, body in build(model, index,
+                                            options.controllers).items()}
+        if options.nodes > 1:
+            add_nodes(self.tree, options.nodes)
+        self.options = options
+        self.etags = model in ('ilo5', 'idrac9')
+        self.sessions = {}
+        self.jobs = {}
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def get_session_url(self):
+        if self.model == 'idrac8':
+            return '/redfish/v1/Sessions'
+        return '/redfish/v1/SessionService/Sessions'
+
+    def is_authorized(self, headers):
+        token = headers.get('X-Auth-Token')
+        if token:
+            return token in self.sessions.values()
+        authorization = headers.get('Authorization', '')
+        if authorization.startswith('Basic '):
+            credentials = base64.b64decode(authorization[6:]).decode()
+            return credentials == '{}:{}'.format(self.options.username,
+                                                 self.options.password)
+        return False
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def bmc(self):
+        return self.server.bmc
+
+    def reply(self, code, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def simulate(self, path):
+        # Answers False when the request was failed with a 503
+        options = self.bmc.options.get(get_endpoint(path))
+        delay = options['latency'] + random.uniform(-options['jitter'],
+                                                    options['jitter'])
+        if delay > 0:
+            time.sleep(delay)
+        with self.bmc.lock:
+            self.bmc.requests += 1
+        if random.random() < options['error_rate']:
+            self.reply(503, {'error': 'Service Unavailable'})
+            return False
+        return True
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = normalize(url.path)
+        if not self.simulate(path):
+            return
+        if path != '/redfish/v1' and not self.bmc.is_authorized(self.headers):
+            return self.reply(401, {'error': 'Unauthorized'})
+        if path.startswith(self.bmc.get_session_url() + '/'):
+            if path in self.bmc.sessions:
+                return self.reply(200, {'@odata.id': path})
+            return self.reply(404, {'error': 'Not Found'})
+        if path.startswith('/sessionInformation/'):
+            return self.get_elcm_status(path)
+        if path in self.bmc.profiles:
+            return self.reply(200, self.bmc.profiles[path])
+        body = self.bmc.tree.get(path)
+        if body is None:
+            return self.reply(404, {'error': 'Not Found'})
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self.apply_query(body, query)
+        if not self.bmc.etags:
+            return self.reply(200, body)
+        etag = '"%s"' % hashlib.md5(
+            json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, headers={'ETag': etag})
+        self.reply(200, body, {'ETag': etag})
+
+    def apply_query(self, body, query):
+        features = self.bmc.tree[normalize('/redfish/v1')].get(
+            'ProtocolFeaturesSupported', {})
+        if '$expand' in query and features.get('ExpandQuery') \
+                and 'Members' in body:
+            body = dict(body, Members=[
+                self.bmc.tree.get(normalize(member['@odata.id']), member)
+                for member in body['Members']])
+        if '$select' in query and features.get('SelectQuery'):
+            body = select_properties(body, unquote(query['$select'])
+                                     .split(','))
+        return body
+
+    def do_POST(self):
+        body = self.read_body()
+        url = urlsplit(self.path)
+        path = normalize(url.path)
+        if not self.simulate(path):
+            return
+        if path == self.bmc.get_session_url():
+            return self.create_session(body)
+        if path.endswith('/Sessions'):
+            # The sessions of another BMC generation
+            return self.reply(404, {'error': 'Not Found'})
+        if not self.bmc.is_authorized(self.headers):
+            return self.reply(401, {'error': 'Unauthorized'})
+        if self.bmc.vendor == 'FUJITSU' \
+                and path == '/rest/v1/Oem/eLCM/ProfileManagement/get':
+            return self.start_elcm_job(parse_qs(url.query))
+        self.reply(405, {'error': 'Method Not Allowed'})
+
+    def do_DELETE(self):
+        path = normalize(urlsplit(self.path).path)
+        if not self.simulate(path):
+            return
+        if not self.bmc.is_authorized(self.headers):
+            return self.reply(401, {'error': 'Unauthorized'})
+        with self.bmc.lock:
+            if self.bmc.sessions.pop(path, None) \
+                    or self.bmc.profiles.pop(path, None) \
+                    or self.remove_elcm_job(path):
+                return self.reply(200, {})
+        self.reply(404, {'error': 'Not Found'})
+
+    def create_session(self, body):
+        try:
+            credentials = json.loads(body)
+        except ValueError:
+            credentials = {}
+        if credentials.get('UserName') != self.bmc.options.username \
+                or credentials.get('Password') != self.bmc.options.password:
+            return self.reply(401, {'error': 'Unauthorized'})
+        with self.bmc.lock:
+            location = '{}/{}'.format(self.bmc.get_session_url(),
+                                      len(self.bmc.sessions) + 1)
+            while location in self.bmc.sessions:
+                location += '0'
+            token = base64.b16encode(os.urandom(16)).decode().lower()
+            self.bmc.sessions[location] = token
+        if self.bmc.vendor == 'HPE':
+            # iLO answers an absolute Location
+            location = 'https://{}:{}{}'.format(
+                self.server.server_address[0], self.server.server_address[1],
+                location)
+        self.reply(201, {'@odata.id': location},
+                   {'X-Auth-Token': token, 'Location': location})
+
+    def start_elcm_job(self, query):
+        param = query.get('PARAM_PATH', ['Server'])[0]
+        name = param.split('/')[-1]
+        profile_url = '/rest/v1/Oem/eLCM/ProfileManagement/' + name
+        with self.bmc.lock:
+            if profile_url in self.bmc.profiles:
+                return self.reply(409, {'error': 'Profile already exists'})
+            job_id = len(self.bmc.jobs) + 1
+            while job_id in self.bmc.jobs:
+                job_id += 1
+            self.bmc.jobs[job_id] = (time.monotonic(), profile_url, param)
+        self.reply(202, {'Session': {'Id': job_id, 'Status': 'activated'}})
+
+    def get_elcm_status(self, path):
+        parts = path.split('/')
+        try:
+            job_id = int(parts[2])
+        except (IndexError, ValueError):
+            return self.reply(404, {'error': 'Not Found'})
+        with self.bmc.lock:
+            job = self.bmc.jobs.get(job_id)
+            if job is None:
+                return self.reply(404, {'error': 'Not Found'})
+            started, profile_url, param = job
+            if time.monotonic() - started < self.bmc.options.elcm_job_seconds:
+                status = 'running'
+            else:
+                status = 'terminated regularly'
+                if profile_url not in self.bmc.profiles:
+                    self.bmc.profiles[profile_url] = get_sub_profile(
+                        fjs_server_profile(), param.split('/'))
+        self.reply(200, {'Session': {'Id': job_id, 'Status': status}})
+
+    def remove_elcm_job(self, path):
+        parts = path.split('/')
+        if len(parts) != 4 or parts[1] != 'sessionInformation' \
+                or parts[3] != 'remove':
+            return False
+        try:
+            return self.bmc.jobs.pop(int(parts[2]), None) is not None
+        except ValueError:
+            return False
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients close the connection once they have read what they need
+        # (streamed profiles), that is not an error of the BMC
+        if not isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLError)):
+            super(MockServer, self).handle_error(request, client_address)
+
+
+def get_ssl_context(cert=None, key=None):
+    # A self-signed certificate is made with openssl when none is given
+    if cert is None:
+        directory = tempfile.mkdtemp(prefix='mock_redfish_')
+        cert = os.path.join(directory, 'cert.pem')
+        key = os.path.join(directory, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048',
+                        '-nodes', '-keyout', key, '-out', cert, '-days', '1',
+                        '-subj', '/CN=mock-redfish'],
+                       check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def start_bmc(model, index, options, context, host='127.0.0.1', port=0):
+    server = MockServer((host, port), MockHandler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    server.bmc = MockBMC(model, index, options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_fleet(models, count, options, context, host='127.0.0.1'):
+    # count BMCs, the models taken in turn. Answers the servers, their
+    # address is host:port
+    return [start_bmc(models[i % len(models)], i, options, context, host)
+            for i in range(count)]
+
+
+def get_address(server):
+    return '{}:{}'.format(*server.server_address)
+
+
+def load_endpoints(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Local Redfish server standing in for iLO, iDRAC and '
+                    'iRMC BMCs')
+    parser.add_argument(
+        "-n", "--count", help='Number of BMCs, one port each. Default: 1',
+        required=False, type=int, default=1)
+    parser.add_argument(
+        "-m", "--models", help='Comma separated models of the BMCs, taken in '
+                               'turn, among %s. Default: all'
+                               % ', '.join(sorted(MODELS)),
+        required=False, default=','.join(sorted(MODELS)))
+    parser.add_argument(
+        "--host", help='Address to listen on. Default: 127.0.0.1',
+        required=False, default='127.0.0.1')
+    parser.add_argument(
+        "--latency", help='Seconds before each answer. Default: 0',
+        required=False, type=float, default=0.0)
+    parser.add_argument(
+        "--jitter", help='Random seconds added to or removed from the '
+                         'latency. Default: 0',
+        required=False, type=float, default=0.0)
+    parser.add_argument(
+        "--error-rate", help='Rate of requests answered 503. Default: 0',
+        required=False, type=float, default=0.0)
+    parser.add_argument(
+        "--endpoints", help='JSON file of latency, jitter and error_rate per '
+                            'endpoint template, e.g. {"Systems/{id}/Memory/'
+                            '{id}": {"latency": 0.3}}. Default: none',
+        required=False, default=None)
+    parser.add_argument(
+        "--elcm-job-seconds", help='Seconds an eLCM profile job runs. '
+                                   'Default: %d' % DEFAULT_ELCM_JOB_SECONDS,
+        required=False, type=float, default=DEFAULT_ELCM_JOB_SECONDS)
+    parser.add_argument(
+        "--controllers", help='RAID controllers of each BMC, each with its '
+                              'drives and 2 volumes. Default: 1',
+        required=False, type=int, default=1)
+    parser.add_argument(
+        "--nodes", help='Nodes of each BMC, a chassis manager when more '
+                        'than 1. Default: 1',
+        required=False, type=int, default=1)
+    parser.add_argument(
+        "--cert", help='TLS certificate. Default: self-signed',
+        required=False, default=None)
+    parser.add_argument(
+        "--key", help='TLS key of --cert', required=False, default=None)
+    args = vars(parser.parse_args())
+    models = args['models'].split(',')
+    for model in models:
+        if model not in MODELS:
+            parser.error("unknown model {}".format(model))
+    options = MockOptions(args['latency'], args['jitter'], args['error_rate'],
+                          load_endpoints(args['endpoints']),
+                          elcm_job_seconds=args['elcm_job_seconds'],
+                          controllers=args['controllers'],
+                          nodes=args['nodes'])
+    fleet = start_fleet(models, args['count'], options,
+                        get_ssl_context(args['cert'], args['key']),
+                        args['host'])
+    for server in fleet:
+        print("{} {} {}".format(get_address(server), server.bmc.vendor,
+                                server.bmc.model))
+    print("[Info] Serving {} BMCs, user {} password {}".format(
+        len(fleet), options.username, options.password))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -1,11 +1,18 @@
 import argparse
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import heapq
+import itertools
 import os
-import re
+import time
 import requests
 import json
 import urllib3
 import openpyxl
 
+from concurrent.futures import ThreadPoolExecutor
 from ansible import context
 from ansible.cli import CLI
 from ansible.module_utils.common.collections import ImmutableDict
@@ -13,527 +20,689 @@ from ansible.executor.playbook_executor import PlaybookExecutor
 from ansible.parsing.dataloader import DataLoader
 from ansible.inventory.manager import InventoryManager
 from ansible.vars.manager import VariableManager
-from requests.api import patch
-from pprint import pprint
 from openpyxl.styles.borders import Border, Side
+from response_cache import ResponseCache, DEFAULT_CACHE_TTL, \
+    DEFAULT_CACHE_SIZE, get_etag
+from session_store import SessionStore
+from topology import TopologyLookup, TopologyTemplates
+from json_extract import JsonExtractor
+from request_metrics import RequestMetrics, DEFAULT_METRICS_TOP
+from vendor_profiles import VENDOR_PROFILES
+from records import RECORDS, Drive, DriveGroup
+from server_archive import ServerArchive, ReplayError, get_archive_path
+from request_scheduler import RequestScheduler, DEFAULT_MAX_IN_FLIGHT, \
+    DEFAULT_BMC_LIMIT, DEFAULT_SUBNET_LIMIT, DEFAULT_SUBNET_PREFIX
+from redfish_client import RedfishClient, AsyncRedfishClient, \
+    RedfishRequest, RedfishResource, RedfishCollection, RedfishExtract, \
+    RedfishDelay, RedfishParallel, SectionStats, SECTION_STATS, \
+    BudgetExceeded, DEFAULT_POOL_SIZE, \
+    DEFAULT_TIMEOUT, DEFAULT_RETRIES, \
+    add_query, get_expand_query, get_select_query, is_expanded, \
+    is_select_supported
 
 CURRENT_DIR = os.getcwd()
+DEFAULT_BUDGET = 300
+# Value of a section that did not finish within the time budget of the server
+SECTION_TIMEOUT = 'NOK. timeout'
+# Systems of a chassis, for the profiles that do not look them up
+SYSTEMS_URL = '/redfish/v1/Systems/'
+# Fujitsu eLCM profile jobs
+ELCM_PROFILE_URL = "/rest/v1/Oem/eLCM/ProfileManagement/"
+ELCM_POLL_INTERVAL = 2
+ELCM_JOB_TIMEOUT = 120
+
+
+def get_cache_entry(url, client):
+    if client.cache is None:
+        return None, None
+    entry = client.cache.get(url)
+    if not entry:
+        return None, None
+    return entry, {'If-None-Match': entry['etag']}
+
+
+def get_known_not_found(url, client):
+    # Body of a url that answers 404 on every server of this model
+    if client.template is None:
+        return None
+    return client.template.not_found.get(url[len(client.base_url):])
 
 
-def call_api_get(url, headers):
-    try:
-        response = requests.get(url, headers=headers, verify=False)
-    except Exception as e:
-        print(e)
-        return False
+def learn_not_found(url, body, client):
+    template = client.template
+    path = url[len(client.base_url):]
+    if template.is_templated_url(path):
+        template.failed = True
+    else:
+        template.learned_not_found[path] = body
+
+
+def read_api_response(url, response, client, entry=None):
+    if entry and response.status_code == 304:
+        client.cache.hit(url)
+        return entry['body']
     if str(response.status_code).startswith('4'):
         print("[Fail] Can not get information at url: {}. "
               "Code {}".format(url, response.status_code))
-    return response.json()
+    # Parsed from the raw bytes, without the text decoding of response.json()
+    body = client.decode_json(response.content)
+    if client.template is not None and response.status_code == 404:
+        learn_not_found(url, body, client)
+    if client.cache is not None and response.status_code == 200:
+        etag = get_etag(response, body)
+        if etag:
+            client.cache.put(url, etag, body)
+    return body
+
+
+def get_failed(error, client):
+    # A GET that failed once the deadline is past was cut short by the time
+    # budget: it is skipped, so that its section is reported as timed out
+    # rather than complete without it
+    if isinstance(error, BudgetExceeded):
+        return False
+    if client.timed_out():
+        client.count_skipped()
+    else:
+        print(error)
+    return False
 
 
-def hpe_get_session_token(base_url, username, password):
-    headers = {"Content-Type": "application/json", "OData-Version": "4.0"}
-    rq_data = json.dumps({"UserName": username, "Password": password})
-    url = base_url + "/redfish/v1/SessionService/Sessions/"
+def call_api_get(url, client):
+    if client.timed_out():
+        client.count_skipped()
+        return False
+    known = get_known_not_found(url, client)
+    if known is not None:
+        return known
+    entry, headers = get_cache_entry(url, client)
     try:
-        response = requests.post(url, headers=headers, data=rq_data,
-                                 verify=False)
+        response = client.get(url, headers=headers)
     except Exception as e:
-        print(e)
-        return False
-    if response.status_code != 201:
-        print("[Fail] Can not get session token at url: {}. "
-              "Code {}".format(url, response.status_code))
-        return False
-    print("[Success] Created session at url: {}".format(url))
-    return response.headers
+        return get_failed(e, client)
+    return read_api_response(url, response, client, entry)
 
 
-def hpe_expire_session_token(url, headers):
+async def call_api_get_async(url, client):
+    if client.timed_out():
+        client.count_skipped()
+        return False
+    known = get_known_not_found(url, client)
+    if known is not None:
+        return known
+    entry, headers = get_cache_entry(url, client)
     try:
-        response = requests.delete(url, headers=headers, verify=False)
+        response = await client.get(url, headers=headers)
     except Exception as e:
-        print(e)
-        return False
-    if response.status_code != 200:
-        print("[Fail] Can not expire session at url: {}. "
-              "Code {}".format(url, response.status_code))
-    print("[Success] Expired session at url: {}".format(url))
-    return None
+        return get_failed(e, client)
+    return read_api_response(url, response, client, entry)
 
 
-def hpe_get_processor_info(base_url, headers):
-    try:
-        processors = call_api_get(
-            base_url + "/redfish/v1/Systems/1/Processors/", headers)
-        if not processors:
-            return False
-        result, info, fail_part = {}, [], []
-        for i in processors.get('Members'):
-            cpu_url = base_url + i['@odata.id']
-            cpu = call_api_get(cpu_url, headers)
-            if not cpu:
-                continue
-            if cpu['Status']['Health'] != 'OK':
-                fail_part.append({
-                    'location': cpu.get('Socket'),
-                    'health': cpu['Status']['Health'],
-                    'state': cpu['Status']['State']
-                })
-            cpu_data = {
-                'core': cpu.get('TotalCores'),
-                'thread': cpu.get('TotalThreads'),
-                'model': cpu.get('Model')
-            }
-            info.append(cpu_data)
-        result.update({'fail_part': fail_part, 'info': info,
-                       'number': len(processors.get('Members'))})
-        return result
-    except Exception as e:
-        print("Can not get processor info cause {}".format(e))
-        return None
+def get_extract_url(request, client):
+    if request.select and client.use_select:
+        select = [path.replace('.', '/') for path in request.paths]
+        return add_query(request.url, get_select_query(select))
+    return request.url
 
 
-def hpe_get_fan_info(base_url, headers):
-    try:
-        thermal = call_api_get(base_url + "/redfish/v1/Chassis/1/Thermal/",
-                               headers)
-        if not thermal:
-            return False
-        result = {}
-        result.update({'number': len(thermal.get('Fans'))})
-        fail_part = []
-        for i in thermal.get('Fans'):
-            if i['Status'].get('State') != 'Absent':
-                if i['Status'].get('Health') != 'OK':
-                    fail_part.append({
-                        'name': i.get('Name'),
-                        'health': i['Status'].get('Health'),
-                        'state': i['Status'].get('State')
-                    })
-        result.update({'fail_part': fail_part})
-        return result
-    except Exception as e:
-        print("Can not get fan info cause {}".format(e))
-        return None
+def read_extract(url, status_code, extractor):
+    if status_code != 200:
+        print("[Fail] Can not get information at url: {}. "
+              "Code {}".format(url, status_code))
+        return False
+    return extractor.close()
 
 
-def hpe_get_memory_info(base_url, headers):
+def call_api_extract(request, client):
+    if client.timed_out():
+        client.count_skipped()
+        return False
+    url = get_extract_url(request, client)
     try:
-        mem = call_api_get(base_url + "/redfish/v1/Systems/1/Memory/", headers)
-        if not mem:
-            return False
-        result, info, fail_part = {}, [], []
-        for i in mem.get('Members'):
-            ram = call_api_get(base_url + i['@odata.id'], headers)
-            if not ram:
-                continue
-            if ram.get('Status'):
-                if ram['Status']['State'] == 'Absent':
-                    continue
-                if ram['Status']['Health'] != 'OK':
-                    fail_part.append({
-                        'location': ram.get('DeviceLocator'),
-                        'health': ram['Status']['Health'],
-                        'state': ram['Status']['State']
-                    })
-            capa = ram.get('CapacityMiB')
-            if not capa:
-                capa = ram.get('SizeMB')
-            type = ram.get('MemoryDeviceType')
-            if not type:
-                type = ram.get('DIMMType')
-            if not info:
-                info.append({
-                    'index': 0,
-                    'capacity_mib': capa,
-                    'type': type,
-                    'count': 1
-                })
-            else:
-                new = True
-                for r in info:
-                    count = r['count']
-                    index = r['index']
-                    if r['capacity_mib'] == capa:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                if new:
-                    info.append({
-                        'index': len(info),
-                        'capacity_mib': capa,
-                        'type': type,
-                        'count': 1
-                    })
-        result.update({'fail_part': fail_part, 'info': info})
-        return result
+        extractor = JsonExtractor(request.paths, client.decode_json)
+        status_code = client.extract(url, extractor)
+        if status_code != 200 and url != request.url:
+            extractor = JsonExtractor(request.paths, client.decode_json)
+            status_code = client.extract(request.url, extractor)
+            if status_code == 200:
+                # $select was refused: stop using it on this BMC
+                client.use_select = False
     except Exception as e:
-        print("Can not get memory info cause {}".format(e))
-        return None
+        return get_failed(e, client)
+    return read_extract(request.url, status_code, extractor)
 
 
-def hpe_get_logical_disk_info(base_url, storage, headers):
+async def call_api_extract_async(request, client):
+    if client.timed_out():
+        client.count_skipped()
+        return False
+    url = get_extract_url(request, client)
     try:
-        all_ldisk = call_api_get(base_url + storage + "LogicalDrives/",
-                                 headers)
-        if not all_ldisk:
-            return False
-        result = {}
-        result.update({'number': len(all_ldisk.get('Members'))})
-        info, ldisk_data = [], {}
-        for i in all_ldisk.get('Members'):
-            ldisk_url = base_url + i['@odata.id']
-            ldisk = call_api_get(ldisk_url, headers)
-            if not ldisk:
-                continue
-            ldisk_data = {
-                'raid': ldisk.get('Raid'),
-                'capacity_gb': int(round(ldisk['CapacityMiB'] / 954)),
-            }
-            pdisk_url = ldisk_url + 'DataDrives/'
-            pdisk = call_api_get(pdisk_url, headers)
-            if not pdisk:
-                ldisk_data.update({'disks': []})
-                info.append(ldisk_data)
-                continue
-            disk = []
-            ldisk_data.update({'physical_count': len(pdisk['Members'])})
-            for d in pdisk.get('Members'):
-                pdisk_info = call_api_get(base_url + d['@odata.id'], headers)
-                if not pdisk_info:
-                    continue
-                disk_data = {
-                    'capacity_gb': pdisk_info['CapacityGB'],
-                    'type': pdisk_info['MediaType']
-                }
-                if disk_data['type'] == 'HDD':
-                    disk_data.update({
-                        'speed': pdisk_info['RotationalSpeedRpm']})
-                else:
-                    disk_data.update({'speed': None})
-                if not disk:
-                    disk.append(disk_data)
-                for r in disk:
-                    if disk_data['capacity_gb'] != r['capacity_gb'] \
-                            or disk_data['type'] != r['type']:
-                        disk.append(disk_data)
-            ldisk_data.update({'disks': disk})
-            info.append(ldisk_data)
-        result.update({'info': info})
-        return result
+        extractor = JsonExtractor(request.paths, client.decode_json)
+        status_code = await client.extract(url, extractor)
+        if status_code != 200 and url != request.url:
+            extractor = JsonExtractor(request.paths, client.decode_json)
+            status_code = await client.extract(request.url, extractor)
+            if status_code == 200:
+                client.use_select = False
     except Exception as e:
-        print("Can not get logical disk info cause {}".format(e))
-        return None
+        return get_failed(e, client)
+    return read_extract(request.url, status_code, extractor)
 
 
-def hpe_get_physical_disk_info(base_url, storage, headers):
-    try:
-        all_pdisk = call_api_get(base_url + storage + "DiskDrives/", headers)
-        if not all_pdisk:
-            return False
-        result = {}
-        result.update({'number': len(all_pdisk.get('Members'))})
-        info, fail_part = [], []
-        for i in all_pdisk.get('Members'):
-            pdisk = call_api_get(base_url + i['@odata.id'], headers)
-            if not pdisk:
-                continue
-            if pdisk['Status']['Health'] != 'OK' \
-                    or pdisk['Status']['State'] != 'Enabled':
-                location = pdisk['Location'].split(":")
-                location_format = pdisk['LocationFormat'].split(":")
-                lmsg = ''
-                for lo in range(len(location)):
-                    lmsg = location_format[lo] + ' ' + location[lo] + ' '
-                fail_part.append(lmsg.strip())
-            disk_data = {
-                'capacity_gb': pdisk['CapacityGB'],
-                'type': pdisk['MediaType']
-            }
-            if disk_data['type'] == 'HDD':
-                disk_data.update({'speed': pdisk['RotationalSpeedRpm']})
-            else:
-                disk_data.update({'speed': None})
-            if not info:
-                disk_data.update({'count': 1, 'index': 0})
-                info.append(disk_data)
-            else:
-                new = True
-                for d in info:
-                    count = d['count']
-                    index = d['index']
-                    if d['speed'] \
-                            and d['capacity_gb'] == disk_data['capacity_gb'] \
-                            and d['type'] == disk_data['type'] \
-                            and d['speed'] == disk_data['speed']:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                    elif not d['speed'] \
-                            and d['capacity_gb'] == disk_data['capacity_gb'] \
-                            and d['type'] == disk_data['type']:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                if new:
-                    disk_data.update({'count': 1, 'index': len(info)})
-                    info.append(disk_data)
-        result.update({'fail_part': fail_part, 'info': info})
-        return result
-    except Exception as e:
-        print("Can not get physical disk info cause {}".format(e))
-        return None
+def get_templated(client, name, lookup):
+    template = client.template
+    if template is not None and name in template.values:
+        template.used.add(name)
+        return template.values[name]
+    value = yield from lookup
+    if template is not None and value:
+        template.learned_values[name] = value
+    return value
 
 
-def hpe_get_disk_info(base_url, headers):
-    try:
-        raid_controller_info = call_api_get(
-            base_url + "/redfish/v1/Systems/1/SmartStorage/ArrayControllers/",
-            headers)
-        if not raid_controller_info:
-            return False
-        if raid_controller_info.get('Members') \
-                and len(raid_controller_info.get('Members')) == 1:
-            storage = raid_controller_info.get('Members')[0]['@odata.id']
-        else:
-            return False
-        ldisk = hpe_get_logical_disk_info(base_url, storage, headers)
-        pdisk = hpe_get_physical_disk_info(base_url, storage, headers)
-        return {'logical_disk': ldisk, 'physical_disk': pdisk}
-    except Exception as e:
-        print("Can not get disk info cause {}".format(e))
+def read_protocol_features(client):
+    service_root = yield client.base_url + "/redfish/v1/"
+    if not service_root or 'error' in service_root:
         return None
+    return [get_expand_query(service_root), is_select_supported(service_root)]
 
 
-def hpe_get_power_info(base_url, headers):
-    all_power = call_api_get(base_url + "/redfish/v1/Chassis/1/Power/",
-                             headers)
-    if not all_power or not all_power.get('PowerSupplies'):
-        return False
-    result, info, fail_part = {}, [], []
-    try:
-        for i in all_power.get('PowerSupplies'):
-            if i['Status']['Health'] != 'OK' \
-                    or i['Status']['State'] != 'Enabled':
-                fp = {'id': i.get('MemberId'),
-                      'health': i['Status']['Health'],
-                      'state': i['Status']['State']}
-                fail_part.append(fp)
-            power_data = {
-                'capacity': i['PowerCapacityWatts'],
-            }
-            info.append(power_data)
-        redundancy = False
-        if all_power.get('Redundancy'):
-            for re in all_power.get('Redundancy'):
-                if re.get('Mode') and re.get('Mode') == 'Failover':
-                    redundancy = True
-        result.update({'number': len(all_power['PowerSupplies']), 'info': info,
-                       'fail_part': fail_part, 'redundancy': redundancy})
-        return result
-    except Exception as e:
-        print('Can not get Power info cause {}'.format(e))
+def get_bmc_key(client):
+    # The BMC as its service root tells before login: the Redfish version
+    # and product follow its firmware, which sets the uris and the login
+    service_root = yield client.base_url + "/redfish/v1/"
+    if not service_root or 'error' in service_root:
         return None
+    return (service_root.get('RedfishVersion'), service_root.get('Product'))
+
+
+def get_protocol_features(client):
+    if client.expand_query is None:
+        features = yield from get_templated(
+            client, 'protocol_features', read_protocol_features(client))
+        client.expand_query, client.use_select = features or ['', False]
+
+
+def is_refused(body):
+    return not body or 'error' in body
+
+
+def get_select_url(request, client):
+    if request.select and client.use_select:
+        return add_query(request.url, get_select_query(request.select))
+    return request.url
+
+
+def get_resources(wanted, client):
+    yield from get_protocol_features(client)
+    urls = [get_select_url(request, client) for request in wanted]
+    resources = yield urls
+    refused = [i for i, request in enumerate(wanted)
+               if urls[i] != request.url and is_refused(resources[i])]
+    if refused:
+        retried = yield [wanted[i].url for i in refused]
+        for i, resource in zip(refused, retried):
+            if not is_refused(resource):
+                # The resource exists, $select was refused: stop using it
+                # on this BMC
+                client.use_select = False
+            resources[i] = resource
+    return resources
+
+
+def get_resource(request, client):
+    resources = yield from get_resources([request], client)
+    return resources[0]
+
+
+def get_collection(url, select, client):
+    yield from get_protocol_features(client)
+    if client.expand_query:
+        collection = yield add_query(url, client.expand_query)
+        if collection and is_expanded(collection):
+            return collection, collection['Members']
+        if not collection or 'Members' not in collection:
+            # Advertised but refused, do not try again on this BMC
+            client.expand_query = ''
+            collection = None
+    else:
+        collection = None
+    if collection is None:
+        collection = yield url
+    if is_refused(collection):
+        return False, []
+    members = yield from get_resources(
+        [RedfishResource(client.base_url + i['@odata.id'], select)
+         for i in collection.get('Members')], client)
+    return collection, members
+
+
+def get_sub_collector(request, client):
+    # Collector answering a request from other requests, None for the
+    # requests sent to the BMC as they are
+    if isinstance(request, RedfishResource):
+        return get_resource(request, client)
+    if isinstance(request, TopologyLookup):
+        return get_templated(client, request.name, request.lookup)
+    if isinstance(request, RedfishCollection):
+        return get_collection(request.url, request.select, client)
+    if isinstance(request, list) and request \
+            and isinstance(request[0], RedfishResource):
+        return get_resources(request, client)
+    return None
 
 
-def hpe_get_network_adapter_info(base_url, headers, ilo):
+def call_with_stats(stats, function, *args):
+    # Runs function with the requests it skips and retries counted in stats
+    token = SECTION_STATS.set(stats)
     try:
-        if not ilo or ilo != 'iLO 4':
-            all_na = call_api_get(
-                base_url + "/redfish/v1/Systems/1/BaseNetworkAdapters/",
-                headers)
-        else:
-            all_na = call_api_get(
-                base_url + "/redfish/v1/Systems/1/NetworkAdapters/",
-                headers)
-        if not all_na:
-            return False
-        result = {}
-        result.update({'number': len(all_na.get('Members'))})
-        info, fail_part = [], []
-        for i in all_na.get('Members'):
-            na_url = base_url + i['@odata.id']
-            na = call_api_get(na_url, headers)
-            if not na:
+        return function(*args)
+    finally:
+        SECTION_STATS.reset(token)
+
+
+class CollectorTask(object):
+    # A collector driven by CollectorRun: the stack of the sub-collectors it
+    # runs, what it receives next and the results it waits for
+
+    def __init__(self, collector, stats, parent=None, index=None):
+        self.stack = [collector]
+        self.stats = stats
+        self.parent = parent
+        self.index = index
+        self.response, self.error = None, None
+        self.results, self.remaining = None, 0
+        self.done = False
+
+
+# Collectors are generators: they yield a url string to GET (and receive the
+# decoded body, or False), a RedfishResource (same, projected on the
+# properties the collector reads), a list of urls or of RedfishResource to
+# GET concurrently (and receive the bodies in the same order), a
+# RedfishCollection (and receive the collection with the list of its
+# members), a RedfishExtract (and receive the values of some paths of the
+# body), a RedfishRequest (and receive the response), a RedfishDelay (and
+# receive False when the time budget does not allow it), a TopologyLookup
+# (and receive the value, from the template of the server model when known)
+# or a RedfishParallel (and receive the results of its collectors).
+# The same collector can then be driven by the blocking RedfishClient or by
+# the asyncio AsyncRedfishClient.
+class CollectorRun(object):
+    # Drives collectors with the blocking client. Requests are sent from the
+    # thread pool of the client and each collector resumes as soon as what
+    # it waits for is there, so the collectors of a RedfishParallel progress
+    # side by side. A url is only fetched once per run, later GETs of it
+    # (even while it is in flight) share its body. Pauses are timers that do
+    # not hold a thread.
+
+    def __init__(self, client):
+        self.client = client
+        self.ready = collections.deque()
+        # future: [(task, index)] waiting for it
+        self.waiters = {}
+        # url: future of its GET, failed GETs are sent again
+        self.responses = {}
+        self.urls = {}
+        self.timers = []
+        self.timer_ids = itertools.count()
+
+    def run(self, collector):
+        root = CollectorTask(collector, None)
+        self.ready.append(root)
+        while not root.done:
+            while self.ready:
+                self.step(self.ready.popleft())
+            if not root.done:
+                self.wait()
+        if root.error is not None:
+            raise root.error
+        return root.response
+
+    def step(self, task):
+        while True:
+            collector = task.stack[-1]
+            try:
+                if task.error is not None:
+                    error, task.error, task.response = task.error, None, None
+                    request = collector.throw(error)
+                else:
+                    response, task.response = task.response, None
+                    request = collector.send(response)
+            except StopIteration as e:
+                task.stack.pop()
+                if not task.stack:
+                    return self.finish(task, e.value, None)
+                task.response = e.value
                 continue
-            na_data = {
-                'model': na.get('Name')
-            }
-            if not na.get('Status'):
-                info.append(na_data)
+            except Exception as e:
+                task.stack.pop()
+                if not task.stack:
+                    return self.finish(task, None, e)
+                task.error = e
                 continue
-            if na['Status'].get('Health') \
-                    and na['Status'].get('Health') != 'OK':
-                fail_part.append({
-                    'model': na.get('Name'), 'health': na['Status']['Health'],
-                    'state': na['Status'].get('State')
-                })
-            info.append(na_data)
-        result.update({'info': info, 'fail_part': fail_part})
-        return result
-    except Exception as e:
-        print("Can not get Network info cause {}".format(e))
-        return None
-
+            sub_collector = get_sub_collector(request, self.client)
+            if sub_collector is not None:
+                task.stack.append(sub_collector)
+            elif isinstance(request, RedfishParallel):
+                return self.start_parallel(task, request)
+            else:
+                return self.send(task, request)
 
-def hpe_get_ilo_info(base_url, headers):
-    try:
-        manager_info = call_api_get(base_url + "/redfish/v1/Managers/1/",
-                                    headers)
-        if not manager_info:
-            return False
-        firm_version = manager_info.get('FirmwareVersion')
-        if firm_version.startswith('iLO 4'):
-            firm = manager_info['Oem']['Hp']['Firmware']['Current']
-            ilo = 'iLO 4'
-            firm_string = firm['VersionString'].replace(ilo, "").strip() \
-                          + ' ' + firm['Date']
+    def finish(self, task, value, error):
+        task.done = True
+        if task.parent is None:
+            task.response, task.error = value, error
         else:
-            firm = manager_info['Oem']['Hpe']['Firmware']['Current']
-            ilo = 'iLO ' + firm['VersionString'].split()[1]
-            firm_string = firm['VersionString'].replace(ilo, "").strip() \
-                          + ' ' + firm['Date']
-        result = {'model': ilo, 'version': firm_string}
-        return result
-    except Exception as e:
-        print("Can not get iLO version cause {}".format(e))
-        return None
+            self.deliver(task.parent, task.index, value, error)
+
+    def deliver(self, task, index, value, error):
+        # index is the place of value in the list the task waits for, None
+        # when it waits for value alone
+        if index is None:
+            task.response, task.error = value, error
+            self.ready.append(task)
+            return
+        task.results[index] = value
+        if error is not None and task.error is None:
+            task.error = error
+        task.remaining -= 1
+        if not task.remaining:
+            task.response = task.results
+            self.ready.append(task)
+
+    def expect(self, task, count):
+        task.results, task.remaining = [None] * count, count
+        if not count:
+            task.response = []
+            self.ready.append(task)
+
+    def start_parallel(self, task, parallel):
+        self.expect(task, len(parallel.collectors))
+        for index, collector in enumerate(parallel.collectors):
+            stats = parallel.stats[index] if parallel.stats else task.stats
+            self.ready.append(CollectorTask(collector, stats, task, index))
+
+    def send(self, task, request):
+        if isinstance(request, list):
+            self.expect(task, len(request))
+            for index, url in enumerate(request):
+                self.get(task, index, url)
+        elif isinstance(request, RedfishRequest):
+            self.submit(task, None, self.client.execute, request)
+        elif isinstance(request, RedfishExtract):
+            self.submit(task, None, call_api_extract, request, self.client)
+        elif isinstance(request, RedfishDelay):
+            self.delay(task, request.seconds)
+        else:
+            self.get(task, None, request)
+
+    def get(self, task, index, url):
+        future = self.responses.get(url)
+        if future is None:
+            future = self.submit(task, index, call_api_get, url, self.client)
+            self.responses[url] = future
+            self.urls[future] = url
+            return
+        self.client.saved += 1
+        if future in self.waiters:
+            self.waiters[future].append((task, index))
+        else:
+            self.deliver(task, index, future.result(), None)
+
+    def submit(self, task, index, function, *args):
+        future = self.client.executor.submit(call_with_stats, task.stats,
+                                             function, *args)
+        self.waiters[future] = [(task, index)]
+        return future
+
+    def delay(self, task, seconds):
+        pause = call_with_stats(task.stats, self.client.get_pause, seconds)
+        if not pause:
+            return self.deliver(task, None, pause is not None, None)
+        heapq.heappush(self.timers, (time.monotonic() + pause,
+                                     next(self.timer_ids), task))
+
+    def wait(self):
+        timeout = None
+        if self.timers:
+            timeout = max(self.timers[0][0] - time.monotonic(), 0)
+        if self.waiters:
+            done, _ = concurrent.futures.wait(
+                list(self.waiters), timeout,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+        else:
+            time.sleep(timeout)
+            done = ()
+        for future in done:
+            try:
+                value, error = future.result(), None
+            except Exception as e:
+                value, error = None, e
+            url = self.urls.pop(future, None)
+            if url is not None and (value is False or error is not None):
+                del self.responses[url]
+            for task, index in self.waiters.pop(future):
+                self.deliver(task, index, value, error)
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            self.deliver(heapq.heappop(self.timers)[2], None, True, None)
+
+
+def run_collector(collector, client):
+    return CollectorRun(client).run(collector)
+
+
+async def call_api_get_shared_async(url, client, responses):
+    # The first GET of url in the run, the later ones share its body
+    future = responses.get(url)
+    if future is not None:
+        client.saved += 1
+        return await asyncio.shield(future)
+
+    def forget_failure(done):
+        if done.cancelled() or done.exception() is not None \
+                or done.result() is False:
+            responses.pop(url, None)
+
+    future = asyncio.ensure_future(call_api_get_async(url, client))
+    responses[url] = future
+    future.add_done_callback(forget_failure)
+    return await asyncio.shield(future)
+
+
+async def run_collector_async(collector, client, stats=None,
+                              responses=None):
+    # The collectors of a RedfishParallel run as tasks of their own, stats
+    # then count the requests of this one. responses has the GETs of the
+    # run, by url.
+    if stats is not None:
+        SECTION_STATS.set(stats)
+    if responses is None:
+        responses = {}
+    response, error = None, None
+    while True:
+        try:
+            if error:
+                request = collector.throw(error)
+            else:
+                request = collector.send(response)
+        except StopIteration as e:
+            return e.value
+        response, error = None, None
+        try:
+            sub_collector = get_sub_collector(request, client)
+            if sub_collector is not None:
+                response = await run_collector_async(
+                    sub_collector, client, responses=responses)
+            elif isinstance(request, RedfishParallel):
+                response = await asyncio.gather(*[
+                    run_collector_async(
+                        child, client,
+                        request.stats[i] if request.stats else None,
+                        responses)
+                    for i, child in enumerate(request.collectors)])
+            elif isinstance(request, RedfishRequest):
+                response = await client.execute(request)
+            elif isinstance(request, RedfishDelay):
+                response = await client.wait(request.seconds)
+            elif isinstance(request, RedfishExtract):
+                response = await call_api_extract_async(request, client)
+            elif isinstance(request, list):
+                response = await asyncio.gather(*[
+                    call_api_get_shared_async(url, client, responses)
+                    for url in request])
+            else:
+                response = await call_api_get_shared_async(
+                    request, client, responses)
+        except Exception as e:
+            error = e
+
+
+def collect_sections(client, result, sections):
+    # The sections are collected side by side. A section that had GETs
+    # skipped because the time budget ran out is reported as timed out
+    # instead of with its partial data. The number of requests sent again
+    # to the BMC is kept per section in 'retries'.
+    stats = [SectionStats() for _ in sections]
+    values = yield RedfishParallel(
+        [collector for _, collector in sections], stats)
+    for (name, _), section, section_stats in zip(sections, values, stats):
+        if section_stats.skipped:
+            section = SECTION_TIMEOUT
+        result[name] = section
+        result.setdefault('retries', {})[name] = section_stats.retries
+    return result
 
 
-def hpe_get_snmp_service_info(base_url, headers):
-    try:
-        snmp_info = call_api_get(
-            base_url + "/redfish/v1/Managers/1/SnmpService/", headers)
-        if not snmp_info:
-            return False
-        result = {
-            'state': snmp_info['Status']['State'],
-            'list_string': snmp_info.get('ReadCommunities')
-        }
-        return result
-    except Exception as e:
-        print("Can not get SNMP info cause {}".format(e))
+def get_session_url(base_url, location):
+    # iLO answers an absolute Location, iDRAC and iRMC a path
+    if location.startswith('http'):
+        return location
+    return base_url + location
+
+
+def open_session(client, username, password, login):
+    # Authenticates the client and answers the session (None when login
+    # failed). With basic auth there is no session, the credentials go with
+    # every request. With a session store, a session of a previous run is
+    # used again when one GET of it still succeeds, login only runs
+    # otherwise.
+    if client.auth == 'basic':
+        client.set_basic_auth(username, password)
+        return {}
+    store = client.session_store
+    if store is not None:
+        session = store.get(client.base_url, username, password)
+        if session:
+            url = get_session_url(client.base_url, session['Location'])
+            try:
+                response = yield RedfishRequest(
+                    'GET', url,
+                    headers={'X-Auth-Token': session['X-Auth-Token']})
+            except Exception as e:
+                print(e)
+                response = None
+            if response is not None and response.status_code == 200:
+                print("[Success] Reused session at url: {}".format(url))
+                client.set_auth_token(session['X-Auth-Token'])
+                return session
+            store.remove(client.base_url, username)
+    header_info = yield from login
+    if not header_info:
         return None
+    if store is not None:
+        store.put(client.base_url, username, password, {
+            'X-Auth-Token': header_info.get('X-Auth-Token'),
+            'Location': header_info.get('Location')
+        })
+    client.set_auth_token(header_info.get('X-Auth-Token'))
+    return header_info
 
 
-def hpe_get_bios_config_info(base_url, headers):
-    try:
-        bios = call_api_get(base_url + "/redfish/v1/Systems/1/Bios/", headers)
-        if not bios:
-            return False
-        attribute = bios.get('Attributes')
-        if not attribute:
-            result = {
-                'thermal': bios.get('ThermalConfig'),
-                'workload_profile': bios.get('PowerProfile'),
-                'power_performance': bios.get('PowerRegulator')
-            }
-        else:
-            result = {
-                'thermal': attribute.get('ThermalConfig'),
-                'power_performance': attribute.get('PowerRegulator')
-            }
-        if result['thermal'] == 'OptimalCooling' and result[
-            'power_performance'] == 'StaticHighPerf':
-            return "OK. " + str(result)
-        else:
-            return "NOK. " + str(result)
-    except Exception as e:
-        print("Can not get BIOS config info cause {}".format(e))
-        return None
+def close_session(client, header_info, logout):
+    # Stored sessions are left open for the next run
+    if header_info and client.session_store is None:
+        yield from logout(
+            get_session_url(client.base_url, header_info.get('Location')))
 
 
-def hpe_get_basic_info(base_url, headers):
+def update_template(client, result):
+    # True when the model of the server did not match its template, the
+    # server is then collected again without it
+    template = client.template
+    if template is None:
+        return False
+    if template.failed:
+        print("[Info] Topology template of {} does not match {}, collecting "
+              "again".format(template.key, client.base_url))
+        template.invalidate()
+        client.template = None
+        return True
+    if result:
+        template.save()
+    return False
+
+
+# options are the keyword arguments of RedfishClient (pool_size, timeout,
+# budget, retries, cache, session_store, auth, template, json_decoder,
+# metrics, archive, scheduler)
+def collect_device(collect_info, ip_address, username, password, options):
+    client = RedfishClient("https://" + ip_address, **options)
     try:
-        basic_info = call_api_get(base_url + "/redfish/v1/Systems/1/", headers)
-        if not basic_info:
-            return False
-        memory_status = basic_info['MemorySummary']['Status'].get(
-            'HealthRollUp')
-        if not memory_status:
-            memory_status = basic_info['MemorySummary']['Status'].get(
-                'HealthRollup')
-        result = {
-            'bios_version': basic_info.get('BiosVersion'),
-            'model': basic_info.get('Model'),
-            'memory_gib': basic_info['MemorySummary']['TotalSystemMemoryGiB'],
-            'memory_status': memory_status,
-            'processor': {
-                'number': basic_info['ProcessorSummary']['Count'],
-                'model': basic_info['ProcessorSummary']['Model']
-            },
-            'serial': basic_info.get('SerialNumber'),
-            'health': basic_info['Status']['Health']
-        }
+        result = run_collector(
+            collect_info(client, ip_address, username, password), client)
+        if update_template(client, result):
+            result = run_collector(
+                collect_info(client, ip_address, username, password), client)
         return result
-    except Exception as e:
-        print("Can not get basic info cause {}".format(e))
-        return None
+    finally:
+        client.close()
 
 
-def hpe_get_all_info(ip_address, username, password):
-    print("--> Getting information for HPE device {}".format(ip_address))
-    base_url = "https://" + ip_address
-    header_info = hpe_get_session_token(base_url, username, password)
-    if not header_info:
-        return None
-    token = header_info.get("X-Auth-Token")
-    headers = {"Content-Type": "application/json", "X-Auth-Token": token}
+async def collect_device_async(collect_info, ip_address, username, password,
+                               options):
+    client = AsyncRedfishClient("https://" + ip_address, **options)
     try:
-        ilo = hpe_get_ilo_info(base_url, headers)
-        if ilo:
-            network = hpe_get_network_adapter_info(
-                base_url, headers, ilo.get('model'))
-        else:
-            network = None
-        result = {
-            'ip': ip_address,
-            'base_info': hpe_get_basic_info(base_url, headers),
-            'firmware': ilo,
-            'network': network,
-            'processor': hpe_get_processor_info(base_url, headers),
-            'fan': hpe_get_fan_info(base_url, headers),
-            'disk': hpe_get_disk_info(base_url, headers),
-            'power': hpe_get_power_info(base_url, headers),
-            'memory': hpe_get_memory_info(base_url, headers),
-            'snmp': hpe_get_snmp_service_info(base_url, headers),
-            'bios_config': hpe_get_bios_config_info(base_url, headers)
-        }
-    except Exception as e:
-        pprint(e)
-        result = None
-
-    hpe_expire_session_token(header_info.get('Location'), headers)
-    return result
+        result = await run_collector_async(
+            collect_info(client, ip_address, username, password), client)
+        if update_template(client, result):
+            result = await run_collector_async(
+                collect_info(client, ip_address, username, password), client)
+        return result
+    finally:
+        await client.close()
 
 
-def fjs_get_session_token(base_url, username, password):
-    headers = {"Content-Type": "application/json", "OData-Version": "4.0"}
-    auth = (username, password)
+def get_session_token(base_url, username, password, session,
+                      template=None):
+    # A session path that does not exist on the BMC, when the generation was
+    # picked from the template, means the template does not fit it. Refused
+    # credentials or a BMC that does not answer say nothing of the template.
+    url = base_url + session['path']
+    auth = (username, password) if session.get('auth') else None
     rq_data = json.dumps({"UserName": username, "Password": password})
-    url = base_url + "/redfish/v1/SessionService/Sessions/"
     try:
-        response = requests.post(url, headers=headers, data=rq_data,
-                                 auth=auth, verify=False)
+        response = yield RedfishRequest('POST', url,
+                                        headers=dict(session['headers']),
+                                        data=rq_data, auth=auth)
     except Exception as e:
         print(e)
         return False
     if response.status_code != 201:
         print("[Fail] Can not get session token at url: {}. "
               "Code {}".format(url, response.status_code))
+        if template is not None and template.used \
+                and response.status_code in (404, 405):
+            template.failed = True
         return False
     print("[Success] Created session at url: {}".format(url))
     return response.headers
 
 
-def fjs_expire_session_token(url, headers):
+def expire_session_token(url):
     try:
-        response = requests.delete(url, headers=headers, verify=False)
+        response = yield RedfishRequest('DELETE', url)
     except Exception as e:
         print(e)
         return False
@@ -544,936 +713,725 @@ def fjs_expire_session_token(url, headers):
     return None
 
 
-def fjs_get_basic_info(system_url, headers):
-    basic_info = call_api_get(system_url, headers)
-    if not basic_info:
-        return False
-    try:
-        memory_status = basic_info['MemorySummary']['Status'].get('Health')
-        if not memory_status:
-            memory_status = basic_info['MemorySummary']['Status'].get(
-                'HealthRollup')
-        result = {
-            'bios_version': basic_info.get('BiosVersion'),
-            'model': basic_info.get('Model'),
-            'memory_gib': basic_info['MemorySummary']['TotalSystemMemoryGiB'],
-            'memory_status': memory_status,
-            'processor': {
-                'number': basic_info['ProcessorSummary']['Count'],
-                'model': basic_info['ProcessorSummary']['Model']
-            },
-            'serial': basic_info.get('SerialNumber'),
-            'health': basic_info['Status']['Health']
-        }
-        return result
-    except Exception as e:
-        print("Can not get basic info because {}".format(e))
-        return False
-
-
-def fjs_get_processor_info(base_url, system, headers):
-    processor = call_api_get(base_url + system + "/Processors/", headers)
-    if not processor:
-        return False
-    try:
-        result, info, fail_part = {}, [], []
-        for i in processor.get('Members'):
-            cpu_url = base_url + i['@odata.id']
-            cpu = call_api_get(cpu_url, headers)
-            if not cpu:
-                continue
-            if cpu['Status']['Health'] != 'OK':
-                fail_part.append({
-                    'location': cpu.get('Socket'),
-                    'health': cpu['Status']['Health'],
-                    'state': cpu['Status']['State']
-                })
-            cpu_data = {
-                'core': cpu.get('TotalCores'),
-                'thread': cpu.get('TotalThreads'),
-                'model': cpu.get('Model')
-            }
-            info.append(cpu_data)
-        result.update({'fail_part': fail_part, 'info': info,
-                       'number': len(processor.get('Members'))})
-        return result
-    except Exception as e:
-        print("Can not get Processor info because {}".format(e))
-        return False
-
-
-def fjs_get_fan_info(chassis_url, headers):
-    thermal = call_api_get(chassis_url + "/Thermal/", headers)
-    if not thermal:
-        return False
+def get_redfish_version(base_url, username, password):
+    auth = (username, password)
     try:
-        result, fail_part, number = {}, [], 0
-        for i in thermal.get('Fans'):
-            if i['Status'].get('State') != 'Absent':
-                number += 1
-                if i['Status'].get('Health') != 'OK':
-                    fail_part.append({
-                        'name': i.get('Name'),
-                        'health': i['Status'].get('Health'),
-                        'state': i['Status'].get('State')
-                    })
-        result.update({'number': number, 'fail_part': fail_part})
-        return result
-    except Exception as e:
-        print("Can not get Fan info because {}".format(e))
-        return False
-
-
-def fjs_get_memory_info(base_url, system, headers):
-    mem = call_api_get(base_url + system + "/Memory/", headers)
-    if not mem:
+        response = yield RedfishRequest('GET', base_url + "/redfish/v1/",
+                                        auth=auth)
+        version = response.json().get('RedfishVersion')
+        if version:
+            version_num = int(version.replace(".", ""))
+            return version_num
         return False
-    result, info, fail_part = {}, [], []
-    try:
-        for i in mem.get('Members'):
-            ram = call_api_get(base_url + i['@odata.id'], headers)
-            if not ram:
-                continue
-            if ram.get('Status'):
-                if ram['Status']['State'] == 'Absent':
-                    continue
-                if ram['Status']['Health'] != 'OK':
-                    fail_part.append({
-                        'location': ram.get('DeviceLocator'),
-                        'health': ram['Status']['Health'],
-                        'state': ram['Status']['State']
-                    })
-            capa = ram.get('CapacityMiB')
-            if not capa:
-                capa = ram.get('SizeMB')
-            type = ram.get('MemoryDeviceType')
-            if not type:
-                type = ram.get('DIMMType')
-            if not info:
-                info.append({
-                    'index': 0,
-                    'capacity_mib': capa,
-                    'type': type,
-                    'count': 1
-                })
-            else:
-                new = True
-                for r in info:
-                    count = r['count']
-                    index = r['index']
-                    if r['capacity_mib'] == capa:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                if new:
-                    info.append({
-                        'index': len(info),
-                        'capacity_mib': capa,
-                        'type': type,
-                        'count': 1
-                    })
-        result.update({'fail_part': fail_part, 'info': info})
-        return result
     except Exception as e:
-        print("Can not get Memory info because {}".format(e))
+        print("Can not get redfish version cause {}".format(e))
         return False
 
 
-def fjs_get_logical_disk_info(base_url, volume_url, headers):
-    all_ldisk = call_api_get(base_url + volume_url, headers)
-    if not all_ldisk:
-        return False
+def get_watts(value):
+    # iDRAC 8 has the capacity in the model: PWR SPLY,750W,RDNT
+    if isinstance(value, str):
+        return int(value.split(",")[1].replace("W", ""))
+    return value
+
+
+def get_ilo_model(current):
+    return ' '.join(current['VersionString'].split()[:2])
+
+
+def get_ilo_version(current):
+    return current['VersionString'].replace(get_ilo_model(current), "") \
+        .strip() + ' ' + current['Date']
+
+
+# Conversions of the values read, by the name used in the profiles
+CONVERSIONS = {
+    'int': int,
+    'gb': lambda value: int(round(value / 1000000000)),
+    'gb_floor': lambda value: int(value / 1000000000),
+    'mib_to_gb': lambda value: int(round(value / 954)),
+    'to_decimal': lambda value: int(value * 1.074),
+    'raid_level': lambda value: value.replace("RAID", ""),
+    'mirrored': lambda value: 1 if value == 'Mirrored' else 0,
+    'enabled': lambda value: 'Enabled' if value else 'Disabled',
+    'watts': get_watts,
+    'ilo_model': get_ilo_model,
+    'ilo_version': get_ilo_version
+}
+# Conversions that also apply to a value missing from the body, a BMC that
+# leaves out SNMP.ProtocolEnabled has SNMP disabled
+CONVERT_MISSING = ('enabled',)
+
+
+def get_value(body, path):
+    # path is dotted, a tuple of paths reads the first one that has a value
+    if isinstance(path, tuple):
+        value = None
+        for alternative in path:
+            value = get_value(body, alternative)
+            if value:
+                break
+        return value
+    for name in path.split('.'):
+        if not isinstance(body, dict):
+            return None
+        body = body.get(name)
+    return body
+
+
+def read_fields(body, fields, convert=None):
     result = {}
-    result.update({'number': len(all_ldisk.get('Members'))})
-    info, ldisk_data = [], {}
-    try:
-        for i in all_ldisk.get('Members'):
-            ldisk_url = base_url + i['@odata.id']
-            ldisk = call_api_get(ldisk_url, headers)
-            if not ldisk:
-                continue
-            ldisk_data = {
-                'raid': ldisk.get('RAIDType').replace("RAID", ""),
-                'capacity_gb': int(round(ldisk['CapacityBytes'] / 1000000000)),
-            }
-            pdisk = ldisk.get('Links')
-            if pdisk:
-                pdisk = pdisk.get('Drives')
-            else:
-                ldisk_data.update({'disks': []})
-                info.append(ldisk_data)
-                continue
-            disk = []
-            ldisk_data.update({'physical_count': len(pdisk)})
-            for d in pdisk:
-                pdisk_info = call_api_get(base_url + d['@odata.id'], headers)
-                if not pdisk_info:
-                    continue
-                disk_data = {
-                    'capacity_gb': int(
-                        pdisk_info['CapacityBytes'] / 1000000000),
-                    'type': pdisk_info['MediaType']
-                }
-                if disk_data['type'] == 'HDD':
-                    disk_data.update({'speed': pdisk_info['RotationSpeedRPM']})
-                else:
-                    disk_data.update({'speed': None})
-                if not disk:
-                    disk.append(disk_data)
-                for r in disk:
-                    if disk_data['capacity_gb'] != r['capacity_gb'] \
-                            or disk_data['type'] != r['type']:
-                        disk.append(disk_data)
-            ldisk_data.update({'disks': disk})
-            info.append(ldisk_data)
-        result.update({'info': info})
-        return result
-    except Exception as e:
-        print("Can not get logical disk info because {}".format(e))
-        return False
+    for name, path in fields.items():
+        if isinstance(path, dict):
+            result[name] = read_fields(body, path)
+            continue
+        value = get_value(body, path)
+        if convert and name in convert \
+                and (value is not None or convert[name] in CONVERT_MISSING):
+            value = CONVERSIONS[convert[name]](value)
+        result[name] = value
+    return result
 
 
-def fjs_get_physical_disk_info(base_url, drives, headers):
-    result = {}
-    result.update({'number': len(drives)})
-    info, fail_part = [], []
-    try:
-        for i in drives:
-            pdisk = call_api_get(base_url + i['@odata.id'], headers)
-            if not pdisk:
-                continue
-            if pdisk['Status']['Health'] != 'OK' \
-                    or pdisk['Status']['State'] != 'Enabled':
-                location = pdisk['Location']['Info'] \
-                    .replace("[", "").replace("]", "").split(":")
-                location_format = pdisk['Location']['InfoFormat'] \
-                    .replace("[", "").replace("]", "").split(":")
-                lmsg = ''
-                for lo in range(len(location)):
-                    lmsg = strip(location_format[lo]) + ' ' \
-                           + srtip(location[lo]) + ' '
-                fail_part.append(strip(lmsg))
-            disk_data = {
-                'capacity_gb': int(pdisk['CapacityBytes'] / 1000000000),
-                'type': pdisk['MediaType']
-            }
-            if disk_data['type'] == 'HDD':
-                disk_data.update({'speed': pdisk['RotationSpeedRPM']})
-            else:
-                disk_data.update({'speed': None})
-            if not info:
-                disk_data.update({'count': 1, 'index': 0})
-                info.append(disk_data)
-            else:
-                new = True
-                for d in info:
-                    count = d['count']
-                    index = d['index']
-                    if d['speed'] \
-                            and d['capacity_gb'] == disk_data['capacity_gb'] \
-                            and d['type'] == disk_data['type'] \
-                            and d['speed'] == disk_data['speed']:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                    elif not d['speed'] \
-                            and d['capacity_gb'] == disk_data['capacity_gb'] \
-                            and d['type'] == disk_data['type']:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                if new:
-                    disk_data.update({'count': 1, 'index': len(info)})
-                    info.append(disk_data)
-
-        result.update({'fail_part': fail_part, 'info': info})
-        return result
-    except Exception as e:
-        print("Can not get physical disk info because {}".format(e))
-        return False
+def has_values(body, values):
+    return all(get_value(body, path) == value
+               for path, value in values.items())
 
 
-def fjs_get_disk_info(base_url, system, headers):
-    raid_controller_info = call_api_get(base_url + system + "/Storage/",
-                                        headers)
-    if not raid_controller_info:
-        return False
-    if raid_controller_info.get('Members') \
-            and len(raid_controller_info.get('Members')) == 1:
-        storage_url = raid_controller_info.get('Members')[0]['@odata.id']
-    else:
-        print("Server has more than 1 raid controller, fail to get Disk info")
-        return False
-    storage = call_api_get(base_url + storage_url, headers)
-    if not storage:
-        return False
-    if storage.get('Volumes'):
-        ldisk = fjs_get_logical_disk_info(base_url,
-                                          storage['Volumes'].get('@odata.id'),
-                                          headers)
-    else:
-        ldisk = None
-    if storage.get('Drives'):
-        pdisk = fjs_get_physical_disk_info(base_url, storage['Drives'],
-                                           headers)
-    else:
-        pdisk = None
-    return {'logical_disk': ldisk, 'physical_disk': pdisk}
+def is_healthy(part, spec):
+    missing = spec.get('unless_missing')
+    if missing and not get_value(part, missing):
+        return True
+    return has_values(part, spec['healthy'])
 
 
-def fjs_get_power_info(base_url, chassis, headers):
-    all_power = call_api_get(base_url + chassis + "/Power/", headers)
-    if not all_power:
-        return False
-    result, info, fail_part = {}, [], []
-    try:
-        result.update({
-            'number': len(all_power.get('PowerSupplies'))
-        })
-        for i in all_power.get('PowerSupplies'):
-            if i['Status']['Health'] != 'OK' or \
-                    i['Status']['State'] != 'Enabled':
-                fp = {'name': i.get('Name')}
-                fail_part.append(fp)
-            power_data = {
-                'capacity': i['PowerCapacityWatts'],
-            }
-            info.append(power_data)
-        redundancy = False
-        if all_power.get('PowerControl'):
-            redundancy = True
-        result.update({'info': info, 'fail_part': fail_part,
-                       'redundancy': redundancy})
-        return result
-    except Exception as e:
-        print("Can not get Power info because {}".format(e))
-        return False
+def get_url(base_url, path, topology):
+    return base_url + path.format(**topology)
 
 
-def fjs_get_network_adapter_info(base_url, chassis, headers):
-    all_na = call_api_get(base_url + chassis + "/NetworkAdapters/", headers)
-    if not all_na:
-        return False
-    result, info, fail_part = {}, [], []
+def run_section(name, collector):
     try:
-        for i in all_na.get('Members'):
-            na_url = base_url + i['@odata.id']
-            na = call_api_get(na_url, headers)
-            if not na:
-                continue
-            na_data = {
-                'model': na.get('Model'), 'name': na.get('Name')
-            }
-            if not na.get('Status'):
-                info.append(na_data)
-                continue
-            if na['Status'].get('Health') \
-                    and na['Status'].get('Health') != 'OK':
-                fail_part.append({
-                    'name': na.get('Name'), 'state': na['Status'].get('State'),
-                    'health': na['Status']['Health'], 'model': na.get('Model')
-                })
-            info.append(na_data)
-        result.update({'number': len(all_na.get('Members')), 'info': info,
-                       'fail_part': fail_part})
-        return result
+        return (yield from collector)
     except Exception as e:
-        print("Can not get Network info because {}".format(e))
-        return False
+        print("Can not get {} info cause {}".format(name, e))
+        return None
 
 
-def fjs_get_snmp_service_info(base_url, manager, headers):
-    mn = call_api_get(base_url + manager + "/ManagerNetwork/", headers)
-    if not mn:
+def get_resource_info(base_url, spec, topology):
+    body = yield RedfishResource(get_url(base_url, spec['path'], topology),
+                                 select=spec.get('select'))
+    if not body:
         return False
-    snmp = mn.get('SNMP')
-    if not snmp:
+    if spec.get('required') and not get_value(body, spec['required']):
         return False
-    enable = snmp.get('ProtocolEnabled')
-    if enable:
-        result = {'state': 'Enabled', 'list_string': ''}
-    else:
-        result = {'state': 'Disabled', 'list_string': ''}
+    result = read_fields(body, spec['fields'], spec.get('convert'))
+    result.update(spec.get('constants', {}))
+    if spec.get('record'):
+        return RECORDS[spec['record']](**result)
     return result
 
 
-def fjs_get_irmc_info(base_url, manager, headers):
-    irmc = call_api_get(base_url + manager, headers)
-    if not irmc:
+def get_redundancy(resource, rule):
+    items = resource.get(rule['list'])
+    if not items:
         return False
-    result = {'model': irmc.get('Model'),
-              'version': irmc.get('FirmwareVersion')}
-    return result
+    if rule.get('mode'):
+        return any(item.get('Mode') == rule['mode'] for item in items)
+    return True
 
 
-def fjs_get_bios_config_info(base_url, headers):
-    try:
-        bios = call_api_get(base_url + "/rest/v1/Oem/eLCM/"
-                                       "ProfileManagement/Server", headers)
-        if not bios:
+def get_parts_info(base_url, spec, topology):
+    url = get_url(base_url, spec['path'], topology)
+    if spec.get('list'):
+        resource = yield RedfishResource(url, select=spec.get('select'))
+        if not resource or not resource.get(spec['list']):
+            return False
+        parts = resource[spec['list']]
+        number = len(parts)
+    else:
+        resource, parts = yield RedfishCollection(url,
+                                                  select=spec.get('select'))
+        if not resource:
             return False
-        cpuconfig = bios['Server']['SystemConfig']['BiosConfig']['CpuConfig']
-        performance_mode = cpuconfig['EnergyPerformanceMode']
-        os_energy = cpuconfig['OsEnergyPerformanceOverrideEnabled']
-        if performance_mode == 'OptimizedPerformance' and os_energy == "True":
-            return "OK. {'EnergyPerformanceMode': %s; " \
-                   "'OsEnergyPerformanceOverrideEnabled': %s" \
-                   % (performance_mode, os_energy)
+        number = len(resource.get('Members'))
+    info, fail_part, present = [], [], 0
+    record = RECORDS[spec['record']] if spec.get('record') else dict
+    # Entries of info by the values of the group_by fields
+    groups = {}
+    for part in parts:
+        if not part or spec.get('skip') and has_values(part, spec['skip']):
+            continue
+        present += 1
+        if not is_healthy(part, spec):
+            fail_part.append(read_fields(part, spec['fail']))
+        if not spec.get('info'):
+            continue
+        data = read_fields(part, spec['info'], spec.get('convert'))
+        if not spec.get('group_by'):
+            info.append(record(**data))
+            continue
+        key = tuple(data[name] for name in spec['group_by'])
+        if key in groups:
+            groups[key]['count'] += 1
         else:
-            return "NOK. {'EnergyPerformanceMode': %s; " \
-                   "'OsEnergyPerformanceOverrideEnabled': %s" \
-                   % (performance_mode, os_energy)
-    except Exception as e:
-        print("Can not get BIOS config info cause {}".format(e))
-        return None
+            groups[key] = record(**dict({'index': len(info)}, **data,
+                                        count=1))
+            info.append(groups[key])
+    result = {'fail_part': fail_part}
+    if spec.get('info'):
+        result['info'] = info
+    if spec.get('number'):
+        result['number'] = present if spec['number'] == 'present' \
+            else number
+    if spec.get('redundancy'):
+        result['redundancy'] = get_redundancy(resource, spec['redundancy'])
+    return result
 
 
-def fjs_get_object_info(base_url, object, headers):
-    object_dict = {
-        'system': 'Systems',
-        'chassis': 'Chassis',
-        'manager': 'Managers'
-    }
-    oj = object_dict.get(object)
-    if not oj:
-        return False
-    oj_info = call_api_get(base_url + "/redfish/v1/" + oj, headers)
-    if not oj_info:
-        return False
-    oj_list = oj_info.get('Members')
-    if not oj_list:
+def get_storage_urls(base_url, spec, topology):
+    # Every controller, or those whose uri has 'controller'
+    controllers = yield get_url(base_url, spec['controllers'], topology)
+    if not controllers:
         return False
-    if len(oj_list) != 1:
-        print("Device doesnt have 1 {} only, can not get info".format(object))
+    members = [i['@odata.id'] for i in controllers.get('Members') or []]
+    if spec.get('controller'):
+        members = [url for url in members if spec['controller'] in url]
+    if not members:
+        print("Can not get raid controller info, fail to get Disk info")
         return False
-    oj_url = oj_list[0].get('@odata.id')
-    return oj_url
-
-
-def fjs_get_all_info(ip_address, username, password):
-    print("--> Getting information for Fujitsu device {}".format(ip_address))
-    base_url = "https://" + ip_address
-    header_info = fjs_get_session_token(base_url, username, password)
-    if not header_info:
+    return members
+
+
+def read_drive(drive, spec):
+    disk = read_fields(drive, spec['drive']['fields'],
+                       spec['drive'].get('convert'))
+    if disk['type'] != 'HDD':
+        disk['speed'] = None
+    return Drive(**disk)
+
+
+def get_drive_location(drive, spec):
+    # A failed drive is reported by its name, or by the last part of its
+    # location (Port:Box:Bay) with the name of that part
+    if spec.get('name'):
+        return get_value(drive, spec['name']).strip()
+    location = get_value(drive, spec['location']).strip('[]').split(":")
+    location_format = get_value(drive, spec['location_format']) \
+        .strip('[]').split(":")
+    index = len(location) - 1
+    return location_format[index].strip() + ' ' + location[index].strip()
+
+
+def get_volume_drives(base_url, spec, volume):
+    # Drives of a volume, None when it does not list them. They are read
+    # like the drives of the controller, so the physical disks are not
+    # fetched again.
+    if spec.get('volume_drives'):
+        drives, members = yield RedfishCollection(
+            base_url + volume['@odata.id'] + spec['volume_drives'],
+            select=spec['drive']['select'])
+        if not drives:
+            return None
+        return members
+    drives = get_value(volume, 'Links.Drives')
+    if drives is None:
         return None
-    token = header_info.get("X-Auth-Token")
-    headers = {"Content-Type": "application/json", "X-Auth-Token": token}
-    try:
-        system = fjs_get_object_info(base_url, 'system', headers)
-        chassis = fjs_get_object_info(base_url, 'chassis', headers)
-        manager = fjs_get_object_info(base_url, 'manager', headers)
-        result = {
-            'ip': ip_address,
-            'base_info': fjs_get_basic_info(base_url + system, headers),
-            'network': fjs_get_network_adapter_info(
-                base_url, chassis, headers),
-            'processor': fjs_get_processor_info(base_url, system, headers),
-            'fan': fjs_get_fan_info(base_url + chassis, headers),
-            'disk': fjs_get_disk_info(base_url, system, headers),
-            'power': fjs_get_power_info(base_url, chassis, headers),
-            'memory': fjs_get_memory_info(base_url, system, headers),
-            'snmp': fjs_get_snmp_service_info(base_url, manager, headers),
-            'firmware': fjs_get_irmc_info(base_url, manager, headers),
-            'bios_config': fjs_get_bios_config_info(base_url, headers)
-        }
-    except Exception as e:
-        print("Can not get Fujitsu device info cause {}".format(e))
-        result = None
-    fjs_expire_session_token(base_url + header_info.get('Location'), headers)
-    return result
-
-
-def dell_get_redfish_version(base_url, username, password):
-    auth = (username, password)
-    try:
-        response = requests.get(base_url + "/redfish/v1/", auth=auth,
-                                verify=False)
-        version = response.json().get('RedfishVersion')
-        if version:
-            version_num = int(version.replace(".", ""))
-            return version_num
+    members = yield [
+        RedfishResource(base_url + i['@odata.id'],
+                        select=spec['drive']['select'])
+        for i in drives]
+    return members
+
+
+def get_logical_disk_info(base_url, spec, url):
+    volume_spec = spec['volume']
+    volumes, members = yield RedfishCollection(
+        url, select=volume_spec['select'])
+    if not volumes:
         return False
-    except Exception as e:
-        print("Can not get redfish version cause {}".format(e))
-        return False
-
-
-def dell_get_session_token(base_url, username, password, redfish_version):
-    headers = {"Content-Type": "application/json"}
-    auth = (username, password)
-    rq_data = json.dumps({"UserName": username, "Password": password})
-    if redfish_version >= 160:
-        url = base_url + "/redfish/v1/SessionService/Sessions/"
+    info = []
+    for volume in members:
+        if not volume or volume_spec.get('skip') \
+                and has_values(volume, volume_spec['skip']):
+            continue
+        ldisk_data = read_fields(volume, volume_spec['fields'],
+                                 volume_spec.get('convert'))
+        drives = yield from get_volume_drives(base_url, spec, volume)
+        if drives is None:
+            ldisk_data['disks'] = []
+            info.append(ldisk_data)
+            continue
+        # One drive of each size and type of the volume
+        disks = {}
+        ldisk_data['physical_count'] = len(drives)
+        for drive in drives:
+            if not drive:
+                continue
+            disk_data = read_drive(drive, spec)
+            disks.setdefault((disk_data['capacity_gb'], disk_data['type']),
+                             disk_data)
+        ldisk_data['disks'] = list(disks.values())
+        info.append(ldisk_data)
+    return {'number': len(volumes.get('Members')), 'info': info}
+
+
+def add_drive(groups, info, disk_data, count=1):
+    # Drives of the same size, type and speed are counted together, groups
+    # has their entry of info
+    key = (disk_data['capacity_gb'], disk_data['type'], disk_data['speed'])
+    if key in groups:
+        groups[key]['count'] += count
+        return
+    groups[key] = DriveGroup(count=count, index=len(info),
+                             **disk_data.as_dict())
+    info.append(groups[key])
+
+
+def get_physical_disk_info(base_url, spec, url=None, drives=None):
+    # The drives of the controller, from their collection at url or from
+    # the links of the controller
+    select = spec['drive']['select']
+    if url:
+        collection, members = yield RedfishCollection(url, select=select)
+        if not collection:
+            return False
+        number = len(collection.get('Members'))
     else:
-        url = base_url + "/redfish/v1/Sessions/"
-    try:
-        response = requests.post(url, headers=headers, data=rq_data,
-                                 verify=False)
-    except Exception as e:
-        print(e)
-        return False
-    if response.status_code != 201:
-        print("[Fail] Can not get session token at url: {}. "
-              "Code {}".format(url, response.status_code))
+        members = yield [RedfishResource(base_url + i['@odata.id'],
+                                         select=select) for i in drives]
+        number = len(drives)
+    info, fail_part, groups = [], [], {}
+    for drive in members:
+        if not drive:
+            continue
+        if not is_healthy(drive, spec):
+            fail_part.append(get_drive_location(drive, spec))
+        add_drive(groups, info, read_drive(drive, spec))
+    return {'number': number, 'fail_part': fail_part, 'info': info}
+
+
+def get_controller_info(base_url, spec, topology, storage):
+    if spec.get('volumes'):
+        topology = dict(topology, storage=storage)
+        ldisk = yield from run_section('logical disk', get_logical_disk_info(
+            base_url, spec, get_url(base_url, spec['volumes'], topology)))
+        pdisk = yield from run_section('physical disk',
+                                       get_physical_disk_info(
+                                           base_url, spec, url=get_url(
+                                               base_url, spec['drives'],
+                                               topology)))
+        return {'logical_disk': ldisk, 'physical_disk': pdisk}
+    controller = yield base_url + storage
+    if is_refused(controller):
         return False
-    print("[Success] Created session at url: {}".format(url))
-    return response.headers
+    ldisk, pdisk = None, None
+    if controller.get('Volumes'):
+        ldisk = yield from run_section('logical disk', get_logical_disk_info(
+            base_url, spec, base_url + controller['Volumes'].get('@odata.id')))
+    if controller.get('Drives'):
+        pdisk = yield from run_section('physical disk',
+                                       get_physical_disk_info(
+                                           base_url, spec,
+                                           drives=controller['Drives']))
+    return {'logical_disk': ldisk, 'physical_disk': pdisk}
 
 
-def dell_expire_session_token(url, headers):
-    try:
-        response = requests.delete(url, headers=headers, verify=False)
-    except Exception as e:
-        print(e)
-        return False
-    if response.status_code != 200:
-        print("[Fail] Can not expire session at url: {}. "
-              "Code {}".format(url, response.status_code))
-    print("[Success] Expired session at url: {}".format(url))
-    return None
+def is_view_failed(view):
+    return not view or view['logical_disk'] is False \
+        or view['physical_disk'] is False
 
 
-def dell_get_basic_info(system_url, headers, redfish_version):
-    basic_info = call_api_get(system_url, headers)
-    if not basic_info:
-        return False
-    try:
-        memory_status = basic_info['MemorySummary']['Status'].get('Health')
-        if not memory_status:
-            memory_status = basic_info['MemorySummary']['Status'].get(
-                'HealthRollup')
-        memory_gib = basic_info['MemorySummary']['TotalSystemMemoryGiB']
-        if redfish_version < 160:
-            memory_gib *= 1.074
-        result = {
-            'bios_version': basic_info.get('BiosVersion'),
-            'model': basic_info.get('Model'),
-            'memory_gib': int(memory_gib),
-            'memory_status': memory_status,
-            'processor': {
-                'number': basic_info['ProcessorSummary']['Count'],
-                'model': basic_info['ProcessorSummary']['Model']
-            },
-            'serial': basic_info.get('SKU'),
-            'health': basic_info['Status']['Health']
-        }
-        return result
-    except Exception as e:
-        print("Can not get basic info because {}".format(e))
+def merge_disk_info(storages, views):
+    # The volumes of the controllers are listed one after the other and
+    # their drives counted together. A controller that could not be read
+    # is reported in the fail_part of the drives, the others are kept; a
+    # controller without volumes or drives adds nothing.
+    if len(views) == 1:
+        return views[0]
+    failed = ['Controller ' + storage.rstrip('/').split('/')[-1]
+              for storage, view in zip(storages, views)
+              if is_view_failed(view)]
+    views = [view for view in views if not is_view_failed(view)]
+    if not views:
         return False
+    result = {}
+    for name in ('logical_disk', 'physical_disk'):
+        parts = [view[name] for view in views if view[name] is not None]
+        if not parts:
+            result[name] = None
+            continue
+        result[name] = {'number': sum(part['number'] for part in parts)}
+        if name == 'logical_disk':
+            result[name]['info'] = [volume for part in parts
+                                    for volume in part['info']]
+            continue
+        info, groups = [], {}
+        for part in parts:
+            for disk in part['info']:
+                add_drive(groups, info, Drive(**{
+                    field: disk[field] for field in Drive.__slots__}),
+                    disk['count'])
+        result[name].update({
+            'fail_part': [location for part in parts
+                          for location in part['fail_part']],
+            'info': info})
+    if failed:
+        if result['physical_disk'] is None:
+            result['physical_disk'] = {'number': 0, 'fail_part': [],
+                                       'info': []}
+        result['physical_disk']['fail_part'].extend(failed)
+    return result
 
 
-def dell_get_processor_info(base_url, system, headers):
-    processor = call_api_get(base_url + system + "/Processors/", headers)
-    if not processor:
+def get_disk_info(base_url, spec, topology):
+    # The controllers are walked side by side. Servers of a model do not
+    # all have the same cards, so they are listed for each server rather
+    # than taken from its template.
+    storages = yield from get_storage_urls(base_url, spec, topology)
+    if not storages:
         return False
+    views = yield RedfishParallel(
+        [get_controller_info(base_url, spec, topology, storage)
+         for storage in storages], None)
+    return merge_disk_info(storages, views)
+
+
+def start_elcm_profile(base_url, path):
+    # Starts the eLCM job that builds the profile of path only, instead of
+    # the whole Server profile that the iRMC builds in tens of seconds.
+    # Answers the id of the eLCM session of the job, None when the iRMC can
+    # not run it.
+    url = base_url + ELCM_PROFILE_URL
     try:
-        result, info, fail_part = {}, [], []
-        for i in processor.get('Members'):
-            cpu_url = base_url + i['@odata.id']
-            cpu = call_api_get(cpu_url, headers)
-            if not cpu:
-                continue
-            if cpu['Status']['Health'] != 'OK':
-                fail_part.append({
-                    'location': cpu.get('Socket'),
-                    'health': cpu['Status']['Health'],
-                    'state': cpu['Status']['State']
-                })
-            cpu_data = {
-                'core': cpu.get('TotalCores'),
-                'thread': cpu.get('TotalThreads'),
-                'model': cpu.get('Model')
-            }
-            info.append(cpu_data)
-        result.update({'fail_part': fail_part, 'info': info,
-                       'number': len(processor.get('Members'))})
-        return result
+        # The job fails when a profile of a previous run is still there
+        yield RedfishRequest('DELETE', url + path.split('/')[-1])
+        response = yield RedfishRequest('POST',
+                                        url + 'get?PARAM_PATH=' + path)
+        if response.status_code != 202:
+            print("[Info] Can not start BIOS profile job at url: {}. "
+                  "Code {}".format(url, response.status_code))
+            return None
+        return response.json()['Session']['Id']
     except Exception as e:
-        print("Can not get Processor info because {}".format(e))
-        return False
+        print("Can not start BIOS profile job cause {}".format(e))
+        return None
 
 
-def dell_get_fan_info(chassis_url, headers):
-    thermal = call_api_get(chassis_url + "/Thermal/", headers)
-    if not thermal:
-        return False
-    try:
-        result, fail_part, number = {}, [], 0
-        for i in thermal.get('Fans'):
-            if i['Status'].get('State') != 'Absent':
-                number += 1
-                if i['Status'].get('Health') != 'OK':
-                    fail_part.append({
-                        'name': i.get('Name'),
-                        'health': i['Status'].get('Health'),
-                        'state': i['Status'].get('State')
-                    })
-        result.update({'number': number, 'fail_part': fail_part})
-        return result
-    except Exception as e:
-        print("Can not get Fan info because {}".format(e))
-        return False
+def wait_elcm_session(base_url, session_id):
+    url = base_url + "/sessionInformation/{}/status".format(session_id)
+    waited = 0
+    while waited < ELCM_JOB_TIMEOUT:
+        response = yield RedfishRequest('GET', url)
+        if response.status_code != 200:
+            print("[Fail] Can not get eLCM session at url: {}. "
+                  "Code {}".format(url, response.status_code))
+            return False
+        status = response.json()['Session']['Status']
+        if status == 'terminated regularly':
+            return True
+        if status.startswith('terminated'):
+            print("[Fail] eLCM session at url: {} {}".format(url, status))
+            return False
+        if not (yield RedfishDelay(ELCM_POLL_INTERVAL)):
+            return False
+        waited += ELCM_POLL_INTERVAL
+    print("[Fail] eLCM session at url: {} still running after {}s".format(
+        url, ELCM_JOB_TIMEOUT))
+    return False
 
 
-def dell_get_memory_info(base_url, system, headers, redfish_version):
-    mem = call_api_get(base_url + system + "/Memory/", headers)
-    if not mem:
-        return False
-    result, info, fail_part = {}, [], []
+def remove_elcm_profile(base_url, path, session_id):
+    if session_id is None:
+        return
     try:
-        for i in mem.get('Members'):
-            ram = call_api_get(base_url + i['@odata.id'], headers)
-            if not ram:
-                continue
-            if ram.get('Status'):
-                if ram['Status']['State'] == 'Absent':
-                    continue
-                if ram['Status']['Health'] != 'OK':
-                    fail_part.append({
-                        'location': ram.get('DeviceLocator'),
-                        'health': ram['Status']['Health'],
-                        'state': ram['Status']['State']
-                    })
-            capa = ram.get('CapacityMiB')
-            if not capa:
-                capa = ram.get('SizeMB')
-            if redfish_version < 160:
-                capa *= 1.074
-                capa = int(capa)
-            type = ram.get('MemoryDeviceType')
-            if not type:
-                type = ram.get('DIMMType')
-            if not info:
-                info.append({
-                    'index': 0,
-                    'capacity_mib': capa,
-                    'type': type,
-                    'count': 1
-                })
-            else:
-                new = True
-                for r in info:
-                    count = r['count']
-                    index = r['index']
-                    if r['capacity_mib'] == capa:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                if new:
-                    info.append({
-                        'index': len(info),
-                        'capacity_mib': capa,
-                        'type': type,
-                        'count': 1
-                    })
-        result.update({'fail_part': fail_part, 'info': info})
-        return result
+        yield RedfishRequest(
+            'DELETE',
+            base_url + "/sessionInformation/{}/remove".format(session_id))
+        yield RedfishRequest(
+            'DELETE', base_url + ELCM_PROFILE_URL + path.split('/')[-1])
     except Exception as e:
-        print("Can not get Memory info because {}".format(e))
+        print("Can not remove BIOS profile cause {}".format(e))
+
+
+def get_bios_config_info(base_url, spec, topology, elcm_session=None):
+    # Only the settings are read from the stream of the document, which is
+    # several MB for the eLCM profile of iRMC S5. When the eLCM job was
+    # started with the session, it has run while the other sections were
+    # collected.
+    paths = []
+    for path in spec['settings'].values():
+        for alternative in path if isinstance(path, tuple) else (path,):
+            if alternative not in paths:
+                paths.append(alternative)
+    if not spec.get('elcm'):
+        bios = yield RedfishExtract(get_url(base_url, spec['path'], topology),
+                                    paths)
+    elif elcm_session is not None:
+        if not (yield from wait_elcm_session(base_url, elcm_session)):
+            return False
+        bios = yield RedfishExtract(
+            base_url + ELCM_PROFILE_URL + spec['elcm'].split('/')[-1], paths,
+            select=False)
+    else:
+        bios = yield RedfishExtract(
+            base_url + ELCM_PROFILE_URL + spec['elcm'].split('/')[0], paths,
+            select=False)
+    if bios is False:
         return False
+    settings = {}
+    for name, path in spec['settings'].items():
+        value = None
+        for alternative in path if isinstance(path, tuple) else (path,):
+            value = bios.get(alternative)
+            if value:
+                break
+        if value is None and name in spec.get('optional', ()):
+            continue
+        settings[name] = value
+    if spec.get('format'):
+        text = spec['format'].format(**settings)
+    else:
+        text = str(settings)
+    if has_values(settings, spec['expected']):
+        return "OK. " + text
+    return "NOK. " + text
 
 
-def dell_get_logical_disk_info(base_url, volume_url, headers):
-    all_ldisk = call_api_get(base_url + volume_url, headers)
-    if not all_ldisk:
-        return False
-    result = {}
-    result.update({'number': len(all_ldisk.get('Members'))})
-    info, ldisk_data = [], {}
-    try:
-        for i in all_ldisk.get('Members'):
-            ldisk_url = base_url + i['@odata.id']
-            ldisk = call_api_get(ldisk_url, headers)
-            if not ldisk:
-                continue
-            if ldisk.get('VolumeType') == 'RawDevice':
-                continue
-            if ldisk.get('VolumeType') == 'Mirrored':
-                raid_type = 1
-            else:
-                raid_type = 0
-            ldisk_data = {
-                'raid': raid_type,
-                'capacity_gb': int(round(ldisk['CapacityBytes'] / 1000000000)),
-            }
-            pdisk = ldisk.get('Links')
-            if pdisk:
-                pdisk = pdisk.get('Drives')
-            else:
-                ldisk_data.update({'disks': []})
-                info.append(ldisk_data)
-                continue
-            disk = []
-            ldisk_data.update({'physical_count': len(pdisk)})
-            for d in pdisk:
-                pdisk_info = call_api_get(base_url + d['@odata.id'], headers)
-                if not pdisk_info:
-                    continue
-                disk_data = {
-                    'capacity_gb': int(round(
-                        pdisk_info['CapacityBytes'] / 1000000000)),
-                    'type': pdisk_info['MediaType']
-                }
-                if disk_data['type'] == 'HDD':
-                    disk_data.update({'speed': pdisk_info['RotationSpeedRPM']})
-                else:
-                    disk_data.update({'speed': None})
-                if not disk:
-                    disk.append(disk_data)
-                for r in disk:
-                    if disk_data['capacity_gb'] != r['capacity_gb'] \
-                            or disk_data['type'] != r['type']:
-                        disk.append(disk_data)
-            ldisk_data.update({'disks': disk})
-            info.append(ldisk_data)
-        result.update({'info': info})
-        return result
-    except Exception as e:
-        print("Can not get logical disk info because {}".format(e))
-        return False
+SECTION_KINDS = {
+    'resource': get_resource_info,
+    'parts': get_parts_info,
+    'disks': get_disk_info,
+    'bios': get_bios_config_info
+}
 
 
-def dell_get_physical_disk_info(base_url, drives, headers):
-    result = {}
-    result.update({'number': len(drives)})
-    info, fail_part = [], []
-    try:
-        for i in drives:
-            pdisk = call_api_get(base_url + i['@odata.id'], headers)
-            if not pdisk:
-                continue
-            if pdisk['Status']['Health'] != 'OK' \
-                    or pdisk['Status']['State'] != 'Enabled':
-                lmsg = "" + pdisk.get('Name')
-                fail_part.append(strip(lmsg))
-            disk_data = {
-                'capacity_gb': int(round(pdisk['CapacityBytes'] / 1000000000)),
-                'type': pdisk['MediaType']
-            }
-            if disk_data['type'] == 'HDD':
-                disk_data.update({'speed': pdisk['RotationSpeedRPM']})
-            else:
-                disk_data.update({'speed': None})
-            if not info:
-                disk_data.update({'count': 1, 'index': 0})
-                info.append(disk_data)
-            else:
-                new = True
-                for d in info:
-                    count = d['count']
-                    index = d['index']
-                    if d['speed'] \
-                            and d['capacity_gb'] == disk_data['capacity_gb'] \
-                            and d['type'] == disk_data['type'] \
-                            and d['speed'] == disk_data['speed']:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                    elif not d['speed'] \
-                            and d['capacity_gb'] == disk_data['capacity_gb'] \
-                            and d['type'] == disk_data['type']:
-                        count += 1
-                        info[index].update({'count': count})
-                        new = False
-                        break
-                if new:
-                    disk_data.update({'count': 1, 'index': len(info)})
-                    info.append(disk_data)
-
-        result.update({'fail_part': fail_part, 'info': info})
-        return result
-    except Exception as e:
-        print("Can not get physical disk info because {}".format(e))
-        return False
+def merge_profile(profile, changes):
+    merged = dict(profile)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_profile(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
 
 
-def dell_get_disk_info(base_url, system, headers):
-    raid_controller_info = call_api_get(base_url + system + "/Storage/",
-                                        headers)
-    if not raid_controller_info:
-        return False
-    storage_url = ""
-    for i in raid_controller_info.get('Members'):
-        url = i['@odata.id']
-        if "RAID" in url:
-            storage_url = url
-    if not storage_url:
-        print("Can not get raid controller info, fail to get Disk info")
-        return False
-    storage = call_api_get(base_url + storage_url, headers)
-    if not storage:
-        return False
-    if storage.get('Volumes'):
-        ldisk = dell_get_logical_disk_info(base_url,
-                                           storage['Volumes'].get('@odata.id'),
-                                           headers)
-    else:
-        ldisk = None
-    if storage.get('Drives'):
-        pdisk = dell_get_physical_disk_info(base_url, storage['Drives'],
-                                            headers)
-    else:
-        pdisk = None
-    return {'logical_disk': ldisk, 'physical_disk': pdisk}
+def is_generation(when, facts):
+    for name, value in when.items():
+        if name.endswith('_below'):
+            fact = facts.get(name[:-len('_below')])
+            if fact is None or fact >= value:
+                return False
+        elif facts.get(name) != value:
+            return False
+    return True
 
 
-def dell_get_power_info(base_url, chassis, headers):
-    all_power = call_api_get(base_url + chassis + "/Power/", headers)
-    if not all_power:
-        return False
-    result, info, fail_part = {}, [], []
-    try:
-        result.update({
-            'number': len(all_power.get('PowerSupplies'))
-        })
-        for i in all_power.get('PowerSupplies'):
-            if i['Status']['Health'] != 'OK' or \
-                    i['Status']['State'] != 'Enabled':
-                fp = {'name': i.get('Name')}
-                fail_part.append(fp)
-            capa = i.get('PowerCapacityWatts')
-            if not capa:
-                model = i.get('Model')
-                if model:
-                    capa = int(model.split(",")[1].replace("W", ""))
-            power_data = {
-                'capacity': capa,
-            }
-            info.append(power_data)
-        redundancy = False
-        if all_power.get('Redundancy'):
-            redundancy = True
-        result.update({'info': info, 'fail_part': fail_part,
-                       'redundancy': redundancy})
-        return result
-    except Exception as e:
-        print("Can not get Power info because {}".format(e))
-        return False
+def get_generation(profile, facts):
+    # The profile with the changes of the generations matching facts
+    for generation in profile.get('generations', ()):
+        if is_generation(generation['when'], facts):
+            profile = merge_profile(profile, {
+                key: value for key, value in generation.items()
+                if key != 'when'})
+    return profile
 
 
-def dell_get_network_adapter_info(base_url, system, headers):
-    all_na = call_api_get(base_url + system + "/NetworkAdapters/", headers)
-    if not all_na:
+def get_member_url(base_url, name, url, single):
+    collection = yield base_url + url
+    if not collection:
         return False
-    result, info, fail_part = {}, [], []
-    try:
-        for i in all_na.get('Members'):
-            na_url = base_url + i['@odata.id']
-            na = call_api_get(na_url, headers)
-            if not na:
-                continue
-            na_data = {
-                'model': na.get('Model'), 'name': na.get('Name')
-            }
-            if not na.get('Status'):
-                info.append(na_data)
-                continue
-            if na['Status'].get('Health') \
-                    and na['Status'].get('Health') != 'OK':
-                fail_part.append({
-                    'name': na.get('Name'), 'state': na['Status'].get('State'),
-                    'health': na['Status']['Health'], 'model': na.get('Model')
-                })
-            info.append(na_data)
-        result.update({'number': len(all_na.get('Members')), 'info': info,
-                       'fail_part': fail_part})
-        return result
-    except Exception as e:
-        print("Can not get Network info because {}".format(e))
+    members = collection.get('Members')
+    if not members:
         return False
+    if single and len(members) != 1:
+        print("Device doesnt have 1 {} only, can not get info".format(name))
+        return False
+    return members[0].get('@odata.id')
 
 
-def dell_get_snmp_service_info(base_url, manager, headers):
-    mn = call_api_get(base_url + manager + "/NetworkProtocol/", headers)
-    if not mn:
-        return False
-    snmp = mn.get('SNMP')
-    if not snmp:
-        return False
-    enable = snmp.get('ProtocolEnabled')
-    if enable:
-        result = {'state': 'Enabled', 'list_string': ''}
-    else:
-        result = {'state': 'Disabled', 'list_string': ''}
-    return result
+def get_topology_value(name, lookup):
+    value = yield TopologyLookup(name, lookup)
+    return value
 
 
-def dell_get_idrac_info(base_url, manager, headers):
-    idrac = call_api_get(base_url + manager, headers)
-    if not idrac:
-        return False
-    result = {'model': idrac.get('Model'),
-              'version': idrac.get('FirmwareVersion')}
-    return result
+def get_topology(base_url, profile):
+    # uris of the system, chassis and manager of the server
+    topology = dict(profile.get('resources', {}))
+    collections = profile.get('collections', {})
+    names = list(collections)
+    values = yield RedfishParallel([
+        get_topology_value(name, get_member_url(
+            base_url, name, collections[name],
+            profile.get('single_member')))
+        for name in names])
+    topology.update(zip(names, values))
+    return topology
 
 
-def dell_get_bios_config_info():
-    return None
+def get_link(body, name):
+    links = get_value(body, 'Links.' + name)
+    if not links:
+        return None
+    return links[0].get('@odata.id').rstrip('/')
 
 
-def dell_get_object_info(base_url, object, headers):
-    object_dict = {
-        'system': 'Systems',
-        'chassis': 'Chassis',
-        'manager': 'Managers'
-    }
-    oj = object_dict.get(object)
-    if not oj:
-        return False
-    oj_info = call_api_get(base_url + "/redfish/v1/" + oj, headers)
-    if not oj_info:
-        return False
-    oj_list = oj_info.get('Members')
-    if not oj_list:
+def get_nodes(base_url, profile):
+    # Topology of every system of a chassis: the chassis and manager each
+    # system links, else the first ones of their collection
+    collections = profile.get('collections', {})
+    systems, members = yield RedfishCollection(
+        base_url + collections.get('system', SYSTEMS_URL), select=('Links',))
+    if not systems:
         return False
-    oj_url = oj_list[0].get('@odata.id')
-    return oj_url
+    topology = dict(profile.get('resources', {}))
+    names = [name for name in collections if name != 'system']
+    values = yield RedfishParallel([
+        get_member_url(base_url, name, collections[name], False)
+        for name in names])
+    topology.update(zip(names, values))
+    nodes = []
+    for link, member in zip(systems['Members'], members):
+        nodes.append(dict(topology, **{
+            'system': link['@odata.id'].rstrip('/'),
+            'chassis': get_link(member, 'Chassis') or topology.get('chassis'),
+            'manager': get_link(member, 'ManagedBy')
+            or topology.get('manager')}))
+    return nodes
+
+
+def collect_nodes(client, profile, ip_address, nodes, elcm_session):
+    # The nodes are collected side by side, each in a result of its own
+    results = yield RedfishParallel([
+        collect_profile_sections(
+            client, profile, topology,
+            {'ip': ip_address, 'node': topology['system']}, elcm_session)
+        for topology in nodes])
+    return results
+
+
+def get_section_collectors(base_url, profile, names, topology,
+                           elcm_session):
+    sections = []
+    for name in names:
+        spec = profile['sections'][name]
+        if spec['kind'] == 'bios':
+            collector = get_bios_config_info(base_url, spec, topology,
+                                             elcm_session)
+        else:
+            collector = SECTION_KINDS[spec['kind']](base_url, spec, topology)
+        sections.append((name, run_section(name, collector)))
+    return sections
+
+
+def collect_profile_sections(client, profile, topology, result,
+                             elcm_session):
+    # With a generation_section, the sections that depend on the generation
+    # wait for it, the others are collected with it
+    base_url = client.base_url
+    names = [name for name, spec in profile['sections'].items() if spec]
+    for name, spec in profile['sections'].items():
+        if not spec:
+            result[name] = None
+    generation = profile.get('generation_section')
+    deferred = []
+    if generation:
+        for changes in profile.get('generations', ()):
+            deferred += [name for name in changes.get('sections', {})
+                         if name not in deferred]
+    yield from collect_sections(client, result, get_section_collectors(
+        base_url, profile, [name for name in names if name not in deferred],
+        topology, elcm_session))
+    if not deferred:
+        return result
+    found = result[generation]
+    if found == SECTION_TIMEOUT or not found:
+        for name in deferred:
+            result[name] = SECTION_TIMEOUT if found else None
+        return result
+    profile = get_generation(profile, {generation: found.get('model')})
+    yield from collect_sections(client, result, get_section_collectors(
+        base_url, profile, deferred, topology, elcm_session))
+    return result
 
 
-def dell_get_all_info(ip_address, username, password):
-    print("--> Getting information for Dell device {}".format(ip_address))
-    base_url = "https://" + ip_address
-    redfish_version = dell_get_redfish_version(base_url, username, password)
-    if not redfish_version:
-        return None
-    header_info = dell_get_session_token(base_url, username, password,
-                                         redfish_version)
-    if not header_info:
+def collect_all_info(profile, client, ip_address, username, password,
+                     nodes=False):
+    # With nodes, every system of the chassis is collected through the one
+    # session and a list of results is answered. Their uris and storage
+    # differ from node to node, so no template is used.
+    base_url = client.base_url
+    if nodes:
+        client.template = None
+    if client.template is not None:
+        bmc = yield from get_bmc_key(client)
+        client.template = client.template.for_bmc(bmc) if bmc else None
+    if profile.get('redfish_version'):
+        redfish_version = yield TopologyLookup(
+            'redfish_version',
+            get_redfish_version(base_url, username, password))
+        if not redfish_version:
+            return None
+        profile = get_generation(profile,
+                                 {'redfish_version': redfish_version})
+    header_info = yield from open_session(
+        client, username, password,
+        get_session_token(base_url, username, password, profile['session'],
+                          client.template))
+    if header_info is None:
         return None
-    token = header_info.get('X-Auth-Token')
-    headers = {"Content-Type": "application/json", "X-Auth-Token": token}
+    elcm = (profile['sections'].get('bios_config') or {}).get('elcm')
+    if nodes:
+        nodes = yield from run_section('nodes', get_nodes(base_url, profile))
+        if not nodes:
+            yield from close_session(client, header_info,
+                                     expire_session_token)
+            return None
+        if elcm and len(nodes) > 1:
+            # The eLCM profile is the one of the server of the iRMC
+            print("[Info] BIOS config of the {} nodes of {} is not "
+                  "read".format(len(nodes), ip_address))
+            profile = merge_profile(profile,
+                                    {'sections': {'bios_config': None}})
+            elcm = None
+    elcm_session = None
+    if elcm:
+        elcm_session = yield from start_elcm_profile(base_url, elcm)
     try:
-        system = dell_get_object_info(base_url, 'system', headers)
-        chassis = dell_get_object_info(base_url, 'chassis', headers)
-        manager = dell_get_object_info(base_url, 'manager', headers)
-        result = {
-            'base_info': dell_get_basic_info(base_url + system, headers,
-                                             redfish_version),
-            'network': dell_get_network_adapter_info(
-                base_url, system, headers),
-            'processor': dell_get_processor_info(base_url, system, headers),
-            'fan': dell_get_fan_info(base_url + chassis, headers),
-            'disk': dell_get_disk_info(base_url, system, headers),
-            'power': dell_get_power_info(base_url, chassis, headers),
-            'memory': dell_get_memory_info(base_url, system, headers,
-                                           redfish_version),
-            'snmp': dell_get_snmp_service_info(base_url, manager, headers),
-            'firmware': dell_get_idrac_info(base_url, manager, headers),
-            'bios_config': dell_get_bios_config_info()
-        }
+        if nodes:
+            result = yield from collect_nodes(client, profile, ip_address,
+                                              nodes, elcm_session)
+        else:
+            topology = yield from get_topology(base_url, profile)
+            result = yield from collect_profile_sections(
+                client, profile, topology, {'ip': ip_address}, elcm_session)
     except Exception as e:
-        print("Can not get Dell device info cause {}".format(e))
+        print("Can not get {} device info cause {}".format(profile['name'],
+                                                           e))
         result = None
-    dell_expire_session_token(base_url + header_info.get('Location'), headers)
+    if elcm:
+        yield from remove_elcm_profile(base_url, elcm, elcm_session)
+    yield from close_session(client, header_info, expire_session_token)
     return result
 
 
+def get_all_info(profile, ip_address, username, password, nodes=False,
+                 **options):
+    print("--> Getting information for {} device {}".format(profile['name'],
+                                                            ip_address))
+    return collect_device(
+        functools.partial(collect_all_info, profile, nodes=nodes),
+        ip_address, username, password, options)
+
+
+async def get_all_info_async(profile, ip_address, username, password,
+                             nodes=False, **options):
+    print("--> Getting information for {} device {}".format(profile['name'],
+                                                            ip_address))
+    return await collect_device_async(
+        functools.partial(collect_all_info, profile, nodes=nodes),
+        ip_address, username, password, options)
+
+
 def form_cpu_info(processor):
     if not processor:
         return None
@@ -1657,9 +1615,23 @@ def form_bios_config_info(bios_config):
     return str(bios_config)
 
 
+# Column of the output filled by each section of the collected info
+SECTION_COLUMNS = {
+    'base_info': 'Health', 'processor': 'CPU', 'fan': 'Fan', 'memory': 'RAM',
+    'disk': 'Disk', 'network': 'Network Card', 'power': 'Power',
+    'firmware': 'Firmware', 'snmp': 'SNMP', 'bios_config': 'BIOS_Config'
+}
+
+
 def form_data(info):
     try:
         result = {}
+        timed_out = [k for k in SECTION_COLUMNS
+                     if info.get(k) == SECTION_TIMEOUT]
+        if timed_out:
+            info = dict(info)
+            for k in timed_out:
+                info[k] = None
         basic_info = info.get('base_info')
         if basic_info:
             result.update({
@@ -1681,6 +1653,8 @@ def form_data(info):
             'Network Card': network, 'Firmware': firm,
             'BIOS_Config': bios_config, 'SNMP': snmp, 'Power': power
         })
+        for k in timed_out:
+            result[SECTION_COLUMNS[k]] = SECTION_TIMEOUT
         return result
     except Exception as e:
         print("Can not forming data cause {}".format(e))
@@ -1742,7 +1716,7 @@ def save_workbook(server_data, file_path, os_server_data):
         check = 'OK'
         for f in fields:
             value = element.get(f)
-            if not value:
+            if not value and not element.get('Node'):
                 try:
                     value = os_server_data[element['IP_OS']].get(f)
                 except:
@@ -1871,11 +1845,21 @@ def create_file_inventory(list_server_input):
             file.write(ssh_server)
 
 
-def get_contract_dcim(baseurl, headers, device_id):
+def call_dcim_get(url, headers, archive, params=None):
+    # Every DCIM call goes through here so that --record/--replay see them
+    if archive is not None and archive.replaying:
+        return archive.replay_dcim(url, params)
+    body = requests.get(url, headers=headers, params=params).json()
+    if archive is not None:
+        archive.record_dcim(url, params, body)
+    return body
+
+
+def get_contract_dcim(baseurl, headers, device_id, archive=None):
     try:
         params = {'device_id': device_id}
-        contract = requests.get(baseurl + "/dcim/contracts/", headers=headers,
-                                params=params).json()['results'][0]
+        contract = call_dcim_get(baseurl + "/dcim/contracts/", headers,
+                                 archive, params)['results'][0]
         if "UNKNOW" in contract['product_id'] \
                 or not contract['contract_number']:
             return "NOK. {'product_id': %s, 'contract_number': %s}" % \
@@ -1889,11 +1873,11 @@ def get_contract_dcim(baseurl, headers, device_id):
         return msg
 
 
-def get_license_dcim(baseurl, headers, device_id):
+def get_license_dcim(baseurl, headers, device_id, archive=None):
     try:
         params = {'device_id': device_id}
-        licenses = requests.get(baseurl + "/dcim/licenses/", headers=headers,
-                                params=params).json()['results']
+        licenses = call_dcim_get(baseurl + "/dcim/licenses/", headers,
+                                 archive, params)['results']
         msg_nok = ''
         for license in licenses:
             if "UNKNOW" in license['name'] or not license['name'] \
@@ -1912,11 +1896,11 @@ def get_license_dcim(baseurl, headers, device_id):
         return msg
 
 
-def get_warranty_dcim(baseurl, headers, device_id):
+def get_warranty_dcim(baseurl, headers, device_id, archive=None):
     try:
         params = {'device_id': device_id}
-        warrantys = requests.get(baseurl + "/dcim/warranties/", headers=headers,
-                                 params=params).json()['results']
+        warrantys = call_dcim_get(baseurl + "/dcim/warranties/", headers,
+                                  archive, params)['results']
         msg_nok = ''
         for warranty in warrantys:
             if 'UNKNOW' in warranty['start_date'] \
@@ -1937,35 +1921,38 @@ def get_warranty_dcim(baseurl, headers, device_id):
         return msg
 
 
-def get_info_dcim(ip_os, ip_mm, data, token):
+def get_info_dcim(ip_os, ip_mm, data, token, archive=None):
     print("--> Getting information DCIM for {}".format(ip_os))
     baseurl = 'http://10.255.58.203/api'
     headers = {'Authorization': 'Token %s' % token}
     params_device = {'ip_address': ip_mm}
     params_instance = {'ip_address': ip_os}
-    check_token = requests.get(baseurl, headers=headers).json()
+    check_token = call_dcim_get(baseurl, headers, archive)
     if not check_token.get('dcim'):
         print("Token %s invalid for call DCIM api" % token)
         data["Define_in_dcim"] = "NOK. Token invalid for call api DCIM"
         return data
     try:
-        instance = requests.get(baseurl + "/dcim/instances/", headers=headers,
-                                params=params_instance).json()['results'][0]
+        instance = call_dcim_get(baseurl + "/dcim/instances/", headers,
+                                 archive, params_instance)['results'][0]
     except:
         print("Server %s not define in DCIM" % ip_os)
         data["Define_in_dcim"] = "NOK. Not define in DCIM"
         return data
     try:
-        device = requests.get(baseurl + "/dcim/devices/", headers=headers,
-                              params=params_device).json()['results'][0]
+        device = call_dcim_get(baseurl + "/dcim/devices/", headers,
+                               archive, params_device)['results'][0]
     except:
         print("Server %s not define in DCIM" % ip_mm)
         data["Define_in_dcim"] = "NOK. Not define in DCIM"
         return data
     data["Define_in_dcim"] = "OK"
-    data["Contract_in_dcim"] = get_contract_dcim(baseurl, headers, device['id'])
-    data['License_in_dcim'] = get_license_dcim(baseurl, headers, device['id'])
-    data['Warranty_in_dcim'] = get_warranty_dcim(baseurl, headers, device['id'])
+    data["Contract_in_dcim"] = get_contract_dcim(baseurl, headers,
+                                                 device['id'], archive)
+    data['License_in_dcim'] = get_license_dcim(baseurl, headers, device['id'],
+                                               archive)
+    data['Warranty_in_dcim'] = get_warranty_dcim(baseurl, headers,
+                                                 device['id'], archive)
     data['Verify_status_in_dcim'] = "OK. Verified" \
         if instance['verify_status'].get('label') == 'Verified' \
         else "NOK. Chua verify"
@@ -1977,6 +1964,191 @@ def get_info_dcim(ip_os, ip_mm, data, token):
     return data
 
 
+GET_ALL_INFO = {
+    vendor: functools.partial(get_all_info, profile)
+    for vendor, profile in VENDOR_PROFILES.items()
+}
+
+GET_ALL_INFO_ASYNC = {
+    vendor: functools.partial(get_all_info_async, profile)
+    for vendor, profile in VENDOR_PROFILES.items()
+}
+
+
+def prepare_server(sv, os_server_data, args):
+    ip_os = sv.get('ip_os')
+    ip_mm = os_server_data.get(ip_os).get('IP_Manager')
+    os_server_data[ip_os] = os_server_check(os_server_data[ip_os],
+                                            sv.get('type_server'))
+    os_server_data[ip_os] = get_info_dcim(ip_os, ip_mm,
+                                          os_server_data[ip_os],
+                                          args['dcim_token'],
+                                          get_archive(args, ip_os))
+    return os_server_data[ip_os].get('Vendor_Name')
+
+
+def get_archive(args, ip_os):
+    if args['archives'] is None:
+        return None
+    return args['archives'].get(ip_os)
+
+
+def load_archives(directory, list_server_input):
+    # --replay: the OS facts come from the archives instead of ansible,
+    # servers without an archive are left out
+    archives, os_server_data, replayed = {}, {}, []
+    for sv in list_server_input:
+        ip_os = sv.get('ip_os')
+        path = get_archive_path(directory, ip_os)
+        try:
+            archive = ServerArchive(path, replaying=True)
+        except (OSError, ValueError, KeyError, ReplayError) as e:
+            print("[Fail] Can not replay server {} cause {}".format(ip_os, e))
+            continue
+        archives[ip_os] = archive
+        os_server_data[ip_os] = archive.os_facts
+        replayed.append(sv)
+    return archives, os_server_data, replayed
+
+
+def create_archives(directory, list_server_input, os_server_data, args):
+    os.makedirs(directory, exist_ok=True)
+    archives = {}
+    for sv in list_server_input:
+        ip_os = sv.get('ip_os')
+        if ip_os in os_server_data:
+            archives[ip_os] = ServerArchive(
+                get_archive_path(directory, ip_os),
+                os_facts=dict(os_server_data[ip_os]), auth=args['auth'])
+    return archives
+
+
+def get_client_options(args, os_server, archive=None):
+    if args['metrics'] is not None:
+        metrics = args['metrics'].get_recorder(
+            os_server.get('Vendor_Name'), os_server.get('Product_Name'))
+    else:
+        metrics = None
+    if args['templates'] is not None:
+        template = args['templates'].get_template((
+            os_server.get('Vendor_Name'), os_server.get('Product_Name'),
+            os_server.get('BIOS_Version')))
+    else:
+        template = None
+    options = {
+        'template': template,
+        'pool_size': args['pool_size'],
+        'timeout': (args['connect_timeout'], args['read_timeout']),
+        'budget': args['budget'],
+        'retries': args['retries'],
+        'cache': args['cache'],
+        'session_store': args['session_store'],
+        'auth': args['auth'],
+        'json_decoder': args['json_decoder'],
+        'metrics': metrics,
+        'archive': archive,
+        'scheduler': args['scheduler']
+    }
+    if archive is not None:
+        # Every response is recorded, and replayed in any order: no cache,
+        # stored session or template that would skip requests
+        options.update({'cache': None, 'session_store': None,
+                        'template': None, 'auth': archive.auth})
+    return options
+
+
+def form_server_data(sv, os_server_data, sv_info):
+    ip_os = sv.get('ip_os')
+    if sv_info:
+        data = form_data(sv_info)
+    else:
+        ip_mm = os_server_data.get(ip_os).get('IP_Manager')
+        data = {
+            'Health': 'NOK. Could not get information for IP %s' % ip_mm}
+    data.update({"IP_OS": ip_os})
+    return data
+
+
+# DCIM columns of the device found by the IP of its manager, the same for
+# every node of a chassis
+DCIM_DEVICE_FIELDS = ('Define_in_dcim', 'Contract_in_dcim',
+                      'Warranty_in_dcim', 'License_in_dcim')
+
+
+def form_server_rows(sv, os_server_data, sv_info, nodes):
+    # With nodes, a row per node of the chassis, named by the manager and
+    # its system. The OS of the input row is not the one of every node, its
+    # facts (and its DCIM instance) are left out of these rows, the DCIM
+    # device of the chassis is not.
+    if not nodes or not sv_info:
+        return [form_server_data(sv, os_server_data, sv_info)]
+    os_data = os_server_data.get(sv.get('ip_os'))
+    ip_mm = os_data.get('IP_Manager')
+    rows = []
+    for node in sv_info:
+        data = form_server_data(sv, os_server_data, node)
+        data.update({'IP_Manager': ip_mm + ' ' + node['node'].split('/')[-1],
+                     'Node': node['node']})
+        data.update({field: os_data.get(field)
+                     for field in DCIM_DEVICE_FIELDS})
+        rows.append(data)
+    return rows
+
+
+def collect_server(sv, os_server_data, args):
+    ip_os = sv.get('ip_os')
+    ip_mm = os_server_data.get(ip_os).get('IP_Manager')
+    try:
+        get_all_info = GET_ALL_INFO.get(
+            prepare_server(sv, os_server_data, args))
+        if get_all_info:
+            sv_info = get_all_info(
+                ip_mm, sv.get('username_mm'), sv.get('password_mm'),
+                nodes=args['multi_node'],
+                **get_client_options(args, os_server_data[ip_os],
+                                     get_archive(args, ip_os)))
+        else:
+            sv_info = None
+    except Exception as e:
+        print("Can not collect server {} cause {}".format(ip_os, e))
+        sv_info = None
+    return form_server_rows(sv, os_server_data, sv_info,
+                            args['multi_node'])
+
+
+async def collect_server_async(sv, os_server_data, args):
+    ip_os = sv.get('ip_os')
+    ip_mm = os_server_data.get(ip_os).get('IP_Manager')
+    loop = asyncio.get_event_loop()
+    try:
+        sv_vendor = await loop.run_in_executor(
+            None, prepare_server, sv, os_server_data, args)
+        get_all_info = GET_ALL_INFO_ASYNC.get(sv_vendor)
+        if get_all_info:
+            sv_info = await get_all_info(
+                ip_mm, sv.get('username_mm'), sv.get('password_mm'),
+                nodes=args['multi_node'],
+                **get_client_options(args, os_server_data[ip_os],
+                                     get_archive(args, ip_os)))
+        else:
+            sv_info = None
+    except Exception as e:
+        print("Can not collect server {} cause {}".format(ip_os, e))
+        sv_info = None
+    return form_server_rows(sv, os_server_data, sv_info,
+                            args['multi_node'])
+
+
+async def collect_servers_async(list_server_input, os_server_data, args):
+    semaphore = asyncio.Semaphore(args['workers'])
+
+    async def collect(sv):
+        async with semaphore:
+            return await collect_server_async(sv, os_server_data, args)
+
+    return await asyncio.gather(*[collect(sv) for sv in list_server_input])
+
+
 if __name__ == "__main__":
     urllib3.disable_warnings()
     parser = argparse.ArgumentParser(
@@ -1993,39 +2165,172 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t", "--dcim-token", help='Token get DCIM',
         required=False, default='930f83a2fd22214481b0ed7b0724ac1be3e1bfc0')
+    parser.add_argument(
+        "-p", "--pool-size", help='Number of keep-alive connections kept '
+                                  'open to each BMC. Default: %d'
+                                  % DEFAULT_POOL_SIZE,
+        required=False, type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument(
+        "-w", "--workers", help='Number of servers collected concurrently. '
+                                'Default: 1',
+        required=False, type=int, default=1)
+    parser.add_argument(
+        "--async", help='Collect with one asyncio event loop instead of one '
+                        'thread per server. --workers is then the number of '
+                        'servers in flight', dest='use_async',
+        required=False, action='store_true')
+    parser.add_argument(
+        "--connect-timeout", help='Seconds to wait for a connection to a '
+                                  'BMC. Default: %d' % DEFAULT_TIMEOUT[0],
+        required=False, type=float, default=DEFAULT_TIMEOUT[0])
+    parser.add_argument(
+        "--read-timeout", help='Seconds to wait for an answer of a BMC. '
+                               'Default: %d' % DEFAULT_TIMEOUT[1],
+        required=False, type=float, default=DEFAULT_TIMEOUT[1])
+    parser.add_argument(
+        "-b", "--budget", help='Time budget in seconds to collect one server, '
+                               'sections not collected in time are reported '
+                               'as timeout. 0 for no limit. Default: %d'
+                               % DEFAULT_BUDGET,
+        required=False, type=float, default=DEFAULT_BUDGET)
+    parser.add_argument(
+        "-r", "--retries", help='Number of times a request is sent again when '
+                                'the BMC is busy (503/429) or the connection '
+                                'is lost. Default: %d' % DEFAULT_RETRIES,
+        required=False, type=int, default=DEFAULT_RETRIES)
+    parser.add_argument(
+        "--cache-dir", help='Directory of the Redfish response cache. '
+                            'Resources with an ETag are then only downloaded '
+                            'again when they changed. Default: no cache',
+        required=False, default=None)
+    parser.add_argument(
+        "--cache-ttl", help='Seconds a cached response is kept. Default: %d'
+                            % DEFAULT_CACHE_TTL,
+        required=False, type=int, default=DEFAULT_CACHE_TTL)
+    parser.add_argument(
+        "--cache-size", help='Most bytes kept in the cache directory, the '
+                             'least recently used responses are evicted '
+                             'first. Default: %d' % DEFAULT_CACHE_SIZE,
+        required=False, type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument(
+        "--session-store", help='File where BMC sessions are kept encrypted '
+                                'between runs. Sessions still valid are used '
+                                'again instead of logging in, and are not '
+                                'logged out. Default: login/logout every run',
+        required=False, default=None)
+    parser.add_argument(
+        "--auth", help='session: log in to each BMC and use the session '
+                       'token. basic: send the credentials with every '
+                       'request, without creating a session. '
+                       'Default: session',
+        required=False, choices=('session', 'basic'), default='session')
+    parser.add_argument(
+        "--no-templates", help='Discover the resource uris of every server '
+                               'instead of reusing those of the first server '
+                               'of the same vendor, model and BIOS version',
+        dest='use_templates', required=False, action='store_false')
+    parser.add_argument(
+        "--json-decoder", help='Decoder of the Redfish responses, auto uses '
+                               'orjson when it is installed. Default: auto',
+        required=False, choices=('auto', 'orjson', 'json'), default='auto')
+    parser.add_argument(
+        "--metrics", help='JSON file where the count, bytes, status codes and '
+                          'latency histogram of the requests are written, '
+                          'per vendor, model and endpoint. Default: no '
+                          'metrics', dest='metrics_file',
+        required=False, default=None)
+    parser.add_argument(
+        "--metrics-top", help='Number of slowest and most called endpoints '
+                              'printed at the end with --metrics. Default: %d'
+                              % DEFAULT_METRICS_TOP,
+        required=False, type=int, default=DEFAULT_METRICS_TOP)
+    parser.add_argument(
+        "--record", help='Directory where the OS facts, DCIM and Redfish '
+                         'responses of each server are stored, one '
+                         'compressed archive per server. Default: none',
+        required=False, default=None)
+    parser.add_argument(
+        "--replay", help='Directory of archives made with --record. The '
+                         'output is built from them, without ansible, DCIM '
+                         'or BMC requests. Default: none',
+        required=False, default=None)
+    parser.add_argument(
+        "--multi-node", help='The manager IP of each row is a chassis '
+                             'manager: every system under /redfish/v1/Systems '
+                             'is collected through its one session, each '
+                             'node in a row of its own',
+        required=False, action='store_true')
+    parser.add_argument(
+        "--max-in-flight", help='Most requests in flight to all the BMCs at '
+                                'once, 0 for no limit. Default: %d'
+                                % DEFAULT_MAX_IN_FLIGHT,
+        required=False, type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument(
+        "--per-bmc", help='Most requests in flight to one BMC at once, 0 for '
+                          'no limit. Default: %d' % DEFAULT_BMC_LIMIT,
+        required=False, type=int, default=DEFAULT_BMC_LIMIT)
+    parser.add_argument(
+        "--per-subnet", help='Most requests in flight to the BMCs of one '
+                             'management subnet at once, 0 for no limit. '
+                             'Default: %d' % DEFAULT_SUBNET_LIMIT,
+        required=False, type=int, default=DEFAULT_SUBNET_LIMIT)
+    parser.add_argument(
+        "--subnet-prefix", help='Prefix length of the management subnets '
+                                'for --per-subnet. Default: %d'
+                                % DEFAULT_SUBNET_PREFIX,
+        required=False, type=int, default=DEFAULT_SUBNET_PREFIX)
     args = vars(parser.parse_args())
-    server_data = []
+    if args['record'] and args['replay']:
+        parser.error("--record and --replay can not be used together")
+    if args['cache_dir']:
+        args['cache'] = ResponseCache(args['cache_dir'], args['cache_ttl'],
+                                      args['cache_size'])
+    else:
+        args['cache'] = None
+    if args['session_store']:
+        args['session_store'] = SessionStore(args['session_store'])
+    args['templates'] = TopologyTemplates() if args['use_templates'] else None
+    args['metrics'] = RequestMetrics() if args['metrics_file'] else None
+    args['scheduler'] = RequestScheduler(
+        args['max_in_flight'], args['per_bmc'], args['per_subnet'],
+        args['subnet_prefix'])
     list_server_input = load_workbook(args['input'], 'Sheet1')
-    create_file_inventory(list_server_input)
-    get_info_os(CURRENT_DIR + '/ansible_toolchecklist.yml',
-                CURRENT_DIR + '/inventory_toolchecklist')
-    os_server_data = load_workbook_os(
-        CURRENT_DIR + "/ansible_toolchecklist.xlsx", 'Sheet')
-    for sv in list_server_input:
-        ip_os = sv.get('ip_os')
-        ip_mm = os_server_data.get(ip_os).get('IP_Manager')
-        user_mm = sv.get('username_mm')
-        pw_mm = sv.get('password_mm')
-        type_server = sv.get('type_server')
-        os_server_data[ip_os] = os_server_check(os_server_data[ip_os],
-                                                type_server)
-        os_server_data[ip_os] = get_info_dcim(ip_os, ip_mm,
-                                              os_server_data[ip_os],
-                                              args['dcim_token'])
-        sv_vendor = os_server_data[sv['ip_os']].get('Vendor_Name')
-        if sv_vendor == 'HPE' or sv_vendor == 'HP':
-            sv_info = hpe_get_all_info(ip_mm, user_mm, pw_mm)
-        elif sv_vendor == 'FUJITSU':
-            sv_info = fjs_get_all_info(ip_mm, user_mm, pw_mm)
-        elif sv_vendor == 'Dell Inc.':
-            sv_info = dell_get_all_info(ip_mm, user_mm, pw_mm)
-        else:
-            sv_info = None
-        if sv_info:
-            data = form_data(sv_info)
+    if args['replay']:
+        args['archives'], os_server_data, list_server_input = load_archives(
+            args['replay'], list_server_input)
+    else:
+        create_file_inventory(list_server_input)
+        get_info_os(CURRENT_DIR + '/ansible_toolchecklist.yml',
+                    CURRENT_DIR + '/inventory_toolchecklist')
+        os_server_data = load_workbook_os(
+            CURRENT_DIR + "/ansible_toolchecklist.xlsx", 'Sheet')
+        if args['record']:
+            args['archives'] = create_archives(
+                args['record'], list_server_input, os_server_data, args)
         else:
-            data = {
-                'Health': 'NOK. Could not get information for IP %s' % ip_mm}
-        data.update({"IP_OS": ip_os})
-        server_data.append(data)
+            args['archives'] = None
+    if args['workers'] > 1:
+        print("Collecting {} servers with {} workers".format(
+            len(list_server_input), args['workers']))
+    if args['use_async']:
+        server_rows = asyncio.run(collect_servers_async(
+            list_server_input, os_server_data, args))
+    else:
+        with ThreadPoolExecutor(max_workers=args['workers']) as executor:
+            server_rows = list(executor.map(
+                lambda sv: collect_server(sv, os_server_data, args),
+                list_server_input))
+    server_data = [row for rows in server_rows for row in rows]
+    if args['cache']:
+        args['cache'].close()
+    if args['record']:
+        for archive in args['archives'].values():
+            archive.save()
+        print("[Info] {} server archives written to {}".format(
+            len(args['archives']), args['record']))
+    if args['workers'] > 1:
+        args['scheduler'].print_stats()
+    if args['metrics']:
+        args['metrics'].print_summary(args['metrics_top'])
+        args['metrics'].dump(args['metrics_file'])
     save_workbook(server_data, args['output'], os_server_data)
@@ -0,0 +1,93 @@
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+STREAM_CHUNK_SIZE = 64 * 1024
+buffering_warned = False
+
+
+def warn_buffering():
+    # Once per run: without ijson the documents are kept whole until close
+    global buffering_warned
+    if not buffering_warned:
+        buffering_warned = True
+        print("[Info] ijson is not installed, streamed documents are read "
+              "whole before being decoded")
+
+
+def extract_paths(document, paths):
+    result = {}
+    for path in paths:
+        value = document
+        for key in path.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            result[path] = value
+    return result
+
+
+class JsonExtractor(object):
+    # Values of some dotted paths ('Server.SystemConfig.BiosConfig') of a
+    # JSON document fed chunk by chunk. With ijson the document is parsed
+    # incrementally and only the wanted values are built, so memory does
+    # not grow with the size of the document, and done tells when every
+    # path was found so that the rest of the body does not need to be read.
+    # Without ijson the body is kept and decoded with decode_json at close.
+
+    def __init__(self, paths, decode_json):
+        self.paths = set(paths)
+        self.decode_json = decode_json
+        self.result = {}
+        self.size = 0
+        self.builder, self.building, self.depth = None, None, 0
+        if ijson is not None:
+            self.events = ijson.sendable_list()
+            self.parser = ijson.parse_coro(self.events, use_float=True)
+        else:
+            warn_buffering()
+            self.chunks = []
+
+    @property
+    def done(self):
+        return len(self.result) == len(self.paths)
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        if ijson is None:
+            self.chunks.append(chunk)
+            return
+        self.parser.send(chunk)
+        self.read_events()
+
+    def read_events(self):
+        for prefix, event, value in self.events:
+            if self.builder is None:
+                if prefix not in self.paths or event in ('map_key', 'end_map',
+                                                         'end_array'):
+                    continue
+                if event not in ('start_map', 'start_array'):
+                    self.result[prefix] = value
+                    continue
+                self.builder = ijson.ObjectBuilder()
+                self.building, self.depth = prefix, 0
+            self.builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                self.depth += 1
+            elif event in ('end_map', 'end_array'):
+                self.depth -= 1
+                if self.depth == 0:
+                    self.result[self.building] = self.builder.value
+                    self.builder = None
+        del self.events[:]
+
+    def close(self):
+        if ijson is None:
+            return extract_paths(self.decode_json(b''.join(self.chunks)),
+                                 self.paths)
+        if not self.done:
+            self.parser.close()
+            self.read_events()
+        return self.result
@@ -0,0 +1,82 @@
+import sys
+
+
+# Component data kept for every server until the workbook is written. A
+# record has a slot per field instead of a dict per part, and its strings
+# are interned, so the thousands of DIMMs or drives of the same model share
+# one. Records are read like the dicts they replace, record['model'] or
+# record.get('speed'), and print the same.
+class Record(object):
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            if isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, name, value)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def as_dict(self):
+        # The fields that were set, in the order of the slots
+        return {name: getattr(self, name) for name in self.__slots__
+                if hasattr(self, name)}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+class Processor(Record):
+    __slots__ = ('core', 'thread', 'model')
+
+
+class MemoryGroup(Record):
+    __slots__ = ('index', 'capacity_mib', 'type', 'count')
+
+
+class PowerSupply(Record):
+    __slots__ = ('capacity',)
+
+
+class NetworkAdapter(Record):
+    __slots__ = ('model', 'name')
+
+
+class Firmware(Record):
+    __slots__ = ('model', 'version')
+
+
+class Drive(Record):
+    __slots__ = ('capacity_gb', 'type', 'speed')
+
+
+# Drives of the same size, type and speed of a controller
+class DriveGroup(Record):
+    __slots__ = ('capacity_gb', 'type', 'speed', 'count', 'index')
+
+
+# Records by the name used in the profiles
+RECORDS = {
+    'processor': Processor,
+    'memory_group': MemoryGroup,
+    'power_supply': PowerSupply,
+    'network_adapter': NetworkAdapter,
+    'firmware': Firmware
+}
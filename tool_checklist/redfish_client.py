@@ -0,0 +1,686 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import random
+import threading
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib.parse import urlsplit
+from json_extract import STREAM_CHUNK_SIZE
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_POOL_SIZE = 4
+# (connect, read) in seconds
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_RETRIES = 3
+# Answers of a busy BMC, the request was not processed and can be sent again
+RETRY_STATUS = (429, 503)
+# A lost connection is only retried when sending the request twice is safe
+RETRY_METHODS = ('GET', 'DELETE')
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+# SectionStats of the section the current request is sent for
+SECTION_STATS = contextvars.ContextVar('section_stats', default=None)
+
+
+class BudgetExceeded(Exception):
+    # A GET not sent because the time budget ran out while it waited for
+    # its slot, it is already counted as skipped
+    pass
+
+
+# Decoders of raw response bodies (bytes), 'auto' is the fastest installed
+JSON_DECODERS = {'json': json.loads}
+if orjson is not None:
+    JSON_DECODERS['orjson'] = orjson.loads
+
+
+def get_json_decoder(name='auto'):
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in JSON_DECODERS else 'json'
+    if name not in JSON_DECODERS:
+        raise RuntimeError("JSON decoder {} is not installed".format(name))
+    return JSON_DECODERS[name]
+
+
+class RedfishRequest(object):
+    # Request yielded by a collector when a plain GET of a url string is not
+    # enough (session POST/DELETE, GET with basic auth...).
+
+    def __init__(self, method, url, headers=None, data=None, auth=None):
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.data = data
+        self.auth = auth
+
+
+class RedfishDelay(object):
+    # Pause yielded by a collector that polls a job of the BMC. The collector
+    # receives False, and the request is counted as skipped, when the pause
+    # would end past the deadline of the client.
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class RedfishResource(object):
+    # GET yielded by a collector that only reads some properties of the
+    # resource. The driver adds $select=<properties> when the BMC supports
+    # it and answers the decoded body, like for a plain url string.
+
+    def __init__(self, url, select=None):
+        self.url = url
+        self.select = select
+
+
+class RedfishExtract(object):
+    # GET yielded by a collector that only reads a few values of a large
+    # document. paths are dotted ('Attributes.ThermalConfig'), the body is
+    # streamed through a json_extract.JsonExtractor and the collector
+    # receives {path: value} for the paths found, or False. select adds the
+    # paths as $select when the BMC supports it (Redfish resources only).
+
+    def __init__(self, url, paths, select=True):
+        self.url = url
+        self.paths = paths
+        self.select = select
+
+
+class RedfishCollection(object):
+    # Collection yielded by a collector that needs every member. The driver
+    # answers (collection, members) with one $expand GET when the BMC
+    # supports it, else with the collection GET plus one GET per member
+    # (projected on select when the BMC supports $select).
+
+    def __init__(self, url, select=None):
+        self.url = url
+        self.select = select
+
+
+class RedfishParallel(object):
+    # Collectors yielded together by a collector, which receives the list
+    # of their results. The driver runs them side by side: their requests
+    # are in flight together and a url asked by several of them is fetched
+    # once. stats are SectionStats, one per collector, counting
+    # what each of them skipped and retried; without them the requests are
+    # counted in the stats of the yielding collector.
+
+    def __init__(self, collectors, stats=None):
+        self.collectors = collectors
+        self.stats = stats
+
+
+class SectionStats(object):
+    # Requests of one section skipped because the time budget was spent,
+    # and sent again to a busy BMC
+
+    def __init__(self):
+        self.skipped = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def add(self, skipped=0, retries=0):
+        with self.lock:
+            self.skipped += skipped
+            self.retries += retries
+
+
+def add_query(url, query):
+    separator = '&' if '?' in url else '?'
+    return url + separator + query
+
+
+def get_expand_query(service_root):
+    if not service_root:
+        return ''
+    features = service_root.get('ProtocolFeaturesSupported') or {}
+    expand = features.get('ExpandQuery') or {}
+    if not expand.get('NoLinks'):
+        return ''
+    if expand.get('Levels'):
+        return '$expand=.($levels=1)'
+    return '$expand=.'
+
+
+def is_select_supported(service_root):
+    if not service_root:
+        return False
+    features = service_root.get('ProtocolFeaturesSupported') or {}
+    return bool(features.get('SelectQuery'))
+
+
+def get_select_query(select):
+    return '$select=' + ','.join(select)
+
+
+def is_expanded(collection):
+    members = collection.get('Members')
+    if members is None:
+        return False
+    for member in members:
+        if set(member.keys()) == {'@odata.id'}:
+            return False
+    return True
+
+
+def get_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0)
+
+
+def make_response(url, status_code, headers, content):
+    # requests.Response of a replayed answer
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+class BaseRedfishClient(object):
+    # State shared by the blocking and the asyncio clients: what the BMC
+    # supports, the timeouts, the retries and the time budget of the device.
+    # Once the budget is spent GETs are not sent anymore (call_api_get counts
+    # them in skipped) so that the collectors finish with what they already
+    # have.
+
+    def __init__(self, base_url, pool_size, timeout, budget, retries, cache,
+                 session_store, auth, template, json_decoder, metrics,
+                 archive, scheduler):
+        self.base_url = base_url
+        # host[:port] of the BMC
+        self.bmc = urlsplit(base_url).netloc or base_url
+        self.pool_size = pool_size
+        self.expand_query = None
+        self.use_select = None
+        self.timeout = timeout
+        self.budget = budget
+        self.deadline = time.monotonic() + budget if budget else None
+        self.skipped = 0
+        # GETs answered by the response of an earlier GET of the same url
+        self.saved = 0
+        self.max_retries = retries
+        self.retries = 0
+        self.cache = cache
+        self.session_store = session_store
+        # 'session' (X-Auth-Token) or 'basic'
+        self.auth = auth
+        # topology.ServerTemplate of the model of the server
+        self.template = template
+        self.decode_json = get_json_decoder(json_decoder)
+        # request_metrics.MetricsRecorder of the server
+        self.metrics = metrics
+        # server_archive.ServerArchive recording or replaying the responses
+        self.archive = archive
+        # request_scheduler.RequestScheduler shared by the clients of the run
+        self.scheduler = scheduler
+
+    @property
+    def replaying(self):
+        return self.archive is not None and self.archive.replaying
+
+    def timed_out(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def get_remaining(self):
+        # Seconds a GET may still take, None without a time budget
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 1)
+
+    def get_timeout(self):
+        # A GET never waits for its connection or answer past the deadline
+        remaining = self.get_remaining()
+        if remaining is None:
+            return self.timeout
+        return min(self.timeout[0], remaining), min(self.timeout[1], remaining)
+
+    def get_slot_timeout(self, budgeted):
+        if not budgeted or self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0)
+
+    def skip_request(self):
+        self.count_skipped()
+        raise BudgetExceeded("Time budget of {}s exceeded for {}".format(
+            self.budget, self.base_url))
+
+    def check_budget(self, budgeted):
+        # Called once the slot is held: the budget may have run out while
+        # the request waited for it
+        if budgeted and self.timed_out():
+            self.skip_request()
+
+    def get_retry_delay(self, attempt, retry_after=None):
+        # None when the request must not be sent again. Without Retry-After
+        # the delay is drawn in [0, BACKOFF_BASE * 2^attempt] so that the
+        # requests of the other workers do not hit the BMC all at once.
+        if attempt >= self.max_retries:
+            return None
+        delay = get_retry_after(retry_after)
+        if delay is None:
+            delay = random.uniform(
+                0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        delay = min(delay, BACKOFF_MAX)
+        if self.deadline is not None \
+                and time.monotonic() + delay > self.deadline:
+            return None
+        return delay
+
+    def can_wait(self, seconds):
+        if self.deadline is not None \
+                and time.monotonic() + seconds > self.deadline:
+            self.count_skipped()
+            return False
+        return True
+
+    def get_pause(self, seconds):
+        # Seconds to sleep for a RedfishDelay, None when the time budget
+        # does not allow it. Replayed responses are not waited for.
+        if not self.can_wait(seconds):
+            return None
+        return 0 if self.replaying else seconds
+
+    def count_skipped(self):
+        self.skipped += 1
+        stats = SECTION_STATS.get()
+        if stats is not None:
+            stats.add(skipped=1)
+
+    def count_retry(self):
+        self.retries += 1
+        stats = SECTION_STATS.get()
+        if stats is not None:
+            stats.add(retries=1)
+
+    @contextlib.contextmanager
+    def slot(self, budgeted=False):
+        # Held while a request is in flight, not while waiting to retry it.
+        # A budgeted request (a GET) does not wait for it past the deadline.
+        if self.scheduler is None:
+            self.check_budget(budgeted)
+            yield
+            return
+        ticket = self.scheduler.acquire(self.bmc,
+                                        self.get_slot_timeout(budgeted))
+        if ticket is None:
+            self.skip_request()
+        try:
+            self.check_budget(budgeted)
+            yield
+        finally:
+            if ticket is not None:
+                self.scheduler.release(ticket)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, budgeted=False):
+        if self.scheduler is None:
+            self.check_budget(budgeted)
+            yield
+            return
+        ticket = await self.scheduler.acquire_async(
+            self.bmc, self.get_slot_timeout(budgeted))
+        if ticket is None:
+            self.skip_request()
+        try:
+            self.check_budget(budgeted)
+            yield
+        finally:
+            if ticket is not None:
+                self.scheduler.release(ticket)
+
+    def record(self, method, url, status, size, started):
+        if self.metrics is not None:
+            self.metrics.record(method, url, status, size,
+                                time.monotonic() - started)
+
+    def print_skipped(self):
+        if self.skipped:
+            print("[Fail] Time budget of {}s exceeded for {}, {} requests "
+                  "skipped".format(self.budget, self.base_url, self.skipped))
+
+
+class RedfishClient(BaseRedfishClient):
+    # One client per BMC. Every collector of a device shares it so that all
+    # GET/POST/DELETE go through the same pool of keep-alive connections
+    # instead of doing a new TCP + TLS handshake per request. pool_size is
+    # also the most requests that are ever in flight to the BMC.
+
+    def __init__(self, base_url, pool_size=DEFAULT_POOL_SIZE, verify=False,
+                 timeout=DEFAULT_TIMEOUT, budget=None,
+                 retries=DEFAULT_RETRIES, cache=None, session_store=None,
+                 auth='session', template=None, json_decoder='auto',
+                 metrics=None, archive=None, scheduler=None):
+        super(RedfishClient, self).__init__(base_url, pool_size, timeout,
+                                            budget, retries, cache,
+                                            session_store, auth, template,
+                                            json_decoder, metrics, archive,
+                                            scheduler)
+        self.verify = verify
+        self._executor = None
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                   pool_block=True)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def request(self, method, url, **kwargs):
+        if self.replaying:
+            return make_response(url, *self.archive.replay(method, url))
+        response = self.send(method, url, **kwargs)
+        if self.archive is not None:
+            self.archive.record(method, url, response.status_code,
+                                response.headers, response.content)
+        return response
+
+    def send(self, method, url, **kwargs):
+        # verify is passed on every call: Session.verify is overridden by
+        # REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE when they are set.
+        kwargs.setdefault('verify', self.verify)
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                if kwargs.get('stream'):
+                    # extract holds the slot until the body is read,
+                    # its retries included
+                    response = self.session.request(method, url, **kwargs)
+                else:
+                    with self.slot(method == 'GET'):
+                        response = self.session.request(method, url,
+                                                        **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.record(method, url, None, 0, started)
+                delay = None
+                if method in RETRY_METHODS:
+                    delay = self.get_retry_delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                # A streamed body is recorded by extract once it is read
+                if not kwargs.get('stream') or response.status_code != 200:
+                    self.record(method, url, response.status_code,
+                                len(response.content), started)
+                if response.status_code not in RETRY_STATUS:
+                    return response
+                delay = self.get_retry_delay(
+                    attempt, response.headers.get('Retry-After'))
+                if delay is None:
+                    return response
+            attempt += 1
+            self.count_retry()
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.get_timeout())
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def execute(self, request):
+        return self.request(request.method, request.url,
+                            headers=request.headers, data=request.data,
+                            auth=request.auth)
+
+    def wait(self, seconds):
+        pause = self.get_pause(seconds)
+        if pause is None:
+            return False
+        time.sleep(pause)
+        return True
+
+    def extract(self, url, extractor):
+        # GET streamed into extractor, answers the status code. Recorded
+        # and replayed bodies are whole.
+        if self.archive is not None:
+            response = self.get(url)
+            if response.status_code == 200:
+                extractor.feed(response.content)
+            return response.status_code
+        started = time.monotonic()
+        with self.slot(True):
+            response = self.get(url, stream=True)
+            try:
+                if response.status_code == 200:
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        extractor.feed(chunk)
+                        if extractor.done:
+                            break
+                    self.record('GET', url, 200, extractor.size, started)
+                return response.status_code
+            finally:
+                response.close()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        return self._executor
+
+    def set_auth_token(self, token):
+        self.session.headers.update({"X-Auth-Token": token})
+
+    def set_basic_auth(self, username, password):
+        self.session.auth = (username, password)
+
+    def connection_stats(self):
+        opened, sent = 0, 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            opened += pool.num_connections
+            sent += pool.num_requests
+        return {'opened': opened, 'reused': max(sent - opened, 0)}
+
+    def close(self):
+        stats = self.connection_stats()
+        print("[Info] Connections to {}: {} opened, {} reused, {} retried, "
+              "{} saved".format(self.base_url, stats['opened'],
+                                stats['reused'], self.retries, self.saved))
+        self.print_skipped()
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.session.close()
+        return stats
+
+
+class AsyncResponse(object):
+    # The body is read before the aiohttp response is released, so it can be
+    # used like a requests.Response by the collectors.
+
+    def __init__(self, status_code, headers, content, size=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        # Bytes read, the content of a streamed body is not kept
+        self.size = len(content) if size is None else size
+
+    def json(self):
+        return get_json_decoder()(self.content)
+
+
+class AsyncRedfishClient(BaseRedfishClient):
+    # asyncio counterpart of RedfishClient, must be created and closed inside
+    # a running event loop.
+
+    def __init__(self, base_url, pool_size=DEFAULT_POOL_SIZE, verify=False,
+                 timeout=DEFAULT_TIMEOUT, budget=None,
+                 retries=DEFAULT_RETRIES, cache=None, session_store=None,
+                 auth='session', template=None, json_decoder='auto',
+                 metrics=None, archive=None, scheduler=None):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for async collection")
+        super(AsyncRedfishClient, self).__init__(base_url, pool_size, timeout,
+                                                 budget, retries, cache,
+                                                 session_store, auth,
+                                                 template, json_decoder,
+                                                 metrics, archive,
+                                                 scheduler)
+        self.basic_auth = None
+        self.headers = {"Content-Type": "application/json"}
+        self.opened, self.reused = 0, 0
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._on_connection_create)
+        trace.on_connection_reuseconn.append(self._on_connection_reuse)
+        connector = aiohttp.TCPConnector(limit=pool_size,
+                                         ssl=None if verify else False)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             trace_configs=[trace])
+
+    async def _on_connection_create(self, session, context, params):
+        self.opened += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self.reused += 1
+
+    async def request(self, method, url, **kwargs):
+        if self.replaying:
+            return AsyncResponse(*self.archive.replay(method, url))
+        response = await self.send(method, url, **kwargs)
+        if self.archive is not None:
+            self.archive.record(method, url, response.status_code,
+                                response.headers, response.content)
+        return response
+
+    async def send(self, method, url, **kwargs):
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                async with self.slot_async(method == 'GET'):
+                    response = await self.request_once(method, url,
+                                                       **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.record(method, url, None, 0, started)
+                delay = None
+                # A body already streamed into an extractor can not be
+                # streamed again
+                if method in RETRY_METHODS and not kwargs.get('extractor'):
+                    delay = self.get_retry_delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                self.record(method, url, response.status_code, response.size,
+                            started)
+                if response.status_code not in RETRY_STATUS:
+                    return response
+                delay = self.get_retry_delay(
+                    attempt, response.headers.get('Retry-After'))
+                if delay is None:
+                    return response
+            attempt += 1
+            self.count_retry()
+            await asyncio.sleep(delay)
+
+    async def request_once(self, method, url, headers=None, data=None,
+                           auth=None, timeout=None, extractor=None):
+        rq_headers = dict(self.headers)
+        if headers:
+            rq_headers.update(headers)
+        if auth:
+            auth = aiohttp.BasicAuth(auth[0], auth[1])
+        else:
+            auth = self.basic_auth
+        connect, read = timeout or self.timeout
+        # A GET does not wait for a connection of the pool, nor for the end
+        # of its answer, past the deadline
+        total = self.get_remaining() if method == 'GET' else None
+        timeout = aiohttp.ClientTimeout(total=total, connect=total,
+                                        sock_connect=connect, sock_read=read)
+        async with self.session.request(method, url, headers=rq_headers,
+                                        data=data, auth=auth,
+                                        timeout=timeout) as response:
+            if extractor is not None and response.status == 200:
+                async for chunk in response.content.iter_chunked(
+                        STREAM_CHUNK_SIZE):
+                    extractor.feed(chunk)
+                    if extractor.done:
+                        break
+                return AsyncResponse(response.status, response.headers, b'',
+                                     extractor.size)
+            content = await response.read()
+            return AsyncResponse(response.status, response.headers, content)
+
+    async def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.get_timeout())
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    async def execute(self, request):
+        return await self.request(request.method, request.url,
+                                  headers=request.headers, data=request.data,
+                                  auth=request.auth)
+
+    async def wait(self, seconds):
+        pause = self.get_pause(seconds)
+        if pause is None:
+            return False
+        await asyncio.sleep(pause)
+        return True
+
+    async def extract(self, url, extractor):
+        if self.archive is not None:
+            response = await self.get(url)
+            if response.status_code == 200:
+                extractor.feed(response.content)
+            return response.status_code
+        response = await self.get(url, extractor=extractor)
+        return response.status_code
+
+    def set_auth_token(self, token):
+        self.headers.update({"X-Auth-Token": token})
+
+    def set_basic_auth(self, username, password):
+        self.basic_auth = aiohttp.BasicAuth(username, password)
+
+    def connection_stats(self):
+        return {'opened': self.opened, 'reused': self.reused}
+
+    async def close(self):
+        stats = self.connection_stats()
+        print("[Info] Connections to {}: {} opened, {} reused, {} retried, "
+              "{} saved".format(self.base_url, stats['opened'],
+                                stats['reused'], self.retries, self.saved))
+        self.print_skipped()
+        await self.session.close()
+        return stats
@@ -0,0 +1,127 @@
+import bisect
+import json
+import threading
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds of the latency histogram, the last bucket counts
+# the slower requests
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+API_PREFIXES = ('/redfish/v1/', '/rest/v1/')
+# Segments followed by the id of a member
+COLLECTIONS = {'Systems', 'Chassis', 'Managers', 'Memory', 'Processors',
+               'Storage', 'Drives', 'Volumes', 'Controllers',
+               'NetworkAdapters', 'NetworkDeviceFunctions', 'NetworkPorts',
+               'Ports', 'EthernetInterfaces', 'Sessions', 'Accounts',
+               'sessionInformation'}
+DEFAULT_METRICS_TOP = 10
+
+
+def get_endpoint(url):
+    # Template of the url, the ids of the members replaced by {id}:
+    # https://bmc/redfish/v1/Systems/1/Memory/proc1dimm1/ gives
+    # Systems/{id}/Memory/{id}
+    path = urlsplit(url).path
+    for prefix in API_PREFIXES:
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+            break
+    segments = []
+    previous = None
+    for segment in path.strip('/').split('/'):
+        if previous in COLLECTIONS or any(c.isdigit() for c in segment):
+            segments.append('{id}')
+        else:
+            segments.append(segment)
+        previous = segment
+    return '/'.join(segments) or '/'
+
+
+class MetricsRecorder(object):
+    # What a client records into the metrics of the run, labelled with the
+    # vendor and the model of its server
+
+    def __init__(self, metrics, vendor, model):
+        self.metrics = metrics
+        self.vendor = vendor
+        self.model = model
+
+    def record(self, method, url, status, size, seconds):
+        self.metrics.record((self.vendor, self.model, method,
+                             get_endpoint(url)), status, size, seconds)
+
+
+class RequestMetrics(object):
+    # Count, bytes, status codes and latency histogram of the requests of
+    # the run, per vendor, model, method and endpoint template. status is
+    # None for a request that got no answer (connection lost, timeout).
+    # Shared by all the clients, so it is guarded by a lock.
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def get_recorder(self, vendor, model):
+        return MetricsRecorder(self, vendor, model)
+
+    def record(self, key, status, size, seconds):
+        status = 'error' if status is None else str(status)
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = {
+                    'count': 0, 'bytes': 0, 'seconds': 0, 'max_seconds': 0,
+                    'status': {}, 'histogram': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+            stats['count'] += 1
+            stats['bytes'] += size
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['status'][status] = stats['status'].get(status, 0) + 1
+            stats['histogram'][bisect.bisect_left(LATENCY_BUCKETS,
+                                                  seconds)] += 1
+
+    def get_entries(self):
+        entries = []
+        with self.lock:
+            for key, stats in self.endpoints.items():
+                vendor, model, method, endpoint = key
+                buckets = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+                entries.append({
+                    'vendor': vendor, 'model': model, 'method': method,
+                    'endpoint': endpoint, 'count': stats['count'],
+                    'bytes': stats['bytes'],
+                    'seconds': round(stats['seconds'], 6),
+                    'mean_seconds': round(stats['seconds'] / stats['count'],
+                                          6),
+                    'max_seconds': round(stats['max_seconds'], 6),
+                    'status': dict(stats['status']),
+                    'histogram': dict(zip(buckets, stats['histogram']))
+                })
+        return entries
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump({'buckets': list(LATENCY_BUCKETS),
+                       'endpoints': self.get_entries()}, f, indent=2)
+        print("[Info] Request metrics written to {}".format(path))
+
+    def print_summary(self, top=DEFAULT_METRICS_TOP):
+        entries = self.get_entries()
+        if not entries:
+            return
+        print("[Info] Slowest endpoints (mean seconds, requests, total "
+              "seconds):")
+        for entry in sorted(entries, key=lambda e: e['mean_seconds'],
+                            reverse=True)[:top]:
+            print("  {:8.3f} {:6} {:9.1f}  {} {} {} {}".format(
+                entry['mean_seconds'], entry['count'], entry['seconds'],
+                entry['vendor'], entry['model'], entry['method'],
+                entry['endpoint']))
+        print("[Info] Most called endpoints (requests, bytes, total "
+              "seconds):")
+        for entry in sorted(entries, key=lambda e: e['count'],
+                            reverse=True)[:top]:
+            print("  {:6} {:10} {:9.1f}  {} {} {} {}".format(
+                entry['count'], entry['bytes'], entry['seconds'],
+                entry['vendor'], entry['model'], entry['method'],
+                entry['endpoint']))
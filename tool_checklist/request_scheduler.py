@@ -0,0 +1,166 @@
+import asyncio
+import collections
+import ipaddress
+import threading
+from urllib.parse import urlsplit
+
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_BMC_LIMIT = 4
+DEFAULT_SUBNET_LIMIT = 16
+DEFAULT_SUBNET_PREFIX = 24
+
+
+def get_subnet(bmc, prefix):
+    # bmc is host[:port], hosts given by name are their own subnet
+    host = urlsplit('//' + bmc).hostname or bmc
+    try:
+        return str(ipaddress.ip_network('{}/{}'.format(host, prefix),
+                                        strict=False))
+    except ValueError:
+        return host
+
+
+class SchedulerTicket(object):
+    # One request waiting for, or holding, a slot. wake is called once the
+    # slot is granted, from the thread that released a slot.
+
+    def __init__(self, bmc, subnet, wake=None):
+        self.bmc = bmc
+        self.subnet = subnet
+        self.wake = wake
+        self.granted = False
+
+
+class RequestScheduler(object):
+    # Slots of the requests to the BMCs, shared by every client of the run:
+    # at most max_in_flight requests in total, bmc_limit per BMC and
+    # subnet_limit per management subnet (/subnet_prefix) are sent at once.
+    # The requests that have to wait are queued per BMC, and freed slots go
+    # to the queues in turn so that a server with many requests pending
+    # does not hold back the others. Used from threads and from asyncio.
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 bmc_limit=DEFAULT_BMC_LIMIT,
+                 subnet_limit=DEFAULT_SUBNET_LIMIT,
+                 subnet_prefix=DEFAULT_SUBNET_PREFIX):
+        self.max_in_flight = max_in_flight
+        self.bmc_limit = bmc_limit
+        self.subnet_limit = subnet_limit
+        self.subnet_prefix = subnet_prefix
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.bmc_in_flight = collections.Counter()
+        self.subnet_in_flight = collections.Counter()
+        self.queues = collections.OrderedDict()
+        self.waiting = 0
+        self.requests, self.waited, self.max_waiting = 0, 0, 0
+
+    def get_ticket(self, bmc, wake=None):
+        return SchedulerTicket(bmc, get_subnet(bmc, self.subnet_prefix), wake)
+
+    def can_run(self, ticket):
+        return (not self.max_in_flight
+                or self.in_flight < self.max_in_flight) \
+            and (not self.bmc_limit
+                 or self.bmc_in_flight[ticket.bmc] < self.bmc_limit) \
+            and (not self.subnet_limit
+                 or self.subnet_in_flight[ticket.subnet] < self.subnet_limit)
+
+    def take(self, ticket):
+        self.in_flight += 1
+        self.bmc_in_flight[ticket.bmc] += 1
+        self.subnet_in_flight[ticket.subnet] += 1
+        ticket.granted = True
+
+    def enter(self, ticket):
+        # True when the ticket got its slot at once, else it is queued
+        with self.lock:
+            self.requests += 1
+            if ticket.bmc not in self.queues and self.can_run(ticket):
+                self.take(ticket)
+                return True
+            self.queues.setdefault(ticket.bmc, collections.deque()).append(
+                ticket)
+            self.waiting += 1
+            self.waited += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            return False
+
+    def dispatch(self):
+        # Grants the freed slots, one queue after the other. Called with the
+        # lock held, answers the granted tickets.
+        granted = []
+        progress = True
+        while progress and self.queues:
+            progress = False
+            for bmc in list(self.queues):
+                queue = self.queues[bmc]
+                if not self.can_run(queue[0]):
+                    continue
+                ticket = queue.popleft()
+                self.take(ticket)
+                self.waiting -= 1
+                granted.append(ticket)
+                progress = True
+                # The queue goes behind the others
+                del self.queues[bmc]
+                if queue:
+                    self.queues[bmc] = queue
+        return granted
+
+    def release(self, ticket):
+        with self.lock:
+            self.in_flight -= 1
+            self.bmc_in_flight[ticket.bmc] -= 1
+            self.subnet_in_flight[ticket.subnet] -= 1
+            granted = self.dispatch()
+        for waiter in granted:
+            waiter.wake()
+
+    def cancel(self, ticket):
+        # A waiter gave up (task cancelled or timed out): its slot, if it
+        # got one in the meantime, goes to the next request
+        with self.lock:
+            queue = self.queues.get(ticket.bmc)
+            if not ticket.granted and queue and ticket in queue:
+                queue.remove(ticket)
+                self.waiting -= 1
+                if not queue:
+                    del self.queues[ticket.bmc]
+                return
+        if ticket.granted:
+            self.release(ticket)
+
+    def acquire(self, bmc, timeout=None):
+        # None when no slot was granted within timeout seconds
+        event = threading.Event()
+        ticket = self.get_ticket(bmc, event.set)
+        if not self.enter(ticket) and not event.wait(timeout):
+            self.cancel(ticket)
+            return None
+        return ticket
+
+    async def acquire_async(self, bmc, timeout=None):
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(
+                lambda: future.done() or future.set_result(None))
+
+        ticket = self.get_ticket(bmc, wake)
+        if not self.enter(ticket):
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self.cancel(ticket)
+                return None
+            except asyncio.CancelledError:
+                self.cancel(ticket)
+                raise
+        return ticket
+
+    def print_stats(self):
+        print("[Info] Scheduler: {} requests, {} waited for a slot, at most "
+              "{} waiting".format(self.requests, self.waited,
+                                  self.max_waiting))
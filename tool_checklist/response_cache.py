@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+
+def get_etag(response, body):
+    etag = response.headers.get('ETag')
+    if not etag and isinstance(body, dict):
+        etag = body.get('@odata.etag')
+    return etag
+
+
+class ResponseCache(object):
+    # On-disk cache of the Redfish bodies that came with an ETag, one file
+    # per url (the url holds the address of the BMC). call_api_get sends the
+    # ETag back in If-None-Match and uses the cached body when the BMC
+    # answers 304. Entries older than ttl seconds are dropped, and the least
+    # recently used ones are evicted when the files take more than max_size
+    # bytes. The last use of an entry is the mtime of its file.
+    # One cache is shared by all the clients, so it is guarded by a lock.
+
+    def __init__(self, directory, ttl=DEFAULT_CACHE_TTL,
+                 max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.not_modified, self.stored = 0, 0
+        os.makedirs(directory, exist_ok=True)
+        self.sizes = {}
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                path = os.path.join(directory, name)
+                self.sizes[path] = os.path.getsize(path)
+        self.size = sum(self.sizes.values())
+
+    def get_path(self, url):
+        name = hashlib.sha1(url.encode()).hexdigest() + '.json'
+        return os.path.join(self.directory, name)
+
+    def get(self, url):
+        path = self.get_path(url)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url:
+            return None
+        if time.time() - entry.get('stored', 0) > self.ttl:
+            with self.lock:
+                self.remove(path)
+            return None
+        return entry
+
+    def hit(self, url):
+        with self.lock:
+            self.not_modified += 1
+        try:
+            os.utime(self.get_path(url))
+        except OSError:
+            pass
+
+    def put(self, url, etag, body):
+        path = self.get_path(url)
+        data = json.dumps({'url': url, 'etag': etag, 'stored': time.time(),
+                           'body': body})
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.stored += 1
+            self.size += len(data) - self.sizes.get(path, 0)
+            self.sizes[path] = len(data)
+            if self.size > self.max_size:
+                self.evict()
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self.size -= self.sizes.pop(path, 0)
+
+    def evict(self):
+        # Down to 90% of max_size so that a full cache is not scanned on
+        # every put
+        entries = []
+        for path in list(self.sizes):
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                self.size -= self.sizes.pop(path)
+        for _, path in sorted(entries):
+            if self.size <= self.max_size * 0.9:
+                break
+            self.remove(path)
+
+    def close(self):
+        print("[Info] Response cache {}: {} not modified, {} stored, "
+              "{} bytes".format(self.directory, self.not_modified,
+                                self.stored, self.size))
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import threading
+
+ARCHIVE_VERSION = 1
+# Headers read by the collectors, the others are not kept
+RECORDED_HEADERS = ('Location', 'X-Auth-Token', 'ETag', 'Retry-After')
+
+
+class ReplayError(RuntimeError):
+    pass
+
+
+def get_archive_path(directory, ip_os):
+    return os.path.join(directory, ip_os + '.json.gz')
+
+
+def encode_body(content):
+    # Bodies are kept as text, bytes that are not UTF-8 survive the JSON
+    # round trip as lone surrogates
+    return content.decode('utf-8', 'surrogateescape')
+
+
+def decode_body(text):
+    return text.encode('utf-8', 'surrogateescape')
+
+
+class ServerArchive(object):
+    # Raw answers collected for one server: its OS facts from ansible, the
+    # DCIM responses and the Redfish responses, in one gzipped JSON file.
+    # --record fills it, --replay answers every request from it instead of
+    # the network. A url asked several times (eLCM job polling) gets its
+    # recorded answers in order, then the last one again.
+
+    def __init__(self, path, replaying=False, os_facts=None, auth='session'):
+        self.path = path
+        self.replaying = replaying
+        self.os_facts = os_facts
+        self.auth = auth
+        self.dcim = []
+        self.responses = []
+        self.dcim_bodies, self.pending = {}, {}
+        self.lock = threading.Lock()
+        if replaying:
+            self.load()
+
+    def load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            archive = json.load(f)
+        if archive.get('version') != ARCHIVE_VERSION:
+            raise ReplayError("Archive {} has version {}, expected {}".format(
+                self.path, archive.get('version'), ARCHIVE_VERSION))
+        self.os_facts = archive['os']
+        self.auth = archive['auth']
+        self.dcim = archive['dcim']
+        self.responses = archive['redfish']
+        for url, params, body in self.dcim:
+            self.dcim_bodies[(url, json.dumps(params, sort_keys=True))] = body
+        for method, url, status_code, headers, body in self.responses:
+            self.pending.setdefault((method, url), []).append(
+                (status_code, headers, decode_body(body)))
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'version': ARCHIVE_VERSION, 'os': self.os_facts,
+                       'auth': self.auth, 'dcim': self.dcim,
+                       'redfish': self.responses}, f,
+                      separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def record(self, method, url, status_code, headers, content):
+        kept = {}
+        for name in RECORDED_HEADERS:
+            if headers.get(name) is not None:
+                kept[name] = headers.get(name)
+        if 'X-Auth-Token' in kept:
+            # Only its presence matters to the collectors
+            kept['X-Auth-Token'] = 'recorded'
+        with self.lock:
+            self.responses.append([method, url, status_code, kept,
+                                   encode_body(content)])
+
+    def replay(self, method, url):
+        with self.lock:
+            answers = self.pending.get((method, url))
+            if not answers:
+                raise ReplayError("{} {} was not recorded in {}".format(
+                    method, url, self.path))
+            if len(answers) > 1:
+                return answers.pop(0)
+            return answers[0]
+
+    def record_dcim(self, url, params, body):
+        with self.lock:
+            self.dcim.append([url, params, body])
+
+    def replay_dcim(self, url, params):
+        body = self.dcim_bodies.get((url, json.dumps(params, sort_keys=True)))
+        if body is None:
+            raise ReplayError("DCIM {} {} was not recorded in {}".format(
+                url, params, self.path))
+        return body
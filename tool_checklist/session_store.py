@@ -0,0 +1,80 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError:
+    Fernet = None
+
+KDF_ITERATIONS = 100000
+
+
+def get_fernet(password, salt):
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt,
+                     iterations=KDF_ITERATIONS, backend=default_backend())
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(password.encode())))
+
+
+class SessionStore(object):
+    # Redfish sessions (X-Auth-Token and Location) kept between runs in one
+    # file, keyed by BMC and user. Each session is encrypted with a key
+    # derived from the password of the BMC, so the file is useless without
+    # the input file that holds the passwords.
+    # One store is shared by all the clients, so it is guarded by a lock.
+
+    def __init__(self, path):
+        if Fernet is None:
+            raise RuntimeError("cryptography is required for the session "
+                               "store")
+        self.path = path
+        self.lock = threading.Lock()
+        self.sessions = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.sessions = json.load(f)
+            except (OSError, ValueError) as e:
+                print("[Fail] Can not read session store {} cause {}".format(
+                    path, e))
+
+    def get_key(self, base_url, username):
+        return hashlib.sha256(
+            (base_url + '\n' + username).encode()).hexdigest()
+
+    def get(self, base_url, username, password):
+        entry = self.sessions.get(self.get_key(base_url, username))
+        if not entry:
+            return None
+        try:
+            fernet = get_fernet(password, base64.b64decode(entry['salt']))
+            return json.loads(fernet.decrypt(entry['data'].encode()))
+        except (InvalidToken, KeyError, ValueError):
+            return None
+
+    def put(self, base_url, username, password, session):
+        salt = os.urandom(16)
+        data = get_fernet(password, salt).encrypt(json.dumps(session).encode())
+        with self.lock:
+            self.sessions[self.get_key(base_url, username)] = {
+                'salt': base64.b64encode(salt).decode(),
+                'data': data.decode()
+            }
+            self.save()
+
+    def remove(self, base_url, username):
+        with self.lock:
+            if self.sessions.pop(self.get_key(base_url, username), None):
+                self.save()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.sessions, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,76 @@
+import threading
+
+
+class TopologyLookup(object):
+    # Yielded by a collector for a value that only depends on the model of
+    # the server (resource uris, Redfish version...). lookup is the
+    # sub-collector that discovers it, it is skipped when the template of
+    # the server already knows the value.
+
+    def __init__(self, name, lookup):
+        self.name = name
+        self.lookup = lookup
+
+
+class ServerTemplate(object):
+    # Template used for one server: what is known for its model (values and
+    # bodies of the urls answering 404) and what this collection learned.
+    # failed is set when a url built from a known value answers 404, the
+    # model then does not match the template.
+
+    def __init__(self, templates, key, values, not_found):
+        self.templates = templates
+        self.key = key
+        self.values = values
+        self.not_found = not_found
+        self.learned_values = {}
+        self.learned_not_found = {}
+        self.used = set()
+        self.failed = False
+
+    def is_templated_url(self, path):
+        for name in self.used:
+            value = self.values.get(name)
+            if isinstance(value, str) and path.startswith(value):
+                return True
+        return False
+
+    def for_bmc(self, bmc):
+        # The template of the same model with this BMC firmware
+        return self.templates.get_template(self.key + (bmc,))
+
+    def save(self):
+        self.templates.learn(self)
+
+    def invalidate(self):
+        self.templates.invalidate(self)
+
+
+class TopologyTemplates(object):
+    # Templates of the run, keyed by (vendor, model, BIOS version) as found
+    # by ansible on the OS and by the BMC (its service root), as one model
+    # can come with BMC firmwares of different layouts. The first server
+    # of a model fills the template, the next ones start from it. Shared
+    # by all the workers.
+
+    def __init__(self):
+        self.templates = {}
+        self.lock = threading.Lock()
+
+    def get_template(self, key):
+        with self.lock:
+            template = self.templates.get(key, {})
+            return ServerTemplate(self, key,
+                                  dict(template.get('values', {})),
+                                  dict(template.get('not_found', {})))
+
+    def learn(self, server_template):
+        with self.lock:
+            template = self.templates.setdefault(
+                server_template.key, {'values': {}, 'not_found': {}})
+            template['values'].update(server_template.learned_values)
+            template['not_found'].update(server_template.learned_not_found)
+
+    def invalidate(self, server_template):
+        with self.lock:
+            self.templates.pop(server_template.key, None)
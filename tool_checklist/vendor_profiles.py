@@ -0,0 +1,364 @@
+# What the tool reads on the Redfish service of each vendor, as data. Every
+# profile is compiled by device_collect into the collectors of the sections
+# of a server, so a new BMC generation is supported by a new profile or a
+# new entry of 'generations', without new collection code.
+#
+# Paths are relative to the BMC, {system}, {chassis}, {manager} and
+# {storage} are replaced by the uris found on the server. Properties are
+# dotted paths in a resource (Status.Health), a tuple of paths reads the
+# first one that has a value. The names of 'convert' are the conversions
+# of device_collect.CONVERSIONS, the names of 'record' the classes of
+# records.RECORDS the info is kept in.
+#
+# Section kinds:
+#   resource: the properties of one resource ('fields')
+#   parts:    the members of a collection, or the items of a list property
+#             ('list') of a resource, with the info read on each and the
+#             parts that are not 'healthy' in 'fail_part'
+#   disks:    the storage controllers (those whose uri has 'controller'),
+#             walked side by side, their logical and physical drives
+#   bios:     settings read from a large document, checked against the
+#             'expected' values
+
+# Rules of a healthy part: every property has the given value
+HEALTH_OK = {'Status.Health': 'OK'}
+ENABLED_OK = {'Status.Health': 'OK', 'Status.State': 'Enabled'}
+# Parts that are not installed
+ABSENT = {'Status.State': 'Absent'}
+STATUS = {'health': 'Status.Health', 'state': 'Status.State'}
+
+BASE_SELECT = ('BiosVersion', 'Model', 'MemorySummary', 'ProcessorSummary',
+               'SerialNumber', 'Status')
+BASE_FIELDS = {
+    'bios_version': 'BiosVersion',
+    'model': 'Model',
+    'memory_gib': 'MemorySummary.TotalSystemMemoryGiB',
+    'memory_status': ('MemorySummary.Status.Health',
+                      'MemorySummary.Status.HealthRollup'),
+    'processor': {'number': 'ProcessorSummary.Count',
+                  'model': 'ProcessorSummary.Model'},
+    'serial': 'SerialNumber',
+    'health': 'Status.Health'
+}
+
+PROCESSOR = {
+    'kind': 'parts',
+    'path': '{system}/Processors/',
+    'select': ('Socket', 'Status', 'TotalCores', 'TotalThreads', 'Model'),
+    'info': {'core': 'TotalCores', 'thread': 'TotalThreads',
+             'model': 'Model'},
+    'record': 'processor',
+    'healthy': HEALTH_OK,
+    'fail': dict({'location': 'Socket'}, **STATUS),
+    'number': 'all'
+}
+
+FAN = {
+    'kind': 'parts',
+    'path': '{chassis}/Thermal/',
+    'select': ('Fans',),
+    'list': 'Fans',
+    'skip': ABSENT,
+    'healthy': HEALTH_OK,
+    'fail': dict({'name': 'Name'}, **STATUS),
+    'number': 'present'
+}
+
+MEMORY = {
+    'kind': 'parts',
+    'path': '{system}/Memory/',
+    'select': ('DeviceLocator', 'Status', 'CapacityMiB', 'SizeMB',
+               'MemoryDeviceType', 'DIMMType'),
+    'skip': ABSENT,
+    'healthy': HEALTH_OK,
+    # DIMMs of iLO 4 have no Status
+    'unless_missing': 'Status',
+    'fail': dict({'location': 'DeviceLocator'}, **STATUS),
+    'info': {'capacity_mib': ('CapacityMiB', 'SizeMB'),
+             'type': ('MemoryDeviceType', 'DIMMType')},
+    # One entry per size of DIMM, with their count
+    'group_by': ('capacity_mib',),
+    'record': 'memory_group'
+}
+
+POWER = {
+    'kind': 'parts',
+    'path': '{chassis}/Power/',
+    'select': ('PowerSupplies', 'PowerControl', 'Redundancy'),
+    'list': 'PowerSupplies',
+    'healthy': ENABLED_OK,
+    'fail': {'name': 'Name'},
+    'info': {'capacity': 'PowerCapacityWatts'},
+    'record': 'power_supply',
+    'number': 'all',
+    # Redundant when this list property is not empty, or has an item in
+    # 'mode'
+    'redundancy': {'list': 'Redundancy'}
+}
+
+NETWORK = {
+    'kind': 'parts',
+    'path': '{system}/NetworkAdapters/',
+    'select': ('Model', 'Name', 'Status'),
+    'healthy': HEALTH_OK,
+    'unless_missing': 'Status.Health',
+    'fail': {'name': 'Name', 'state': 'Status.State',
+             'health': 'Status.Health', 'model': 'Model'},
+    'info': {'model': 'Model', 'name': 'Name'},
+    'record': 'network_adapter',
+    'number': 'all'
+}
+
+# Redfish Storage: the controller links its Volumes collection and Drives,
+# each volume links its drives. The drives of the volumes are read with the
+# 'drive' rules.
+DISK = {
+    'kind': 'disks',
+    'controllers': '{system}/Storage/',
+    'volume': {
+        'select': ('RAIDType', 'VolumeType', 'CapacityBytes', 'Links'),
+        'fields': {'raid': 'RAIDType', 'capacity_gb': 'CapacityBytes'},
+        'convert': {'raid': 'raid_level', 'capacity_gb': 'gb'}
+    },
+    'drive': {
+        'select': ('Status', 'Location', 'Name', 'CapacityBytes',
+                   'MediaType', 'RotationSpeedRPM'),
+        'fields': {'capacity_gb': 'CapacityBytes', 'type': 'MediaType',
+                   'speed': 'RotationSpeedRPM'},
+        'convert': {'capacity_gb': 'gb'}
+    },
+    'healthy': ENABLED_OK,
+    # A failed drive is reported by its name, or by the last part of
+    # 'location' (Port:Bay) described by 'location_format'
+    'name': 'Name'
+}
+
+SNMP = {
+    'kind': 'resource',
+    'select': ('SNMP',),
+    'required': 'SNMP',
+    'fields': {'state': 'SNMP.ProtocolEnabled'},
+    'convert': {'state': 'enabled'},
+    'constants': {'list_string': ''}
+}
+
+FIRMWARE = {
+    'kind': 'resource',
+    'path': '{manager}',
+    'select': ('Model', 'FirmwareVersion'),
+    'fields': {'model': 'Model', 'version': 'FirmwareVersion'},
+    'record': 'firmware'
+}
+
+# HPE iLO 4 and newer. The resources have fixed uris and Oem properties,
+# the storage is the Smart Array of the Oem SmartStorage.
+HPE = {
+    'name': 'HPE',
+    'session': {
+        'path': '/redfish/v1/SessionService/Sessions/',
+        'headers': {'Content-Type': 'application/json',
+                    'OData-Version': '4.0'}
+    },
+    'resources': {'system': '/redfish/v1/Systems/1',
+                  'chassis': '/redfish/v1/Chassis/1',
+                  'manager': '/redfish/v1/Managers/1'},
+    # The generation is the iLO model read by this section, the sections
+    # changed by 'generations' are collected once it is known
+    'generation_section': 'firmware',
+    'generations': [
+        {'when': {'firmware': 'iLO 4'},
+         'sections': {'network': {'path': '{system}/NetworkAdapters/'}}}
+    ],
+    'sections': {
+        'firmware': {
+            'kind': 'resource',
+            'path': '{manager}/',
+            'select': ('FirmwareVersion', 'Oem'),
+            'fields': {'model': ('Oem.Hpe.Firmware.Current',
+                                 'Oem.Hp.Firmware.Current'),
+                       'version': ('Oem.Hpe.Firmware.Current',
+                                   'Oem.Hp.Firmware.Current')},
+            'convert': {'model': 'ilo_model', 'version': 'ilo_version'},
+            'record': 'firmware'
+        },
+        'network': dict(NETWORK, **{
+            'path': '{system}/BaseNetworkAdapters/',
+            'select': ('Name', 'Status'),
+            'fail': dict({'model': 'Name'}, **STATUS),
+            'info': {'model': 'Name'}
+        }),
+        'base_info': {
+            'kind': 'resource',
+            'path': '{system}/',
+            'select': BASE_SELECT,
+            'fields': dict(BASE_FIELDS, memory_status=(
+                'MemorySummary.Status.HealthRollUp',
+                'MemorySummary.Status.HealthRollup'))
+        },
+        'processor': PROCESSOR,
+        'fan': dict(FAN, number='all'),
+        'disk': {
+            'kind': 'disks',
+            'controllers': '{system}/SmartStorage/ArrayControllers/',
+            'volumes': '{storage}LogicalDrives/',
+            'volume': {
+                'select': ('Raid', 'CapacityMiB'),
+                'fields': {'raid': 'Raid', 'capacity_gb': 'CapacityMiB'},
+                'convert': {'capacity_gb': 'mib_to_gb'}
+            },
+            'volume_drives': 'DataDrives/',
+            'drives': '{storage}DiskDrives/',
+            'drive': {
+                'select': ('Status', 'Location', 'LocationFormat',
+                           'CapacityGB', 'MediaType', 'RotationalSpeedRpm'),
+                'fields': {'capacity_gb': 'CapacityGB', 'type': 'MediaType',
+                           'speed': 'RotationalSpeedRpm'}
+            },
+            'healthy': ENABLED_OK,
+            'location': 'Location',
+            'location_format': 'LocationFormat'
+        },
+        'power': dict(POWER, **{
+            'select': ('PowerSupplies', 'Redundancy'),
+            'fail': dict({'id': 'MemberId'}, **STATUS),
+            'redundancy': {'list': 'Redundancy', 'mode': 'Failover'}
+        }),
+        'memory': MEMORY,
+        'snmp': {
+            'kind': 'resource',
+            'path': '{manager}/SnmpService/',
+            'select': ('Status', 'ReadCommunities'),
+            'required': 'Status',
+            'fields': {'state': 'Status.State',
+                       'list_string': 'ReadCommunities'}
+        },
+        'bios_config': {
+            'kind': 'bios',
+            'path': '{system}/Bios/',
+            # iLO 5 has the settings under Attributes
+            'settings': {
+                'thermal': ('Attributes.ThermalConfig', 'ThermalConfig'),
+                'workload_profile': 'PowerProfile',
+                'power_performance': ('Attributes.PowerRegulator',
+                                      'PowerRegulator')
+            },
+            'optional': ('workload_profile',),
+            'expected': {'thermal': 'OptimalCooling',
+                         'power_performance': 'StaticHighPerf'}
+        }
+    }
+}
+
+# Fujitsu iRMC S4 and newer. The BIOS settings are only in the eLCM
+# profiles.
+FUJITSU = {
+    'name': 'Fujitsu',
+    'session': {
+        'path': '/redfish/v1/SessionService/Sessions/',
+        'headers': {'Content-Type': 'application/json',
+                    'OData-Version': '4.0'},
+        'auth': True
+    },
+    # Collections holding the only system, chassis and manager
+    'collections': {'system': '/redfish/v1/Systems',
+                    'chassis': '/redfish/v1/Chassis',
+                    'manager': '/redfish/v1/Managers'},
+    'single_member': True,
+    'sections': {
+        'base_info': {
+            'kind': 'resource',
+            'path': '{system}',
+            'select': BASE_SELECT + ('SKU',),
+            'fields': BASE_FIELDS
+        },
+        'network': dict(NETWORK, path='{chassis}/NetworkAdapters/'),
+        'processor': PROCESSOR,
+        'fan': FAN,
+        'disk': dict(DISK, **{
+            'drive': dict(DISK['drive'], convert={'capacity_gb': 'gb_floor'}),
+            'name': None,
+            'location': 'Location.Info',
+            'location_format': 'Location.InfoFormat'
+        }),
+        'power': dict(POWER, redundancy={'list': 'PowerControl'}),
+        'memory': MEMORY,
+        'snmp': dict(SNMP, path='{manager}/ManagerNetwork/'),
+        'firmware': FIRMWARE,
+        'bios_config': {
+            'kind': 'bios',
+            # Profile built by an eLCM job started after login, the whole
+            # Server profile is read when the iRMC can not run the job
+            'elcm': 'Server/SystemConfig/BiosConfig',
+            'settings': {
+                'EnergyPerformanceMode': 'Server.SystemConfig.BiosConfig.'
+                                         'CpuConfig.EnergyPerformanceMode',
+                'OsEnergyPerformanceOverrideEnabled':
+                    'Server.SystemConfig.BiosConfig.CpuConfig.'
+                    'OsEnergyPerformanceOverrideEnabled'
+            },
+            'expected': {'EnergyPerformanceMode': 'OptimizedPerformance',
+                         'OsEnergyPerformanceOverrideEnabled': 'True'},
+            'format': "{{'EnergyPerformanceMode': {EnergyPerformanceMode}; "
+                      "'OsEnergyPerformanceOverrideEnabled': "
+                      "{OsEnergyPerformanceOverrideEnabled}"
+        }
+    }
+}
+
+# Dell iDRAC 8 and newer. The generation is the Redfish version of the
+# service root, read before login.
+DELL = {
+    'name': 'Dell',
+    'session': {
+        'path': '/redfish/v1/SessionService/Sessions/',
+        'headers': {'Content-Type': 'application/json'}
+    },
+    'redfish_version': True,
+    'generations': [
+        # iDRAC 8 (Redfish 1.0) reports the memory sizes in binary units
+        {'when': {'redfish_version_below': 160},
+         'session': {'path': '/redfish/v1/Sessions/'},
+         'sections': {'base_info': {'convert': {'memory_gib': 'to_decimal'}},
+                      'memory': {'convert': {'capacity_mib': 'to_decimal'}}}}
+    ],
+    'collections': {'system': '/redfish/v1/Systems',
+                    'chassis': '/redfish/v1/Chassis',
+                    'manager': '/redfish/v1/Managers'},
+    'sections': {
+        'base_info': {
+            'kind': 'resource',
+            'path': '{system}',
+            'select': BASE_SELECT + ('SKU',),
+            'fields': dict(BASE_FIELDS, serial='SKU'),
+            'convert': {'memory_gib': 'int'}
+        },
+        'network': NETWORK,
+        'processor': PROCESSOR,
+        'fan': FAN,
+        # The PERC and HBA controllers, not the AHCI and BOSS ones
+        'disk': dict(DISK, controller='RAID', volume=dict(
+            DISK['volume'], **{
+                'skip': {'VolumeType': 'RawDevice'},
+                'fields': {'raid': 'VolumeType',
+                           'capacity_gb': 'CapacityBytes'},
+                'convert': {'raid': 'mirrored', 'capacity_gb': 'gb'}
+            })),
+        'power': dict(POWER, **{
+            # iDRAC 8 has the capacity in the model: PWR SPLY,750W,RDNT
+            'info': {'capacity': ('PowerCapacityWatts', 'Model')},
+            'convert': {'capacity': 'watts'}
+        }),
+        'memory': MEMORY,
+        'snmp': dict(SNMP, path='{manager}/NetworkProtocol/'),
+        'firmware': FIRMWARE,
+        'bios_config': None
+    }
+}
+
+# Vendor name found by ansible on the OS
+VENDOR_PROFILES = {
+    'HPE': HPE,
+    'HP': HPE,
+    'FUJITSU': FUJITSU,
+    'Dell Inc.': DELL
+}